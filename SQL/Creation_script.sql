@@ -1,4 +1,12 @@
+-- Schéma complet d'une base neuve ; les évolutions sont livrées dans SQL/migrations (flask db upgrade),
+-- qui détecte une base créée par ce script et n'applique que les migrations suivantes
 -- Optionnel : tout remettre à zéro proprement
+DROP MATERIALIZED VIEW IF EXISTS top_trains;
+DROP TABLE IF EXISTS schema_migrations;
+DROP TABLE IF EXISTS stats_counter CASCADE;
+DROP TABLE IF EXISTS timetable_version CASCADE;
+DROP TABLE IF EXISTS train_stop_digest CASCADE;
+DROP TABLE IF EXISTS train_stop CASCADE;
 DROP TABLE IF EXISTS reservation CASCADE;
 DROP TABLE IF EXISTS train CASCADE;
 DROP TABLE IF EXISTS utilisateur CASCADE;
@@ -21,7 +29,13 @@ CREATE TABLE train (
     source_station_code           VARCHAR(50),
     source_station_name           VARCHAR(200),
     destination_station_code      VARCHAR(50),
-    destination_station_name      VARCHAR(200)
+    destination_station_name      VARCHAR(200),
+    -- Places : seats_booked est tenu à jour dans la même instruction que chaque réservation/annulation
+    capacity                      INT NOT NULL DEFAULT 500,
+    seats_booked                  INT NOT NULL DEFAULT 0,
+    -- Train créé par flask load-timetable : seuls ces trains sont mis à jour ou supprimés par le chargement
+    timetable_managed             BOOLEAN NOT NULL DEFAULT FALSE,
+    CONSTRAINT ck_train_seats CHECK (seats_booked >= 0 AND seats_booked <= capacity)
 );
 
 -- ===== Table de Réservation (association N:N) =====
@@ -32,19 +46,128 @@ CREATE TABLE reservation (
     CONSTRAINT fk_res_user
         FOREIGN KEY (id_user)  REFERENCES utilisateur(id_user) ON DELETE CASCADE,
     CONSTRAINT fk_res_train
-        FOREIGN KEY (id_train) REFERENCES train(id_train)      ON DELETE CASCADE
+        FOREIGN KEY (id_train) REFERENCES train(id_train)      ON DELETE CASCADE,
     -- Empêche les doublons de réservation pour le même couple (user, train)
-    -- CONSTRAINT uq_res_user_train UNIQUE (id_user, id_train)
+    -- (requis par INSERT ... ON CONFLICT dans create_reservation)
+    CONSTRAINT uq_res_user_train UNIQUE (id_user, id_train)
 );
 
--- Index utiles (en plus des PK/UK) pour accélérer les recherches par FK
--- CREATE INDEX idx_reservation_id_user  ON reservation(id_user);
--- CREATE INDEX idx_reservation_id_train ON reservation(id_train);
+-- ===== Version des horaires (une seule ligne, incrémentée à chaque modification des trains) =====
+CREATE TABLE timetable_version (
+    id          SMALLINT PRIMARY KEY CHECK (id = 1),
+    version     BIGINT NOT NULL,
+    updated_at  TIMESTAMPTZ NOT NULL
+);
+INSERT INTO timetable_version (id, version, updated_at) VALUES (1, 1, NOW());
+
+-- ===== Table des arrêts (horaires détaillés par gare) =====
+CREATE TABLE train_stop (
+    train_number                  VARCHAR NOT NULL,
+    stop_sequence                 INT NOT NULL,
+    station_code                  VARCHAR(50),
+    station_name                  VARCHAR(200),
+    arrival_time                  TIME,
+    departure_time                TIME,
+    distance                      INT,
+    PRIMARY KEY (train_number, stop_sequence)
+);
+
+-- Empreinte des arrêts de chaque train chargé (flask load-timetable --delta)
+CREATE TABLE train_stop_digest (
+    train_number                  VARCHAR PRIMARY KEY,
+    digest                        CHAR(32) NOT NULL,
+    loaded_at                     TIMESTAMP NOT NULL
+);
+
+-- Index des clés étrangères (reservation.id_user est couvert par idx_reservation_user_id plus bas)
+-- et index de connexion : voir aussi SQL/migrations/0002_reservation_login_indexes.sql
+CREATE INDEX idx_reservation_id_train ON reservation(id_train);
+CREATE INDEX idx_utilisateur_login ON utilisateur (nom, prenom, age);
+
+-- ===== Recherche de gares (sous-chaîne, insensible à la casse et aux accents) =====
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() n'est pas IMMUTABLE : cette enveloppe permet de l'utiliser dans un index
+CREATE OR REPLACE FUNCTION f_normalize(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT lower(public.unaccent('public.unaccent'::regdictionary, $1)) $$;
+
+CREATE INDEX idx_train_source_name_trgm      ON train USING gin (f_normalize(source_station_name) gin_trgm_ops);
+CREATE INDEX idx_train_destination_name_trgm ON train USING gin (f_normalize(destination_station_name) gin_trgm_ops);
+CREATE INDEX idx_train_number_trgm           ON train USING gin (train_number gin_trgm_ops);
+
+-- ===== Recherche par trajet et plage horaire de départ =====
+CREATE INDEX idx_train_route_departure ON train (source_station_name, destination_station_name, departure_time, id_train);
+
+-- ===== Rapprochement des trains par numéro (chargement des horaires) =====
+CREATE INDEX idx_train_train_number ON train (train_number);
+-- train_number n'est pas unique, sauf parmi les trains du chargement (cible de ON CONFLICT)
+CREATE UNIQUE INDEX uq_train_timetable_number ON train (train_number) WHERE timetable_managed;
+
+-- ===== Pagination des réservations d'un utilisateur =====
+CREATE INDEX idx_reservation_user_id ON reservation (id_user, id_reservation);
+
+-- ===== Statistiques maintenues au fil de l'eau =====
+-- Compteurs de lignes par table, tenus à jour par des triggers de niveau instruction.
+-- Chaque connexion écrit dans sa propre tranche (pg_backend_pid() % 16) : les réservations
+-- concurrentes ne se disputent pas une même ligne de compteur. Total = SUM(value) par nom.
+CREATE TABLE stats_counter (
+    name   VARCHAR(50) NOT NULL,
+    shard  SMALLINT NOT NULL,
+    value  BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, shard)
+);
+
+CREATE OR REPLACE FUNCTION stats_counter_add(counter_name text, delta bigint) RETURNS void
+    LANGUAGE sql
+    AS $$
+        INSERT INTO stats_counter (name, shard, value)
+        VALUES (counter_name, pg_backend_pid() % 16, delta)
+        ON CONFLICT (name, shard) DO UPDATE SET value = stats_counter.value + EXCLUDED.value
+    $$;
+
+CREATE OR REPLACE FUNCTION stats_count_rows() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM stats_counter_add(TG_TABLE_NAME, (SELECT COUNT(*) FROM new_rows));
+        ELSE
+            PERFORM stats_counter_add(TG_TABLE_NAME, -(SELECT COUNT(*) FROM old_rows));
+        END IF;
+        RETURN NULL;
+    END
+    $$;
+
+CREATE TRIGGER trg_utilisateur_count_insert AFTER INSERT ON utilisateur
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_rows();
+CREATE TRIGGER trg_utilisateur_count_delete AFTER DELETE ON utilisateur
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_rows();
+CREATE TRIGGER trg_train_count_insert AFTER INSERT ON train
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_rows();
+CREATE TRIGGER trg_train_count_delete AFTER DELETE ON train
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_rows();
+CREATE TRIGGER trg_reservation_count_insert AFTER INSERT ON reservation
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_rows();
+CREATE TRIGGER trg_reservation_count_delete AFTER DELETE ON reservation
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_rows();
+
+-- Classement des trains les plus réservés (nombre de réservations = train.seats_booked),
+-- rafraîchi par flask refresh-stats / flask reconcile-stats
+CREATE MATERIALIZED VIEW top_trains AS
+SELECT id_train, train_number, source_station_name, destination_station_name,
+       seats_booked AS reservation_count, NOW() AS refreshed_at
+FROM train
+ORDER BY seats_booked DESC, id_train
+LIMIT 100;
+CREATE UNIQUE INDEX idx_top_trains_id_train ON top_trains (id_train);
 
 -- (Optionnel) Quelques commentaires pour la doc interne
 COMMENT ON TABLE utilisateur  IS 'Utilisateurs finaux';
 COMMENT ON TABLE train        IS 'Trajets (point A->B) et horaires';
 COMMENT ON TABLE reservation  IS 'Réservations liant utilisateurs et trains';
+COMMENT ON TABLE train_stop   IS 'Arrêts de chaque train (chargés par flask load-timetable)';
 
 -- Creation d'une table de stagging pour transformer les données
 CREATE TABLE train_stage (
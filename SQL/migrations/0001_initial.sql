@@ -0,0 +1,39 @@
+-- Schéma initial (SQL/Creation_script.sql d'origine, avant les évolutions introduites par les migrations suivantes)
+-- Sur une base déjà créée par cet ancien script ou par db.create_all(), flask db upgrade vérifie que
+-- ses tables existent et marque cette migration comme appliquée sans l'exécuter
+
+-- ===== Table Utilisateur =====
+CREATE TABLE utilisateur (
+    id_user      INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    nom          VARCHAR(100) NOT NULL,
+    prenom       VARCHAR(100) NOT NULL,
+    age          INT CHECK (age >= 0)
+);
+
+-- ===== Table Train (trajet + horaires) =====
+CREATE TABLE train (
+    id_train                      INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    train_number                  VARCHAR NOT NULL,
+    arrival_time                  TIME,
+    departure_time                TIME,
+    distance                      INT CHECK (distance >= 0),
+    source_station_code           VARCHAR(50),
+    source_station_name           VARCHAR(200),
+    destination_station_code      VARCHAR(50),
+    destination_station_name      VARCHAR(200)
+);
+
+-- ===== Table de Réservation (association N:N) =====
+CREATE TABLE reservation (
+    id_reservation  INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    id_user         INT NOT NULL,
+    id_train        INT NOT NULL,
+    CONSTRAINT fk_res_user
+        FOREIGN KEY (id_user)  REFERENCES utilisateur(id_user) ON DELETE CASCADE,
+    CONSTRAINT fk_res_train
+        FOREIGN KEY (id_train) REFERENCES train(id_train)      ON DELETE CASCADE
+);
+
+COMMENT ON TABLE utilisateur  IS 'Utilisateurs finaux';
+COMMENT ON TABLE train        IS 'Trajets (point A->B) et horaires';
+COMMENT ON TABLE reservation  IS 'Réservations liant utilisateurs et trains';
@@ -0,0 +1,29 @@
+-- Index des clés étrangères de reservation, unicité (id_user, id_train) et index de connexion
+-- migration: no-transaction
+-- CREATE INDEX CONCURRENTLY ne bloque pas les écritures mais ne peut pas s'exécuter dans une
+-- transaction : chaque instruction est exécutée séparément. IF NOT EXISTS rend la migration
+-- sans effet sur les bases créées par Creation_script.sql, qui contient déjà ces index
+
+-- reservation.id_user : pagination des réservations d'un utilisateur (absent des bases créées par db.create_all())
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reservation_user_id ON reservation (id_user, id_reservation);
+
+-- reservation.id_train : suppression d'un train (ON DELETE CASCADE) et jointures par train
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reservation_id_train ON reservation (id_train);
+
+-- Unicité (id_user, id_train), requise par INSERT ... ON CONFLICT dans create_reservation :
+-- l'index unique est construit sans verrou puis rattaché à la contrainte s'il n'y en a pas encore.
+-- Échoue si des doublons existent déjà (les supprimer puis relancer flask db upgrade)
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_res_user_train ON reservation (id_user, id_train);
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'reservation'::regclass AND conname = 'uq_res_user_train'
+    ) THEN
+        ALTER TABLE reservation ADD CONSTRAINT uq_res_user_train UNIQUE USING INDEX uq_res_user_train;
+    END IF;
+END
+$$;
+
+-- Connexion (get_user_by_credentials, user_exists) : égalité sur nom, prénom et âge
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_utilisateur_login ON utilisateur (nom, prenom, age);
@@ -0,0 +1,144 @@
+-- Places des trains, horaires détaillés, version des horaires, recherche de gares et statistiques
+-- migration: previous-checksum 1130b2cbaa2ab2b140cb913c17bd1780
+-- Amène une base du schéma initial (0001) à l'état de SQL/Creation_script.sql (avec 0004 et 0005). Chaque
+-- instruction est idempotente : sans effet sur une base déjà créée par la version actuelle de Creation_script.sql.
+-- Les index de la table train et la validation de ck_train_seats sont dans 0005, hors transaction : ici,
+-- ADD COLUMN verrouille train jusqu'à la validation, qui ne doit donc pas attendre un parcours de la table.
+-- L'empreinte précédente est celle de la version qui construisait ces index ici : les bases qui l'ont
+-- appliquée les ont déjà, 0005 est alors sans effet
+
+-- ===== Places : seats_booked tenu à jour dans la même instruction que chaque réservation/annulation =====
+ALTER TABLE train ADD COLUMN IF NOT EXISTS capacity INT NOT NULL DEFAULT 500;
+ALTER TABLE train ADD COLUMN IF NOT EXISTS seats_booked INT NOT NULL DEFAULT 0;
+
+-- Compteur initialisé depuis les réservations existantes (capacité relevée si elle est dépassée)
+UPDATE train t
+SET seats_booked = c.booked,
+    capacity = GREATEST(t.capacity, c.booked)
+FROM (
+    SELECT id_train, COUNT(*) AS booked
+    FROM reservation
+    GROUP BY id_train
+) c
+WHERE t.id_train = c.id_train
+  AND t.seats_booked <> c.booked;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'train'::regclass AND conname = 'ck_train_seats'
+    ) THEN
+        -- NOT VALID : vérifiée pour chaque écriture dès maintenant, les lignes existantes par 0005
+        ALTER TABLE train ADD CONSTRAINT ck_train_seats CHECK (seats_booked >= 0 AND seats_booked <= capacity) NOT VALID;
+    END IF;
+END
+$$;
+
+-- ===== Version des horaires (une seule ligne, incrémentée à chaque modification des trains) =====
+CREATE TABLE IF NOT EXISTS timetable_version (
+    id          SMALLINT PRIMARY KEY CHECK (id = 1),
+    version     BIGINT NOT NULL,
+    updated_at  TIMESTAMPTZ NOT NULL
+);
+INSERT INTO timetable_version (id, version, updated_at) VALUES (1, 1, NOW())
+ON CONFLICT (id) DO NOTHING;
+
+-- ===== Table des arrêts (horaires détaillés par gare) =====
+CREATE TABLE IF NOT EXISTS train_stop (
+    train_number                  VARCHAR NOT NULL,
+    stop_sequence                 INT NOT NULL,
+    station_code                  VARCHAR(50),
+    station_name                  VARCHAR(200),
+    arrival_time                  TIME,
+    departure_time                TIME,
+    distance                      INT,
+    PRIMARY KEY (train_number, stop_sequence)
+);
+
+-- Empreinte des arrêts de chaque train chargé (flask load-timetable --delta)
+CREATE TABLE IF NOT EXISTS train_stop_digest (
+    train_number                  VARCHAR PRIMARY KEY,
+    digest                        CHAR(32) NOT NULL,
+    loaded_at                     TIMESTAMP NOT NULL
+);
+
+-- ===== Recherche de gares (sous-chaîne, insensible à la casse et aux accents) =====
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() n'est pas IMMUTABLE : cette enveloppe permet de l'utiliser dans un index
+CREATE OR REPLACE FUNCTION f_normalize(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT lower(public.unaccent('public.unaccent'::regdictionary, $1)) $$;
+
+-- Index trigramme, par trajet et par numéro de train : 0005 (CREATE INDEX CONCURRENTLY)
+
+-- ===== Statistiques maintenues au fil de l'eau =====
+CREATE TABLE IF NOT EXISTS stats_counter (
+    name   VARCHAR(50) NOT NULL,
+    shard  SMALLINT NOT NULL,
+    value  BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, shard)
+);
+
+CREATE OR REPLACE FUNCTION stats_counter_add(counter_name text, delta bigint) RETURNS void
+    LANGUAGE sql
+    AS $$
+        INSERT INTO stats_counter (name, shard, value)
+        VALUES (counter_name, pg_backend_pid() % 16, delta)
+        ON CONFLICT (name, shard) DO UPDATE SET value = stats_counter.value + EXCLUDED.value
+    $$;
+
+CREATE OR REPLACE FUNCTION stats_count_rows() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM stats_counter_add(TG_TABLE_NAME, (SELECT COUNT(*) FROM new_rows));
+        ELSE
+            PERFORM stats_counter_add(TG_TABLE_NAME, -(SELECT COUNT(*) FROM old_rows));
+        END IF;
+        RETURN NULL;
+    END
+    $$;
+
+-- Compteurs initialisés avec le nombre de lignes existantes, puis tenus à jour par les triggers
+-- (le verrou pris par CREATE TRIGGER empêche toute écriture entre le comptage et la validation)
+DROP TRIGGER IF EXISTS trg_utilisateur_count_insert ON utilisateur;
+DROP TRIGGER IF EXISTS trg_utilisateur_count_delete ON utilisateur;
+DROP TRIGGER IF EXISTS trg_train_count_insert ON train;
+DROP TRIGGER IF EXISTS trg_train_count_delete ON train;
+DROP TRIGGER IF EXISTS trg_reservation_count_insert ON reservation;
+DROP TRIGGER IF EXISTS trg_reservation_count_delete ON reservation;
+
+CREATE TRIGGER trg_utilisateur_count_insert AFTER INSERT ON utilisateur
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_rows();
+CREATE TRIGGER trg_utilisateur_count_delete AFTER DELETE ON utilisateur
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_rows();
+CREATE TRIGGER trg_train_count_insert AFTER INSERT ON train
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_rows();
+CREATE TRIGGER trg_train_count_delete AFTER DELETE ON train
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_rows();
+CREATE TRIGGER trg_reservation_count_insert AFTER INSERT ON reservation
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_rows();
+CREATE TRIGGER trg_reservation_count_delete AFTER DELETE ON reservation
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION stats_count_rows();
+
+DELETE FROM stats_counter WHERE name IN ('utilisateur', 'train', 'reservation');
+INSERT INTO stats_counter (name, shard, value)
+SELECT 'utilisateur', 0, COUNT(*) FROM utilisateur
+UNION ALL SELECT 'train', 0, COUNT(*) FROM train
+UNION ALL SELECT 'reservation', 0, COUNT(*) FROM reservation;
+
+-- Classement des trains les plus réservés (nombre de réservations = train.seats_booked),
+-- rafraîchi par flask refresh-stats / flask reconcile-stats
+CREATE MATERIALIZED VIEW IF NOT EXISTS top_trains AS
+SELECT id_train, train_number, source_station_name, destination_station_name,
+       seats_booked AS reservation_count, NOW() AS refreshed_at
+FROM train
+ORDER BY seats_booked DESC, id_train
+LIMIT 100;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_top_trains_id_train ON top_trains (id_train);
+
+COMMENT ON TABLE train_stop   IS 'Arrêts de chaque train (chargés par flask load-timetable)';
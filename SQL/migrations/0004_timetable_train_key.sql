@@ -0,0 +1,24 @@
+-- Clé des trains gérés par le chargement des horaires (flask load-timetable)
+-- train_number n'est pas unique : un train saisi à la main ou importé peut porter le numéro d'un train
+-- du fichier. Le chargement ne met à jour et ne supprime plus que ses propres trains, marqués
+-- timetable_managed, dont le numéro est unique (index partiel, cible de INSERT ... ON CONFLICT)
+
+ALTER TABLE train ADD COLUMN IF NOT EXISTS timetable_managed BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Trains déjà chargés : pour chaque numéro du dernier chargement, le plus ancien train est celui du
+-- fichier. Les numéros qui ont déjà leur train géré sont laissés tels quels (migration rejouable)
+UPDATE train
+SET timetable_managed = TRUE
+WHERE id_train IN (
+    SELECT MIN(t.id_train)
+    FROM train t
+    JOIN train_stop_digest d ON d.train_number = t.train_number
+    WHERE NOT EXISTS (
+        SELECT 1 FROM train m WHERE m.train_number = t.train_number AND m.timetable_managed
+    )
+    GROUP BY t.train_number
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_train_timetable_number ON train (train_number) WHERE timetable_managed;
+
+COMMENT ON COLUMN train.timetable_managed IS 'Train créé par flask load-timetable (numéro unique parmi ces trains)';
@@ -0,0 +1,19 @@
+-- Index de recherche de la table train et validation de ck_train_seats, sans bloquer les écritures
+-- migration: no-transaction
+-- CREATE INDEX CONCURRENTLY et VALIDATE CONSTRAINT (verrou SHARE UPDATE EXCLUSIVE) laissent passer les
+-- réservations pendant le parcours de la table. IF NOT EXISTS : sans effet sur les bases créées par
+-- Creation_script.sql ou par une version antérieure de 0003, qui contiennent déjà ces index
+
+-- Lignes existantes de train : ck_train_seats est ajoutée NOT VALID par 0003 (sans effet si déjà validée)
+ALTER TABLE train VALIDATE CONSTRAINT ck_train_seats;
+
+-- ===== Recherche de gares (sous-chaîne, insensible à la casse et aux accents) =====
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_train_source_name_trgm      ON train USING gin (f_normalize(source_station_name) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_train_destination_name_trgm ON train USING gin (f_normalize(destination_station_name) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_train_number_trgm           ON train USING gin (train_number gin_trgm_ops);
+
+-- ===== Recherche par trajet et plage horaire de départ =====
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_train_route_departure ON train (source_station_name, destination_station_name, departure_time, id_train);
+
+-- ===== Rapprochement des trains par numéro (chargement des horaires) =====
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_train_train_number ON train (train_number);
@@ -3,28 +3,35 @@
 -- ===========================================
 -- Ce fichier contient toutes les requêtes SQL utilisées par l'application
 -- Toutes les requêtes utilisent des paramètres pour éviter les injections SQL
+-- Les requêtes précédées de `-- name: <nom>` sont chargées une fois au démarrage
+-- par app/database/registry.py ; une requête nommée se termine au premier `;`
 
 -- ===========================================
 -- REQUÊTES UTILISATEURS
 -- ===========================================
 
+-- name: get_user_by_credentials
 -- Récupérer un utilisateur par ses informations de connexion
 -- Paramètres: nom, prenom, age
 SELECT id_user, nom, prenom, age 
 FROM utilisateur 
 WHERE nom = %s AND prenom = %s AND age = %s;
 
+-- name: get_user_by_id
 -- Récupérer un utilisateur par ID
 -- Paramètres: id_user
 SELECT id_user, nom, prenom, age 
 FROM utilisateur 
 WHERE id_user = %s;
 
+-- name: create_user
 -- Créer un nouvel utilisateur
 -- Paramètres: nom, prenom, age
 INSERT INTO utilisateur (nom, prenom, age) 
-VALUES (%s, %s, %s);
+VALUES (%s, %s, %s) 
+RETURNING id_user;
 
+-- name: user_exists
 -- Vérifier si un utilisateur existe déjà
 -- Paramètres: nom, prenom, age
 SELECT COUNT(*) 
@@ -45,18 +52,23 @@ SELECT COUNT(*) FROM utilisateur;
 -- REQUÊTES TRAINS
 -- ===========================================
 
--- Récupérer tous les trains (avec pagination)
--- Paramètres: limit, offset
+-- name: get_all_trains
+-- Récupérer les trains page par page (pagination par clé sur id_train, parcours de la PK)
+-- Paramètres: after_id_train (NULL = première page), limit
 SELECT id_train, train_number, source_station_name, destination_station_name, 
-       departure_time, arrival_time, distance, source_station_code, destination_station_code
+       departure_time, arrival_time, distance, source_station_code, destination_station_code,
+       capacity, capacity - seats_booked AS seats_left
 FROM train 
+WHERE id_train > COALESCE(%s::int, -2147483648)
 ORDER BY id_train 
-LIMIT %s OFFSET %s;
+LIMIT %s;
 
+-- name: get_train_by_id
 -- Récupérer un train par ID
 -- Paramètres: id_train
 SELECT id_train, train_number, source_station_name, destination_station_name, 
-       departure_time, arrival_time, distance, source_station_code, destination_station_code
+       departure_time, arrival_time, distance, source_station_code, destination_station_code,
+       capacity, capacity - seats_booked AS seats_left
 FROM train 
 WHERE id_train = %s;
 
@@ -92,6 +104,18 @@ FROM train
 WHERE train_number ILIKE %s 
 ORDER BY id_train;
 
+-- name: search_trains
+-- Rechercher des trains par gare de départ, gare d'arrivée et/ou numéro (critères optionnels)
+-- Les gares sont comparées via f_normalize() (index trigramme, sans casse ni accents)
+-- Paramètres: source_pattern (x2), destination_pattern (x2), train_number_pattern (x2)
+SELECT id_train, train_number, source_station_name, destination_station_name, 
+       departure_time, arrival_time, distance
+FROM train 
+WHERE (f_normalize(source_station_name) LIKE f_normalize(%s) OR %s::text IS NULL)
+  AND (f_normalize(destination_station_name) LIKE f_normalize(%s) OR %s::text IS NULL)
+  AND (train_number ILIKE %s OR %s::text IS NULL)
+ORDER BY departure_time;
+
 -- Créer un nouveau train
 -- Paramètres: train_number, source_station_code, source_station_name, 
 --            destination_station_code, destination_station_name, 
@@ -120,6 +144,7 @@ WHERE id_train = %s;
 -- Paramètres: id_train
 DELETE FROM train WHERE id_train = %s;
 
+-- name: get_trains_count
 -- Compter le nombre total de trains
 SELECT COUNT(*) FROM train;
 
@@ -150,29 +175,112 @@ JOIN utilisateur u ON r.id_user = u.id_user
 JOIN train t ON r.id_train = t.id_train
 WHERE r.id_reservation = %s;
 
+-- name: reservation_exists
 -- Vérifier si une réservation existe déjà (utilisateur + train)
 -- Paramètres: id_user, id_train
 SELECT COUNT(*) 
 FROM reservation 
 WHERE id_user = %s AND id_train = %s;
 
--- Créer une nouvelle réservation
+-- name: create_reservation
+-- Réserver une place en un seul aller-retour : le compteur seats_booked du train n'est incrémenté
+-- que s'il reste une place (le verrou de ligne sur le train sérialise les réservations concurrentes)
+-- puis la réservation est insérée ; aucune ligne réservée si le couple existe déjà (uq_res_user_train)
+-- Si seat_taken est vrai sans id_reservation, l'appelant annule la transaction (place rendue)
 -- Paramètres: id_user, id_train
-INSERT INTO reservation (id_user, id_train) 
-VALUES (%s, %s);
+WITH params AS (
+    SELECT %s::int AS id_user, %s::int AS id_train
+),
+seat AS (
+    UPDATE train t
+    SET seats_booked = t.seats_booked + 1
+    FROM params p
+    WHERE t.id_train = p.id_train
+      AND t.seats_booked < t.capacity
+      AND NOT EXISTS (SELECT 1 FROM reservation r WHERE r.id_user = p.id_user AND r.id_train = p.id_train)
+    RETURNING t.id_train
+),
+inserted AS (
+    INSERT INTO reservation (id_user, id_train)
+    SELECT p.id_user, s.id_train FROM seat s, params p
+    ON CONFLICT (id_user, id_train) DO NOTHING
+    RETURNING id_reservation
+)
+SELECT (SELECT id_reservation FROM inserted) AS id_reservation,
+       EXISTS (SELECT 1 FROM seat) AS seat_taken,
+       EXISTS (SELECT 1 FROM reservation r, params p
+               WHERE r.id_user = p.id_user AND r.id_train = p.id_train) AS already_booked,
+       EXISTS (SELECT 1 FROM train t, params p WHERE t.id_train = p.id_train) AS train_exists;
+
+-- name: create_reservations
+-- Réserver plusieurs trains pour un utilisateur en une seule requête
+-- Les trains sont verrouillés dans l'ordre de id_train (pas d'interblocage entre réservations groupées)
+-- Une ligne par train demandé, mêmes colonnes que create_reservation
+-- Paramètres: train_ids (tableau), id_user
+WITH requested AS (
+    SELECT DISTINCT unnest(%s::int[]) AS id_train
+),
+params AS (
+    SELECT %s::int AS id_user
+),
+already AS (
+    SELECT r.id_train
+    FROM reservation r, params p
+    WHERE r.id_user = p.id_user AND r.id_train IN (SELECT id_train FROM requested)
+),
+locked AS (
+    SELECT t.id_train
+    FROM train t
+    WHERE t.id_train IN (SELECT id_train FROM requested)
+      AND t.id_train NOT IN (SELECT id_train FROM already)
+    ORDER BY t.id_train
+    FOR UPDATE
+),
+seat AS (
+    UPDATE train t
+    SET seats_booked = t.seats_booked + 1
+    FROM locked l
+    WHERE t.id_train = l.id_train
+      AND t.seats_booked < t.capacity
+    RETURNING t.id_train
+),
+inserted AS (
+    INSERT INTO reservation (id_user, id_train)
+    SELECT p.id_user, s.id_train FROM seat s, params p
+    ON CONFLICT (id_user, id_train) DO NOTHING
+    RETURNING id_train, id_reservation
+)
+SELECT q.id_train, i.id_reservation,
+       s.id_train IS NOT NULL AS seat_taken,
+       q.id_train IN (SELECT id_train FROM already) AS already_booked,
+       EXISTS (SELECT 1 FROM train t WHERE t.id_train = q.id_train) AS train_exists
+FROM requested q
+LEFT JOIN seat s ON s.id_train = q.id_train
+LEFT JOIN inserted i ON i.id_train = q.id_train
+ORDER BY q.id_train;
 
 -- Supprimer une réservation
 -- Paramètres: id_reservation
 DELETE FROM reservation WHERE id_reservation = %s;
 
--- Supprimer une réservation d'un utilisateur spécifique
+-- name: cancel_reservation
+-- Supprimer une réservation d'un utilisateur spécifique et rendre sa place au train
 -- Paramètres: id_reservation, id_user
-DELETE FROM reservation 
-WHERE id_reservation = %s AND id_user = %s;
+WITH deleted AS (
+    DELETE FROM reservation 
+    WHERE id_reservation = %s AND id_user = %s
+    RETURNING id_train
+)
+UPDATE train t
+SET seats_booked = t.seats_booked - 1
+FROM deleted d
+WHERE t.id_train = d.id_train
+RETURNING t.id_train;
 
 -- name: get_reservations_by_user
--- Récupérer les réservations d'un utilisateur spécifique
--- Paramètres: id_user
+-- Récupérer les réservations d'un utilisateur spécifique, les plus récentes d'abord
+-- Pagination par clé sur id_reservation (index idx_reservation_user_id)
+-- Paramètres: id_user, before_id_reservation (NULL = première page), limit (NULL = toutes)
 SELECT r.id_reservation, r.id_user, r.id_train,
        u.nom, u.prenom, u.age,
        t.train_number, t.source_station_name, t.destination_station_name,
@@ -181,7 +289,9 @@ FROM reservation r
 JOIN utilisateur u ON r.id_user = u.id_user
 JOIN train t ON r.id_train = t.id_train
 WHERE r.id_user = %s
-ORDER BY r.id_reservation DESC;
+  AND r.id_reservation < COALESCE(%s::int, 2147483647)
+ORDER BY r.id_reservation DESC
+LIMIT %s;
 
 -- Récupérer toutes les réservations (avec pagination)
 -- Paramètres: limit, offset
@@ -206,20 +316,55 @@ SELECT COUNT(*) FROM reservation WHERE id_user = %s;
 -- REQUÊTES DE STATISTIQUES
 -- ===========================================
 
--- Statistiques générales
+-- name: get_database_stats
+-- Statistiques générales, lues sur les compteurs maintenus par trigger (pas de COUNT(*))
 SELECT 
-    (SELECT COUNT(*) FROM utilisateur) as total_users,
-    (SELECT COUNT(*) FROM train) as total_trains,
-    (SELECT COUNT(*) FROM reservation) as total_reservations;
-
--- Top 5 des trains les plus réservés
-SELECT t.train_number, t.source_station_name, t.destination_station_name,
-       COUNT(r.id_reservation) as reservation_count
-FROM train t
-LEFT JOIN reservation r ON t.id_train = r.id_train
-GROUP BY t.id_train, t.train_number, t.source_station_name, t.destination_station_name
-ORDER BY reservation_count DESC
-LIMIT 5;
+    COALESCE(SUM(value) FILTER (WHERE name = 'utilisateur'), 0) as total_users,
+    COALESCE(SUM(value) FILTER (WHERE name = 'train'), 0) as total_trains,
+    COALESCE(SUM(value) FILTER (WHERE name = 'reservation'), 0) as total_reservations
+FROM stats_counter;
+
+-- name: get_top_trains
+-- Top N des trains les plus réservés (vue matérialisée top_trains, 100 premiers)
+-- Paramètres: limit
+SELECT train_number, source_station_name, destination_station_name,
+       reservation_count, refreshed_at
+FROM top_trains
+ORDER BY reservation_count DESC, id_train
+LIMIT %s;
+
+-- name: refresh_top_trains
+-- Recalculer le classement des trains les plus réservés sans bloquer les lectures
+REFRESH MATERIALIZED VIEW CONCURRENTLY top_trains;
+
+-- name: stats_lock_tables
+-- Geler les écritures pendant le recalcul des compteurs (les lectures restent possibles)
+LOCK TABLE utilisateur, train, reservation IN SHARE MODE;
+
+-- name: stats_counter_drift
+-- Comparer les compteurs maintenus aux comptes exacts
+WITH actual AS (
+    SELECT 'utilisateur' AS name, COUNT(*) AS value FROM utilisateur
+    UNION ALL
+    SELECT 'train', COUNT(*) FROM train
+    UNION ALL
+    SELECT 'reservation', COUNT(*) FROM reservation
+)
+SELECT a.name, COALESCE(SUM(c.value), 0) AS stored, a.value AS actual
+FROM actual a
+LEFT JOIN stats_counter c ON c.name = a.name
+GROUP BY a.name, a.value
+ORDER BY a.name;
+
+-- name: stats_counter_reset
+-- Supprimer toutes les tranches des compteurs recalculés
+-- Paramètres: noms
+DELETE FROM stats_counter WHERE name = ANY(%s);
+
+-- name: stats_counter_set
+-- Écrire la valeur exacte d'un compteur (tranche 0)
+-- Paramètres: nom, valeur
+INSERT INTO stats_counter (name, shard, value) VALUES (%s, 0, %s);
 
 -- Top 5 des utilisateurs les plus actifs
 SELECT u.nom, u.prenom, COUNT(r.id_reservation) as reservation_count
@@ -259,8 +404,9 @@ WHERE (source_station_name ILIKE %s OR %s IS NULL)
   AND (distance <= %s OR %s IS NULL)
 ORDER BY departure_time;
 
+-- name: get_available_trains_for_user
 -- Recherche de trains disponibles (non réservés par un utilisateur)
--- Paramètres: id_user, source_station_name, destination_station_name
+-- Paramètres: id_user, source_pattern (x2), destination_pattern (x2)
 SELECT t.id_train, t.train_number, t.source_station_name, t.destination_station_name, 
        t.departure_time, t.arrival_time, t.distance
 FROM train t
@@ -269,20 +415,51 @@ WHERE t.id_train NOT IN (
     FROM reservation r 
     WHERE r.id_user = %s
 )
-AND (t.source_station_name ILIKE %s OR %s IS NULL)
-AND (t.destination_station_name ILIKE %s OR %s IS NULL)
+AND (f_normalize(t.source_station_name) LIKE f_normalize(%s) OR %s::text IS NULL)
+AND (f_normalize(t.destination_station_name) LIKE f_normalize(%s) OR %s::text IS NULL)
 ORDER BY t.departure_time;
 
+-- name: search_trains_by_route
+-- Recherche de trains sur un trajet exact (gares choisies dans les listes) dans une plage horaire
+-- Servie par idx_train_route_departure : parcours d'intervalle sur (départ, arrivée, heure de départ)
+-- Paramètres: source_station_name, destination_station_name, departure_from, departure_to,
+--             include_unscheduled (trains sans heure de départ, si aucune plage),
+--             curseur (after_id, after_time, after_id, after_time, after_id ; NULL = première page),
+--             limit (NULL = tous)
+-- seats_left est lu sur le compteur seats_booked du train (pas de COUNT des réservations)
+SELECT t.id_train, t.train_number, t.source_station_name, t.destination_station_name, 
+       t.departure_time, t.arrival_time, t.distance,
+       t.capacity, t.capacity - t.seats_booked AS seats_left
+FROM train t
+WHERE t.source_station_name = %s
+  AND t.destination_station_name = %s
+  AND (t.departure_time BETWEEN COALESCE(%s::time, '00:00'::time) AND COALESCE(%s::time, '23:59:59.999999'::time)
+       OR (%s::boolean AND t.departure_time IS NULL))
+  -- Reprise après la dernière ligne vue, dans l'ordre (departure_time NULLS LAST, id_train)
+  AND (%s::int IS NULL
+       OR (t.departure_time, t.id_train) > (%s::time, %s::int)
+       OR (t.departure_time IS NULL AND (%s::time IS NOT NULL OR t.id_train > %s::int)))
+ORDER BY t.departure_time, t.id_train
+LIMIT %s;
+
 -- name: search_trains_by_criteria
--- Recherche de trains par critères de recherche
--- Paramètres: source_station_name, destination_station_name, departure_time
-SELECT DISTINCT t.id_train, t.train_number, t.source_station_name, t.destination_station_name, 
-       t.departure_time, t.arrival_time, t.distance
+-- Recherche de trains par gares (sous-chaîne, index trigramme) dans une plage horaire
+-- Paramètres: source_pattern, destination_pattern, departure_from, departure_to,
+--             include_unscheduled, curseur (voir search_trains_by_route), limit (NULL = tous)
+SELECT t.id_train, t.train_number, t.source_station_name, t.destination_station_name, 
+       t.departure_time, t.arrival_time, t.distance,
+       t.capacity, t.capacity - t.seats_booked AS seats_left
 FROM train t
-WHERE t.source_station_name ILIKE %s
-  AND t.destination_station_name ILIKE %s
-  AND (t.departure_time::text LIKE %s OR %s IS NULL)
-ORDER BY t.departure_time;
+WHERE f_normalize(t.source_station_name) LIKE f_normalize(%s)
+  AND f_normalize(t.destination_station_name) LIKE f_normalize(%s)
+  AND (t.departure_time BETWEEN COALESCE(%s::time, '00:00'::time) AND COALESCE(%s::time, '23:59:59.999999'::time)
+       OR (%s::boolean AND t.departure_time IS NULL))
+  -- Reprise après la dernière ligne vue, dans l'ordre (departure_time NULLS LAST, id_train)
+  AND (%s::int IS NULL
+       OR (t.departure_time, t.id_train) > (%s::time, %s::int)
+       OR (t.departure_time IS NULL AND (%s::time IS NOT NULL OR t.id_train > %s::int)))
+ORDER BY t.departure_time, t.id_train
+LIMIT %s;
 
 -- name: get_unique_stations
 -- Récupère toutes les gares uniques (départ et arrivée)
@@ -305,6 +482,482 @@ FROM train
 WHERE departure_time IS NOT NULL
 ORDER BY departure_time;
 
+-- name: get_station_routes
+-- Liaisons distinctes départ -> arrivée (catalogue des gares mis en cache par l'application)
+SELECT DISTINCT source_station_name, source_station_code,
+       destination_station_name, destination_station_code
+FROM train;
+
+-- name: get_timetable_version
+-- Version courante des horaires (ETag des pages et API de consultation)
+SELECT version, updated_at FROM timetable_version WHERE id = 1;
+
+-- name: bump_timetable_version
+-- Incrémenter la version des horaires après une modification de la table train
+INSERT INTO timetable_version (id, version, updated_at)
+VALUES (1, 1, NOW())
+ON CONFLICT (id) DO UPDATE
+SET version = timetable_version.version + 1, updated_at = NOW()
+RETURNING version, updated_at;
+
+-- ===========================================
+-- CHARGEMENT DES HORAIRES (flask load-timetable)
+-- ===========================================
+-- Après le COPY de data/Train_details.csv dans la table temporaire timetable_stage
+-- (colonnes texte + line_no dans l'ordre du fichier), les trains sont appliqués par lots :
+-- le paramètre train_numbers est un tableau de numéros de train
+
+-- name: timetable_clean_stops
+-- Arrêts typés et numérotés dans l'ordre du fichier (lignes sans gare de départ/arrivée et train 'K' écartés)
+CREATE TEMP TABLE timetable_stops AS
+SELECT TRIM(train_number) AS train_number,
+       ROW_NUMBER() OVER (PARTITION BY TRIM(train_number) ORDER BY line_no)::int AS stop_sequence,
+       NULLIF(TRIM(station_code), '') AS station_code,
+       NULLIF(TRIM(station_name), '') AS station_name,
+       CASE WHEN TRIM(arrival_time) ~ '^([01]?[0-9]|2[0-3]):[0-5][0-9](:[0-5][0-9])?$'
+            THEN NULLIF(TRIM(arrival_time)::time, '00:00:00') END AS arrival_time,
+       CASE WHEN TRIM(departure_time) ~ '^([01]?[0-9]|2[0-3]):[0-5][0-9](:[0-5][0-9])?$'
+            THEN NULLIF(TRIM(departure_time)::time, '00:00:00') END AS departure_time,
+       CASE WHEN TRIM(distance) ~ '^[0-9]+(\.[0-9]+)?$' THEN TRIM(distance)::numeric::int END AS distance,
+       NULLIF(TRIM(source_station_code), '') AS source_station_code,
+       NULLIF(TRIM(source_station_name), '') AS source_station_name,
+       NULLIF(TRIM(destination_station_code), '') AS destination_station_code,
+       NULLIF(TRIM(destination_station_name), '') AS destination_station_name
+FROM timetable_stage
+WHERE TRIM(train_number) NOT IN ('', 'K')
+  AND NULLIF(TRIM(source_station_code), '') IS NOT NULL
+  AND NULLIF(TRIM(destination_station_code), '') IS NOT NULL;
+
+-- name: timetable_index_stops
+-- Index de la table temporaire pour les lots par numéro de train
+CREATE INDEX ON timetable_stops (train_number, stop_sequence);
+
+-- name: timetable_digests
+-- Empreinte de la suite d'arrêts de chaque train (comparée à train_stop_digest en mode delta)
+CREATE TEMP TABLE timetable_digests AS
+SELECT train_number,
+       md5(string_agg(ROW(stop_sequence, station_code, station_name, arrival_time, departure_time,
+                          distance, source_station_code, source_station_name,
+                          destination_station_code, destination_station_name)::text,
+                      E'\n' ORDER BY stop_sequence)) AS digest
+FROM timetable_stops
+GROUP BY train_number;
+
+-- name: timetable_derive_trains
+-- Une ligne train par numéro : départ du premier arrêt, arrivée et distance du dernier
+CREATE TEMP TABLE timetable_trains AS
+SELECT DISTINCT ON (train_number)
+       train_number,
+       source_station_code, source_station_name,
+       destination_station_code, destination_station_name,
+       FIRST_VALUE(departure_time) OVER w AS departure_time,
+       LAST_VALUE(arrival_time) OVER w AS arrival_time,
+       LAST_VALUE(distance) OVER w AS distance
+FROM timetable_stops
+WINDOW w AS (PARTITION BY train_number ORDER BY stop_sequence
+             ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+ORDER BY train_number, stop_sequence;
+
+-- name: timetable_all_trains
+-- Tous les trains du fichier (chargement complet)
+SELECT train_number FROM timetable_digests ORDER BY train_number;
+
+-- name: timetable_changed_trains
+-- Trains nouveaux ou dont la suite d'arrêts a changé depuis le dernier chargement
+SELECT d.train_number
+FROM timetable_digests d
+LEFT JOIN train_stop_digest s ON s.train_number = d.train_number
+WHERE s.digest IS DISTINCT FROM d.digest
+ORDER BY d.train_number;
+
+-- name: timetable_removed_trains
+-- Trains chargés précédemment et absents du fichier (les trains saisis à la main ne sont pas concernés)
+SELECT s.train_number
+FROM train_stop_digest s
+WHERE NOT EXISTS (SELECT 1 FROM timetable_digests d WHERE d.train_number = s.train_number)
+ORDER BY s.train_number;
+
+-- name: timetable_delete_stops
+-- Supprimer les arrêts d'un lot de trains
+-- Paramètres: train_numbers
+DELETE FROM train_stop WHERE train_number = ANY(%s);
+
+-- name: timetable_insert_stops
+-- Insérer les arrêts chargés d'un lot de trains
+-- Paramètres: train_numbers
+INSERT INTO train_stop (train_number, stop_sequence, station_code, station_name,
+                        arrival_time, departure_time, distance)
+SELECT train_number, stop_sequence, station_code, station_name,
+       arrival_time, departure_time, distance
+FROM timetable_stops
+WHERE train_number = ANY(%s);
+
+-- name: timetable_adopt_trains
+-- Reprendre les trains d'un lot qui n'ont pas encore de train géré par le chargement : le plus ancien
+-- train de chaque numéro (base remplie par l'ancien script de chargement, avant timetable_managed)
+-- devient celui du fichier au lieu d'être doublé par timetable_insert_trains
+-- Paramètres: train_numbers
+UPDATE train
+SET timetable_managed = TRUE
+WHERE id_train IN (
+    SELECT MIN(t.id_train)
+    FROM train t
+    WHERE t.train_number = ANY(%s)
+      AND NOT EXISTS (
+          SELECT 1 FROM train m WHERE m.train_number = t.train_number AND m.timetable_managed
+      )
+    GROUP BY t.train_number
+);
+
+-- name: timetable_update_trains
+-- Mettre à jour les trains existants dont le trajet a changé (id_train et réservations conservés)
+-- Paramètres: train_numbers
+UPDATE train t
+SET source_station_code = d.source_station_code,
+    source_station_name = d.source_station_name,
+    destination_station_code = d.destination_station_code,
+    destination_station_name = d.destination_station_name,
+    departure_time = d.departure_time,
+    arrival_time = d.arrival_time,
+    distance = d.distance
+FROM timetable_trains d
+WHERE d.train_number = ANY(%s)
+  AND t.train_number = d.train_number
+  AND t.timetable_managed
+  AND (t.source_station_code, t.source_station_name, t.destination_station_code,
+       t.destination_station_name, t.departure_time, t.arrival_time, t.distance)
+      IS DISTINCT FROM
+      (d.source_station_code, d.source_station_name, d.destination_station_code,
+       d.destination_station_name, d.departure_time, d.arrival_time, d.distance);
+
+-- name: timetable_insert_trains
+-- Créer les trains d'un lot qui n'ont encore aucun train de ce numéro (voir timetable_adopt_trains)
+-- Paramètres: train_numbers
+INSERT INTO train (train_number, source_station_code, source_station_name,
+                   destination_station_code, destination_station_name,
+                   departure_time, arrival_time, distance, timetable_managed)
+SELECT d.train_number, d.source_station_code, d.source_station_name,
+       d.destination_station_code, d.destination_station_name,
+       d.departure_time, d.arrival_time, d.distance, TRUE
+FROM timetable_trains d
+WHERE d.train_number = ANY(%s)
+ON CONFLICT (train_number) WHERE timetable_managed DO NOTHING;
+
+-- name: timetable_upsert_digests
+-- Enregistrer l'empreinte des trains d'un lot
+-- Paramètres: train_numbers
+INSERT INTO train_stop_digest (train_number, digest, loaded_at)
+SELECT train_number, digest, NOW()
+FROM timetable_digests
+WHERE train_number = ANY(%s)
+ON CONFLICT (train_number) DO UPDATE
+SET digest = EXCLUDED.digest, loaded_at = EXCLUDED.loaded_at;
+
+-- name: timetable_delete_trains
+-- Supprimer les trains du chargement retirés du fichier (leurs réservations suivent par ON DELETE CASCADE)
+-- Paramètres: train_numbers
+DELETE FROM train WHERE train_number = ANY(%s) AND timetable_managed;
+
+-- name: timetable_delete_digests
+-- Oublier l'empreinte des trains retirés
+-- Paramètres: train_numbers
+DELETE FROM train_stop_digest WHERE train_number = ANY(%s);
+
+-- name: timetable_drop_staging
+-- Supprimer les tables temporaires avant de rendre la connexion au pool
+DROP TABLE IF EXISTS timetable_trains, timetable_digests, timetable_stops, timetable_stage;
+
+-- ===========================================
+-- ADMINISTRATION GROUPÉE DES TRAINS (/train/bulk, flask import-trains)
+-- ===========================================
+
+-- name: bulk_copy_trains
+-- Insérer les trains d'un fichier déjà validé en un seul COPY (champ vide non cité = NULL)
+COPY train (train_number, source_station_code, source_station_name,
+            destination_station_code, destination_station_name,
+            departure_time, arrival_time, distance, capacity)
+FROM STDIN WITH (FORMAT csv);
+
+-- name: bulk_select_trains
+-- Trains correspondant au filtre, verrouillés jusqu'à la fin de la modification ou de la suppression
+-- Un critère NULL est ignoré ; l'appelant exige au moins un critère
+-- Paramètres: ids (x2), train_number (x2), source_station_name (x2), destination_station_name (x2),
+--             departure_from (x2), departure_to (x2)
+SELECT id_train, train_number, seats_booked
+FROM train
+WHERE (id_train = ANY(%s::int[]) OR %s::int[] IS NULL)
+  AND (train_number = %s OR %s::text IS NULL)
+  AND (source_station_name = %s OR %s::text IS NULL)
+  AND (destination_station_name = %s OR %s::text IS NULL)
+  AND (departure_time >= %s OR %s::time IS NULL)
+  AND (departure_time <= %s OR %s::time IS NULL)
+ORDER BY id_train
+FOR UPDATE;
+
+-- name: bulk_update_trains
+-- Modifier les colonnes demandées (drapeau vrai) des trains sélectionnés, les autres sont conservées
+-- Paramètres: (modifier, valeur) pour train_number, source_station_code, source_station_name,
+--             destination_station_code, destination_station_name, departure_time, arrival_time,
+--             distance, capacity ; puis ids
+UPDATE train SET
+    train_number = CASE WHEN %s THEN %s ELSE train_number END,
+    source_station_code = CASE WHEN %s THEN %s ELSE source_station_code END,
+    source_station_name = CASE WHEN %s THEN %s ELSE source_station_name END,
+    destination_station_code = CASE WHEN %s THEN %s ELSE destination_station_code END,
+    destination_station_name = CASE WHEN %s THEN %s ELSE destination_station_name END,
+    departure_time = CASE WHEN %s THEN %s::time ELSE departure_time END,
+    arrival_time = CASE WHEN %s THEN %s::time ELSE arrival_time END,
+    distance = CASE WHEN %s THEN %s::int ELSE distance END,
+    capacity = CASE WHEN %s THEN %s::int ELSE capacity END
+WHERE id_train = ANY(%s);
+
+-- name: bulk_delete_trains
+-- Supprimer les trains sélectionnés (leurs réservations suivent par ON DELETE CASCADE)
+-- Paramètres: ids
+DELETE FROM train WHERE id_train = ANY(%s);
+
+-- ===========================================
+-- TEST DE CHARGE DES RÉSERVATIONS (flask stress-booking)
+-- ===========================================
+
+-- name: stress_create_train
+-- Train temporaire (sans gares, donc absent du catalogue) avec une capacité donnée
+-- Paramètres: train_number, capacity
+INSERT INTO train (train_number, capacity)
+VALUES (%s, %s)
+RETURNING id_train;
+
+-- name: stress_create_users
+-- Utilisateurs temporaires
+-- Paramètres: nom, nombre d'utilisateurs
+INSERT INTO utilisateur (nom, prenom, age)
+SELECT %s, 'user' || g, 30
+FROM generate_series(1, %s) g
+RETURNING id_user;
+
+-- name: stress_booking_counts
+-- Compteur de places et réservations réelles du train de test
+-- Paramètres: id_train
+SELECT t.capacity, t.seats_booked,
+       (SELECT COUNT(*) FROM reservation r WHERE r.id_train = t.id_train) AS reservations,
+       (SELECT COUNT(DISTINCT r.id_user) FROM reservation r WHERE r.id_train = t.id_train) AS distinct_users
+FROM train t
+WHERE t.id_train = %s;
+
+-- name: stress_delete_users
+-- Supprimer les utilisateurs temporaires (et leurs réservations)
+-- Paramètres: id_users
+DELETE FROM utilisateur WHERE id_user = ANY(%s);
+
+-- name: stress_delete_train
+-- Supprimer le train temporaire
+-- Paramètres: id_train
+DELETE FROM train WHERE id_train = %s;
+
+-- ===========================================
+-- JEU DE DONNÉES SYNTHÉTIQUE (flask seed-synthetic / flask load-test)
+-- ===========================================
+-- Utilisateurs nom = 'Synthetique', prenom = 'U<n>', age = 30 ; trains 'SYN-<k>' entre les gares
+-- 'Synthetique <s>' : le k-ième train relie la gare mod(k, gares) à une autre gare calculée
+
+-- name: synthetic_delete_users
+-- Supprimer les utilisateurs synthétiques (et leurs réservations)
+DELETE FROM utilisateur WHERE nom = 'Synthetique';
+
+-- name: synthetic_delete_trains
+-- Supprimer les trains synthétiques (et leurs réservations)
+DELETE FROM train WHERE starts_with(train_number, 'SYN-');
+
+-- name: synthetic_insert_users
+-- Paramètres: première valeur de n, dernière valeur de n (exclue)
+INSERT INTO utilisateur (nom, prenom, age)
+SELECT 'Synthetique', 'U' || n, 30
+FROM generate_series(%s::bigint, %s::bigint - 1) n;
+
+-- name: synthetic_insert_trains
+-- Paramètres: nombre de gares, capacité, première valeur de k, dernière valeur de k (exclue)
+WITH p AS (SELECT %s::bigint AS stations, %s::int AS capacity)
+INSERT INTO train (train_number, departure_time, arrival_time, distance,
+                   source_station_code, source_station_name,
+                   destination_station_code, destination_station_name, capacity)
+SELECT 'SYN-' || k,
+       TIME '00:00' + mod(k * 37, 1440) * INTERVAL '1 minute',
+       TIME '00:00' + (mod(k * 37, 1440) + 30 + mod(k, 600)) * INTERVAL '1 minute',
+       10 + mod(k, 1000),
+       'SYN' || s.src, 'Synthetique ' || s.src,
+       'SYN' || s.dst, 'Synthetique ' || s.dst,
+       p.capacity
+FROM generate_series(%s::bigint, %s::bigint - 1) k
+CROSS JOIN p
+CROSS JOIN LATERAL (
+    SELECT mod(k, p.stations) AS src,
+           mod(mod(k, p.stations) + 1 + mod(k * 7919, p.stations - 1), p.stations) AS dst
+) s;
+
+-- name: synthetic_insert_reservations
+-- Réservation i : utilisateur mod(i, utilisateurs), train décalé pour chaque utilisateur (couples distincts)
+-- Paramètres: nombre d'utilisateurs, nombre de trains, premier i, dernier i (exclu)
+WITH p AS (SELECT %s::bigint AS users, %s::bigint AS trains),
+u AS (
+    SELECT id_user, ROW_NUMBER() OVER (ORDER BY id_user) - 1 AS n
+    FROM utilisateur WHERE nom = 'Synthetique'
+),
+t AS (
+    SELECT id_train, ROW_NUMBER() OVER (ORDER BY id_train) - 1 AS n
+    FROM train WHERE starts_with(train_number, 'SYN-')
+)
+INSERT INTO reservation (id_user, id_train)
+SELECT u.id_user, t.id_train
+FROM generate_series(%s::bigint, %s::bigint - 1) i
+CROSS JOIN p
+JOIN u ON u.n = mod(i, p.users)
+JOIN t ON t.n = mod(u.n * 7919 + i / p.users, p.trains)
+ON CONFLICT ON CONSTRAINT uq_res_user_train DO NOTHING;
+
+-- name: synthetic_sync_seats
+-- Aligner capacité et places réservées des trains synthétiques sur les réservations insérées
+UPDATE train t
+SET seats_booked = c.booked,
+    capacity = GREATEST(t.capacity, c.booked)
+FROM (
+    SELECT id_train, COUNT(*) AS booked
+    FROM reservation
+    GROUP BY id_train
+) c
+WHERE t.id_train = c.id_train
+  AND starts_with(t.train_number, 'SYN-');
+
+-- name: synthetic_user_count
+-- Nombre d'utilisateurs synthétiques (prénoms U0 à U<n-1>)
+SELECT COUNT(*) AS users FROM utilisateur WHERE nom = 'Synthetique';
+
+-- name: synthetic_sample_routes
+-- Échantillon de trajets synthétiques existants pour le test de charge
+-- Paramètres: nombre de trajets
+SELECT DISTINCT source_station_name, destination_station_name
+FROM (
+    SELECT source_station_name, destination_station_name
+    FROM train
+    WHERE starts_with(train_number, 'SYN-')
+    ORDER BY random()
+    LIMIT %s
+) s;
+
+-- name: synthetic_analyze
+-- Statistiques du planificateur à jour après le chargement
+ANALYZE utilisateur, train, reservation;
+
+-- ===========================================
+-- EXPORTS EN MASSE (JSON / NDJSON en flux)
+-- ===========================================
+-- Lues sur un curseur côté serveur : une seule requête par export, quelle que soit sa taille.
+-- Les heures sont formatées en HH:MM par PostgreSQL, comme Train.to_dict()
+
+-- name: export_reservations
+-- Réservations avec leur utilisateur et leur train (format de Reservation.to_dict())
+-- Paramètres: id_user, id_user, id_train, id_train (NULL = pas de filtre)
+SELECT r.id_reservation, r.id_user, r.id_train,
+       u.nom, u.prenom, u.age,
+       t.train_number, to_char(t.arrival_time, 'HH24:MI'), to_char(t.departure_time, 'HH24:MI'), t.distance,
+       t.source_station_code, t.source_station_name, t.destination_station_code, t.destination_station_name,
+       t.capacity, t.capacity - t.seats_booked
+FROM reservation r
+JOIN utilisateur u ON u.id_user = r.id_user
+JOIN train t ON t.id_train = r.id_train
+WHERE (%s::int IS NULL OR r.id_user = %s::int)
+  AND (%s::int IS NULL OR r.id_train = %s::int)
+ORDER BY r.id_reservation;
+
+-- name: export_users
+-- Tous les utilisateurs (format de User.to_dict())
+SELECT id_user, nom, prenom, age
+FROM utilisateur
+ORDER BY id_user;
+
+-- name: export_trains
+-- Tous les trains (format de Train.to_dict())
+SELECT id_train, train_number, to_char(arrival_time, 'HH24:MI'), to_char(departure_time, 'HH24:MI'), distance,
+       source_station_code, source_station_name, destination_station_code, destination_station_name,
+       capacity, capacity - seats_booked
+FROM train
+ORDER BY id_train;
+
+-- name: export_reservation_links
+-- Toutes les réservations, sans les données liées (exportées à part)
+SELECT id_reservation, id_user, id_train
+FROM reservation
+ORDER BY id_reservation;
+
+-- ===========================================
+-- MICRO-BENCHMARKS (flask bench-queries)
+-- ===========================================
+
+-- name: bench_table_sizes
+-- Nombre estimé de lignes des tables et vues matérialisées (un parcours séquentiel d'une grande table est signalé)
+SELECT c.relname, c.reltuples::bigint
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = current_schema()
+  AND c.relkind IN ('r', 'm');
+
+-- ===========================================
+-- MIGRATIONS DU SCHÉMA (flask db upgrade)
+-- ===========================================
+
+-- name: migration_create_table
+-- Journal des migrations appliquées (créé au premier flask db upgrade)
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version     INT PRIMARY KEY,
+    name        VARCHAR(200) NOT NULL,
+    checksum    CHAR(32) NOT NULL,
+    applied_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    baseline    BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+-- name: migration_table_exists
+-- Le journal des migrations existe-t-il ? (flask db current / history ne le créent pas)
+SELECT to_regclass('schema_migrations') IS NOT NULL;
+
+-- name: migration_applied
+-- Migrations appliquées
+SELECT version, name, checksum, applied_at, baseline
+FROM schema_migrations
+ORDER BY version;
+
+-- name: migration_record
+-- Enregistrer une migration appliquée
+-- Paramètres: version, name, checksum, baseline
+INSERT INTO schema_migrations (version, name, checksum, baseline)
+VALUES (%s, %s, %s, %s);
+
+-- name: migration_update_checksum
+-- Empreinte d'une migration appliquée puis modifiée sans effet sur la base (-- migration: previous-checksum)
+-- Paramètres: checksum, version
+UPDATE schema_migrations SET checksum = %s WHERE version = %s;
+
+-- name: migration_schema_exists
+-- Schéma créé avant les migrations (Creation_script.sql ou db.create_all()) : tables de 0001 présentes
+SELECT name, to_regclass(name) IS NOT NULL AS present
+FROM unnest(ARRAY['utilisateur', 'train', 'reservation']) AS name;
+
+-- name: migration_lock
+-- Verrou consultatif de session : un seul flask db upgrade à la fois
+-- Paramètres: clé
+SELECT pg_advisory_lock(%s);
+
+-- name: migration_unlock
+-- Paramètres: clé
+SELECT pg_advisory_unlock(%s);
+
+-- name: migration_invalid_indexes
+-- Index laissés invalides par un CREATE INDEX CONCURRENTLY interrompu
+SELECT c.relname
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+WHERE NOT i.indisvalid
+  AND c.relnamespace = current_schema()::regnamespace
+ORDER BY c.relname;
+
 -- ===========================================
 -- REQUÊTES DE MAINTENANCE
 -- ===========================================
@@ -314,6 +967,21 @@ DELETE FROM reservation
 WHERE id_user NOT IN (SELECT id_user FROM utilisateur)
    OR id_train NOT IN (SELECT id_train FROM train);
 
+-- name: reconcile_seats_booked
+-- Recalculer le compteur de places réservées des trains où il a dérivé
+-- (suppression d'utilisateurs en cascade, modifications manuelles...)
+UPDATE train t
+SET seats_booked = c.booked
+FROM (
+    SELECT t2.id_train, LEAST(COUNT(r.id_reservation), t2.capacity) AS booked
+    FROM train t2
+    LEFT JOIN reservation r ON r.id_train = t2.id_train
+    GROUP BY t2.id_train
+) c
+WHERE t.id_train = c.id_train
+  AND t.seats_booked <> c.booked
+RETURNING t.id_train;
+
 -- Vérifier l'intégrité des données
 SELECT 
     'Orphelins utilisateur' as type,
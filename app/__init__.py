@@ -1,6 +1,6 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_wtf.csrf import CSRFProtect
+from flask_wtf.csrf import CSRFError, CSRFProtect
 from .config import Config
 
 # Initialisation des extensions
@@ -11,10 +11,30 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
     
+    # Un seul pool de connexions pour l'ORM et les requêtes SQL brutes
+    from .database.pool import engine_options
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    
     # Initialisation des extensions avec l'app
     db.init_app(app)
     csrf.init_app(app)
     
+    # Requêtes SQL brutes sur le pool du moteur SQLAlchemy
+    from .database.pool import init_pool
+    init_pool(app)
+    
+    # Instrumentation des requêtes (en-têtes Server-Timing, /metrics)
+    from .metrics import init_metrics
+    init_metrics(app)
+    
+    # Profilage à la demande (X-Profile / PROFILE_SAMPLE_RATE)
+    from .profiling import init_profiling
+    init_profiling(app)
+    
+    # Export complet pour l'administration (/admin/export, EXPORT_TOKEN)
+    from .export import init_exports
+    init_exports(app)
+    
     # Import des modèles après l'initialisation de db
     from . import models
     
@@ -24,14 +44,20 @@ def create_app():
     from .reservation.routes import reservation_bp
     from .main.routes import main_bp
     
+    # Échec CSRF d'un POST JSON (/reservation/api/reservations) : réponse JSON plutôt que la page 400
+    from .auth.routes import csrf_error
+    app.register_error_handler(CSRFError, csrf_error)
+    
     # Enregistrement des blueprints
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(train_bp, url_prefix='/train')
     app.register_blueprint(reservation_bp, url_prefix='/reservation')
     
-    # Création des tables
-    with app.app_context():
-        db.create_all()
+    # Commandes d'administration (flask load-timetable, ...)
+    from .commands import register_commands
+    register_commands(app)
+    
+    # Le schéma n'est plus créé au démarrage : flask db upgrade (SQL/migrations) avant de lancer les workers
     
     return app
\ No newline at end of file
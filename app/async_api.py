@@ -0,0 +1,281 @@
+"""
+API asynchrone (ASGI) en lecture seule pour l'autocomplétion et la recherche de trains
+Mêmes routes et mêmes corps JSON que les blueprints Flask, servie par uvicorn à côté de l'application
+(asgi.py) : une boucle asyncio par processus traite des milliers de requêtes simultanées sans bloquer
+de worker. Les listes de gares et suggestions sont lues dans le catalogue en mémoire, rechargé quand
+la version des horaires change ; seules les recherches empruntent une connexion au pool asyncpg
+"""
+
+import asyncio
+import json
+import time
+from datetime import time as dt_time, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import parse_qs
+
+import asyncpg
+
+from app.config import Config
+from app.database.cache import StationSnapshot
+from app.database.pagination import decode_cursor, make_page
+from app.database.queries import search_plan
+from app.database.registry import registry
+from app.database.serialization import page_to_json
+from app.http_cache import timetable_etag
+
+# Erreurs de base traitées comme dans DatabaseQueries : journalisées, réponse vide
+DB_ERRORS = (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError)
+
+
+class Request:
+    """Requête HTTP minimale : chemin, paramètres (première valeur) et en-têtes"""
+
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        query_string = scope.get('query_string', b'').decode('latin-1')
+        # Même forme que flask.Request.full_path, qui entre dans l'ETag
+        self.full_path = f"{self.path}?{query_string}"
+        self.args = {key: values[0] for key, values in parse_qs(query_string, keep_blank_values=True).items()}
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+
+    def int_arg(self, name, default):
+        """Entier passé en paramètre, `default` s'il est absent ou invalide (comme request.args.get(type=int))"""
+        try:
+            return int(self.args[name])
+        except (KeyError, ValueError):
+            return default
+
+    def time_arg(self, name):
+        """Heure HH:MM passée en paramètre, None si absente ; ValueError si invalide"""
+        value = self.args.get(name)
+        return dt_time.fromisoformat(value) if value else None
+
+
+def _not_modified(request, etag, updated_at):
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match:
+        tags = [tag.strip().removeprefix('W/').strip('"') for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+    if_modified_since = request.headers.get('if-modified-since')
+    if updated_at and if_modified_since:
+        try:
+            return updated_at.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class AsyncReadAPI:
+    """Application ASGI : pool asyncpg, version des horaires et catalogue des gares du processus"""
+
+    def __init__(self, config=Config):
+        self.config = config
+        self.pool = None
+        self._state = None
+        self._state_read_at = 0.0
+        self._snapshot = None
+        self._snapshot_version = None
+        # Créés au démarrage, dans la boucle asyncio du serveur
+        self._state_lock = None
+        self._catalogue_lock = None
+        self.routes = {
+            '/train/api/available-destinations': self.available_destinations,
+            '/reservation/api/available-destinations': self.available_destinations,
+            '/train/api/available-sources': self.available_sources,
+            '/reservation/api/available-sources': self.available_sources,
+            '/train/api/stations/suggest': self.suggest_stations,
+            '/train/api/trains/search': self.search_trains,
+        }
+
+    # ===== Cycle de vie =====
+
+    async def startup(self):
+        dsn = self.config.ASYNC_API_DATABASE_URL or self.config.SQLALCHEMY_DATABASE_URI
+        self.pool = await asyncpg.create_pool(
+            dsn.replace('postgresql+psycopg2://', 'postgresql://', 1),
+            min_size=self.config.ASYNC_API_POOL_MIN_SIZE,
+            max_size=self.config.ASYNC_API_POOL_MAX_SIZE,
+            # La base est en lecture seule pour cette API
+            server_settings={'default_transaction_read_only': 'on'}
+        )
+        self._state_lock = asyncio.Lock()
+        self._catalogue_lock = asyncio.Lock()
+        # Catalogue chargé avant la première requête (en cas d'échec, à la première demande)
+        await self.snapshot()
+
+    async def shutdown(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # ===== Base de données =====
+
+    async def _fetch(self, query_name, *params):
+        """Exécute une requête nommée de SQL/queries.sql (préparée et mise en cache par asyncpg)"""
+        statement = registry.get(query_name)
+        async with self.pool.acquire(timeout=self.config.DB_POOL_TIMEOUT) as conn:
+            return await conn.fetch(statement.positional_sql, *params)
+
+    async def timetable_state(self):
+        """(version, updated_at) des horaires, relue au plus toutes les TIMETABLE_VERSION_TTL secondes"""
+        ttl = self.config.TIMETABLE_VERSION_TTL
+        if self._state is not None and time.monotonic() - self._state_read_at < ttl:
+            return self._state
+        async with self._state_lock:
+            if self._state is not None and time.monotonic() - self._state_read_at < ttl:
+                return self._state
+            try:
+                rows = await self._fetch('get_timetable_version')
+            except DB_ERRORS as e:
+                print(f"Erreur lors de la lecture de la version des horaires: {e}")
+                return self._state
+            self._state = (rows[0]['version'], rows[0]['updated_at']) if rows else (0, None)
+            self._state_read_at = time.monotonic()
+            return self._state
+
+    def _snapshot_fresh(self, version):
+        snapshot = self._snapshot
+        if snapshot is None or (version is not None and version != self._snapshot_version):
+            return False
+        ttl = self.config.STATION_CACHE_TTL
+        return not ttl or time.monotonic() - snapshot.built_at < ttl
+
+    async def snapshot(self):
+        """Catalogue des gares, reconstruit quand la version des horaires change (écriture d'un autre processus)"""
+        state = await self.timetable_state()
+        version = state[0] if state else None
+        if self._snapshot_fresh(version):
+            return self._snapshot
+        async with self._catalogue_lock:
+            if self._snapshot_fresh(version):
+                return self._snapshot
+            try:
+                routes = await self._fetch('get_station_routes')
+            except DB_ERRORS as e:
+                print(f"Erreur lors de la récupération des gares: {e}")
+                return self._snapshot
+            # Construction hors de la boucle : elle ne doit pas retarder les autres requêtes
+            loop = asyncio.get_running_loop()
+            self._snapshot = await loop.run_in_executor(None, StationSnapshot, [tuple(row) for row in routes])
+            self._snapshot_version = version
+            return self._snapshot
+
+    # ===== Routes =====
+
+    async def _catalogue_response(self, request, select):
+        """Réponse publique dérivée du catalogue, avec ETag / Last-Modified comme timetable_cached(public=True)"""
+        headers = []
+        state = await self.timetable_state()
+        if state is not None:
+            version, updated_at = state
+            etag = timetable_etag(version, request.full_path)
+            headers.append(('etag', f'"{etag}"'))
+            if updated_at:
+                headers.append(('last-modified', format_datetime(updated_at.astimezone(timezone.utc), usegmt=True)))
+            headers.append(('cache-control', f"public, max-age={self.config.TIMETABLE_CACHE_MAX_AGE}"))
+            if _not_modified(request, etag, updated_at):
+                return 304, None, headers
+        snapshot = await self.snapshot()
+        return 200, select(snapshot) if snapshot is not None else [], headers
+
+    async def available_destinations(self, request):
+        """Gares d'arrivée disponibles pour une gare de départ donnée (toutes si aucune)"""
+        source_station = request.args.get('source_station')
+        return await self._catalogue_response(request, lambda snapshot: (
+            snapshot.destinations_by_source.get(source_station, []) if source_station
+            else snapshot.all_destinations
+        ))
+
+    async def available_sources(self, request):
+        """Gares de départ disponibles pour une gare d'arrivée donnée (toutes si aucune)"""
+        destination_station = request.args.get('destination_station')
+        return await self._catalogue_response(request, lambda snapshot: (
+            snapshot.sources_by_destination.get(destination_station, []) if destination_station
+            else snapshot.all_sources
+        ))
+
+    async def suggest_stations(self, request):
+        """Autocomplétion : les gares les plus pertinentes pour la saisie `q`"""
+        limit = request.int_arg('limit', self.config.STATION_SUGGEST_LIMIT)
+        limit = max(1, min(limit, self.config.STATION_SUGGEST_MAX_LIMIT))
+        snapshot = await self.snapshot()
+        return 200, snapshot.suggest(request.args.get('q', ''), limit) if snapshot is not None else [], []
+
+    async def search_trains(self, request):
+        """Recherche paginée par gares et plage horaire (departure_from / departure_to en HH:MM)"""
+        try:
+            departure_from = request.time_arg('departure_from')
+            departure_to = request.time_arg('departure_to')
+        except ValueError:
+            return 400, {'error': 'Heure invalide, format attendu HH:MM'}, []
+        limit = request.int_arg('limit', self.config.PAGE_SIZE)
+        limit = max(1, min(limit, self.config.MAX_PAGE_SIZE))
+
+        after = decode_cursor('search', request.args.get('cursor'))
+        query_name, windows, params = search_plan(
+            request.args.get('source_station', ''),
+            request.args.get('destination_station', ''),
+            departure_from,
+            departure_to,
+            after
+        )
+        rows = []
+        try:
+            for window in windows:
+                remaining = limit + 1 - len(rows)
+                if remaining == 0:
+                    break
+                rows.extend(dict(row) for row in await self._fetch(query_name, *params(window, after, remaining)))
+                # Le curseur ne concerne que l'intervalle dans lequel il se trouve
+                after = None
+        except DB_ERRORS as e:
+            print(f"Erreur lors de la recherche de trains: {e}")
+            rows = []
+        page = make_page(rows, limit, 'search', lambda row: (row['departure_time'], row['id_train']))
+        return 200, page_to_json(page), []
+
+    # ===== ASGI =====
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        handler = self.routes.get(scope['path'])
+        if handler is None:
+            status, body, headers = 404, {'error': 'Ressource introuvable'}, []
+        elif scope['method'] not in ('GET', 'HEAD'):
+            status, body, headers = 405, {'error': 'Méthode non autorisée'}, [('allow', 'GET, HEAD')]
+        else:
+            status, body, headers = await handler(Request(scope))
+
+        content = b''
+        if body is not None:
+            # Même encodage que flask.jsonify (clés triées, ASCII, compact, saut de ligne final)
+            content = (json.dumps(body, sort_keys=True, separators=(',', ':')) + '\n').encode('ascii')
+            headers = headers + [('content-type', 'application/json')]
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.encode('latin-1'), value.encode('latin-1'))
+                        for name, value in headers + [('content-length', str(len(content)))]],
+        })
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else content})
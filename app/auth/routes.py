@@ -1,4 +1,5 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask_wtf.csrf import generate_csrf
 from app import db
 from app.models import User
 from app.forms import UserForm, LoginForm
@@ -27,6 +28,23 @@ def login():
     
     return render_template('auth/login.html', form=form)
 
+@auth_bp.route('/api/csrf-token')
+def api_csrf_token():
+    """API endpoint : jeton CSRF de la session, à renvoyer dans l'en-tête X-CSRFToken des POST JSON"""
+    response = jsonify({'csrf_token': generate_csrf(), 'header': 'X-CSRFToken'})
+    # Lié à la session (cookie) : jamais partagé par un cache
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def csrf_error(e):
+    """Jeton CSRF absent ou invalide : erreur JSON pour les API, page d'erreur 400 pour les formulaires"""
+    if '/api/' in request.path:
+        return jsonify({
+            'error': f"Jeton CSRF manquant ou invalide ({e.description}) : envoyer l'en-tête X-CSRFToken "
+                     f"obtenu par GET {url_for('auth.api_csrf_token')}"
+        }), 400
+    return e
+
 @auth_bp.route('/register', methods=['GET', 'POST'])
 def register():
     form = UserForm()
@@ -0,0 +1,438 @@
+"""
+Commandes d'administration disponibles via `flask <commande>`
+"""
+
+import click
+from flask.cli import with_appcontext
+
+
+def _format_bytes(value):
+    return f"{value / (1024 * 1024):.1f} Mo"
+
+
+@click.command('load-timetable')
+@click.argument('csv_path', required=False, type=click.Path(exists=True, dir_okay=False))
+@click.option('--delta', is_flag=True,
+              help="Ne réécrire que les trains modifiés et supprimer ceux retirés du fichier")
+@click.option('--batch-size', default=500, show_default=True, type=click.IntRange(min=1),
+              help="Nombre de trains par lot (une transaction par lot en mode delta)")
+@click.option('--chunk-size', default=1024 * 1024, show_default=True,
+              help="Taille des blocs envoyés à COPY (octets)")
+@with_appcontext
+def load_timetable_command(csv_path, delta, batch_size, chunk_size):
+    """Charge data/Train_details.csv dans train_stop et met à jour la table train"""
+    from app.database.timetable import DEFAULT_CSV_PATH, TimetableError, load_timetable
+
+    def progress(done, total):
+        percent = done * 100 / total if total else 100
+        click.echo(f"\r  {percent:5.1f} %  {_format_bytes(done)} / {_format_bytes(total)}", nl=False)
+
+    path = csv_path or DEFAULT_CSV_PATH
+    click.echo(f"Chargement {'incrémental' if delta else 'complet'} de {path}")
+    try:
+        result = load_timetable(path, delta=delta, batch_size=batch_size,
+                                chunk_size=chunk_size, progress=progress)
+    except (OSError, TimetableError) as e:
+        click.echo()
+        raise click.ClickException(str(e))
+
+    click.echo()
+    click.echo(
+        f"{result['rows_read']} lignes lues en {result['copy_seconds']:.1f} s, "
+        f"{result['rows_rejected']} rejetées"
+    )
+    click.echo(
+        f"{result['trains_in_file']} trains dans le fichier : {result['trains_created']} créés, "
+        f"{result['trains_updated']} mis à jour, {result['trains_removed']} supprimés, "
+        f"{result['trains_unchanged']} inchangés"
+    )
+    click.echo(f"{result['stops_loaded']} arrêts écrits")
+    click.echo(
+        f"Terminé en {result['elapsed_seconds']:.1f} s ({result['rows_per_second']:.0f} lignes/s)"
+    )
+
+
+@click.command('import-trains')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help="Valider le fichier et tester l'insertion sans rien enregistrer")
+@with_appcontext
+def import_trains_command(path, dry_run):
+    """Importe un fichier de trains (CSV ou JSON, colonnes de TrainForm) en une seule transaction"""
+    import psycopg2
+    from app.database.bulk import BulkError
+    from app.train.bulk import import_trains
+
+    with open(path, 'rb') as f:
+        content = f.read()
+    try:
+        report = import_trains(content, path, dry_run)
+    except BulkError as e:
+        raise click.ClickException(str(e))
+    except psycopg2.Error as e:
+        raise click.ClickException(f"Import annulé par la base de données : {e}".strip())
+
+    for error in report['errors']:
+        click.echo(f"  ligne {error['line']} ({error['train_number'] or '?'}) : {'; '.join(error['errors'])}")
+    if report['rows_rejected'] > len(report['errors']):
+        click.echo(f"  ... {report['rows_rejected'] - len(report['errors'])} autre(s) ligne(s) refusée(s)")
+    click.echo(
+        f"{report['rows_read']} lignes lues, {report['rows_rejected']} refusées, "
+        f"{report['trains_created']} trains {'vérifiés' if dry_run else 'créés'} "
+        f"en {report['elapsed_seconds']:.1f} s"
+    )
+    if report['rows_rejected']:
+        raise click.ClickException("Fichier refusé : aucun train importé")
+
+
+@click.command('reconcile-seats')
+@with_appcontext
+def reconcile_seats_command():
+    """Recalcule le compteur de places réservées des trains à partir des réservations"""
+    from app.database.queries import DatabaseQueries
+
+    fixed = DatabaseQueries().reconcile_seats_booked()
+    if fixed is None:
+        raise click.ClickException("Échec du recalcul des places réservées")
+    click.echo(f"{fixed} train(s) corrigé(s)")
+
+
+@click.command('refresh-stats')
+@with_appcontext
+def refresh_stats_command():
+    """Recalcule le classement des trains les plus réservés (vue top_trains)"""
+    from app.database.queries import DatabaseQueries
+
+    if not DatabaseQueries().refresh_top_trains():
+        raise click.ClickException("Échec du rafraîchissement du classement")
+    click.echo("Classement des trains rafraîchi")
+
+
+@click.command('reconcile-stats')
+@with_appcontext
+def reconcile_stats_command():
+    """Recompte utilisateurs, trains, réservations et places réservées ; affiche les écarts corrigés"""
+    from app.database.queries import DatabaseQueries
+
+    db_queries = DatabaseQueries()
+    drift = db_queries.reconcile_stats()
+    if drift is None:
+        raise click.ClickException("Échec du recalcul des compteurs")
+    for row in drift:
+        difference = row['stored'] - row['actual']
+        status = "OK" if difference == 0 else f"écart {difference:+d}"
+        click.echo(f"{row['name']:<12} compteur={row['stored']:<10} réel={row['actual']:<10} {status}")
+
+    fixed = db_queries.reconcile_seats_booked()
+    if fixed is None:
+        raise click.ClickException("Échec du recalcul des places réservées")
+    click.echo(f"seats_booked : {fixed} train(s) corrigé(s)")
+
+    if not db_queries.refresh_top_trains():
+        raise click.ClickException("Échec du rafraîchissement du classement")
+    click.echo("Classement des trains rafraîchi")
+
+
+@click.command('stress-booking')
+@click.option('--users', default=500, show_default=True, type=click.IntRange(min=1),
+              help="Nombre d'utilisateurs qui réservent le même train")
+@click.option('--capacity', default=100, show_default=True, type=click.IntRange(min=1),
+              help="Nombre de places du train")
+@click.option('--workers', default=100, show_default=True, type=click.IntRange(min=1),
+              help="Réservations simultanées (bornées par DB_POOL_MAX_SIZE)")
+@click.option('--clicks', default=2, show_default=True, type=click.IntRange(min=1),
+              help="Tentatives de réservation par utilisateur (doubles clics)")
+@with_appcontext
+def stress_booking_command(users, capacity, workers, clicks):
+    """Réservations concurrentes sur un train temporaire : vérifie l'absence de survente"""
+    from flask import current_app
+    from app.database.stress import run_booking_stress
+
+    pool_size = current_app.config['DB_POOL_MAX_SIZE']
+    if workers > pool_size:
+        click.echo(f"Attention : {workers} workers pour un pool de {pool_size} connexions "
+                   f"(augmenter DB_POOL_MAX_SIZE pour plus de concurrence)")
+
+    result = run_booking_stress(users=users, capacity=capacity, workers=workers, clicks=clicks)
+
+    statuses = ', '.join(f"{status}={count}" for status, count in sorted(result['statuses'].items()))
+    click.echo(f"{result['attempts']} tentatives en {result['elapsed_seconds']:.2f} s : {statuses}")
+    click.echo(
+        f"{result['reservations']} réservations / {result['capacity']} places "
+        f"(compteur seats_booked={result['seats_booked']})"
+    )
+    click.echo(
+        f"{result['attempts_per_second']:.0f} tentatives/s, "
+        f"{result['bookings_per_second']:.0f} réservations/s"
+    )
+    if result['anomalies']:
+        for anomaly in result['anomalies']:
+            click.echo(f"ÉCHEC : {anomaly}", err=True)
+        raise SystemExit(1)
+    click.echo("OK : aucune survente ni réservation en double")
+
+
+@click.command('seed-synthetic')
+@click.option('--stations', default=10000, show_default=True, type=click.IntRange(min=2), help="Nombre de gares")
+@click.option('--trains', default=100000, show_default=True, type=click.IntRange(min=1), help="Nombre de trains")
+@click.option('--users', default=1000000, show_default=True, type=click.IntRange(min=1),
+              help="Nombre d'utilisateurs")
+@click.option('--reservations', default=10000000, show_default=True, type=click.IntRange(min=0),
+              help="Nombre de réservations")
+@click.option('--capacity', default=1000, show_default=True, type=click.IntRange(min=1),
+              help="Places par train (relevée si les réservations la dépassent)")
+@click.option('--batch-size', default=100000, show_default=True, type=click.IntRange(min=1),
+              help="Lignes insérées par transaction")
+@click.option('--delete', 'delete_only', is_flag=True, help="Supprimer le jeu de données synthétique et s'arrêter")
+@with_appcontext
+def seed_synthetic_command(stations, trains, users, reservations, capacity, batch_size, delete_only):
+    """Génère (ou remplace) le jeu de données synthétique des tests de charge"""
+    from app.database.synthetic import delete_synthetic, seed_synthetic
+
+    if delete_only:
+        deleted_users, deleted_trains = delete_synthetic()
+        click.echo(f"{deleted_users} utilisateur(s) et {deleted_trains} train(s) synthétiques supprimés")
+        return
+
+    def progress(step, done, total):
+        click.echo(f"\r{step} : {done}/{total}", nl=done == total)
+
+    try:
+        result = seed_synthetic(stations=stations, trains=trains, users=users, reservations=reservations,
+                                capacity=capacity, batch_size=batch_size, progress=progress)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    click.echo(
+        f"{result['stations']} gares, {result['trains']} trains, {result['users']} utilisateurs, "
+        f"{result['reservations']} réservations en {result['elapsed_seconds']:.1f} s"
+    )
+
+
+@click.command('load-test')
+@click.option('--url', default='http://127.0.0.1:5001', show_default=True,
+              help="Adresse de l'instance testée (démarrée séparément)")
+@click.option('--concurrency', default=20, show_default=True, type=click.IntRange(min=1),
+              help="Utilisateurs virtuels simultanés")
+@click.option('--duration', default=60.0, show_default=True, type=click.FloatRange(min=1),
+              help="Durée du test (secondes)")
+@click.option('--cancel-ratio', default=0.5, show_default=True, type=click.FloatRange(0, 1),
+              help="Part des parcours qui se terminent par une annulation")
+@click.option('--routes', default=1000, show_default=True, type=click.IntRange(min=1),
+              help="Nombre de trajets synthétiques tirés pour les recherches")
+@click.option('--output', type=click.Path(dir_okay=False),
+              help="Fichier JSON du rapport (par défaut loadtest-results/<date>.json)")
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False),
+              help="Rapport JSON de référence à comparer")
+@with_appcontext
+def load_test_command(url, concurrency, duration, cancel_ratio, routes, output, baseline):
+    """Parcours connexion -> recherche -> réservation -> liste -> annulation sous charge"""
+    import json
+    import os
+    from datetime import datetime
+    from app.database.synthetic import sample_targets, user_credentials
+    from app.loadtest import LoadTestError, compare_reports, run_load_test, save_report
+
+    users, sampled_routes = sample_targets(routes)
+    click.echo(f"{users} utilisateurs synthétiques, {len(sampled_routes)} trajets ; "
+               f"{concurrency} utilisateurs virtuels pendant {duration:.0f} s sur {url}")
+    try:
+        report = run_load_test(url, users, sampled_routes, user_credentials, concurrency=concurrency,
+                               duration=duration, cancel_ratio=cancel_ratio)
+    except LoadTestError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(f"{'Route':<48} {'req':>7} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for label, route in report['routes'].items():
+        click.echo(
+            f"{label:<48} {route['requests']:>7} {route['errors']:>5} {route['throughput_rps']:>8.1f} "
+            f"{route['p50_ms']:>6.1f}ms {route['p95_ms']:>6.1f}ms {route['p99_ms']:>6.1f}ms"
+        )
+    click.echo(f"{report['flows']} parcours réussis, {report['failed_flows']} en échec, "
+               f"{report['throughput_rps']:.1f} requêtes/s")
+
+    if output is None:
+        os.makedirs('loadtest-results', exist_ok=True)
+        output = os.path.join('loadtest-results', f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    save_report(report, output)
+    click.echo(f"Rapport enregistré dans {output}")
+
+    if baseline:
+        with open(baseline, 'r', encoding='utf-8') as f:
+            reference = json.load(f)
+        click.echo(f"Comparaison avec {baseline} ({reference.get('git_commit') or 'version inconnue'}) :")
+        for label, before, after, delta, rps_before, rps_after in compare_reports(report, reference):
+            click.echo(f"  {label:<46} p95 {before:.1f} -> {after:.1f} ms ({delta:+.0f} %), "
+                       f"{rps_before:.1f} -> {rps_after:.1f} req/s")
+
+
+@click.command('bench-queries')
+@click.option('--iterations', default=50, show_default=True, type=click.IntRange(min=1),
+              help="Appels mesurés par méthode")
+@click.option('--warmup', default=5, show_default=True, type=click.IntRange(min=0),
+              help="Appels non mesurés avant la mesure")
+@click.option('--case', 'only', multiple=True, help="Ne lancer que ce cas (répétable)")
+@click.option('--baseline', 'baseline_path', default='benchmarks/query_baseline.json', show_default=True,
+              type=click.Path(dir_okay=False), help="Rapport de référence")
+@click.option('--update-baseline', is_flag=True, help="Enregistrer ce rapport comme nouvelle référence")
+@click.option('--max-regression', default=0.5, show_default=True, type=click.FloatRange(min=0),
+              help="Hausse relative du p95 tolérée (0.5 = +50 %)")
+@click.option('--min-delta-ms', default=1.0, show_default=True, type=click.FloatRange(min=0),
+              help="Hausse absolue du p95 en dessous de laquelle on ne signale rien")
+@click.option('--seq-scan-rows', default=10000, show_default=True, type=click.IntRange(min=0),
+              help="Taille (lignes) à partir de laquelle un parcours séquentiel est signalé")
+@click.option('--output', type=click.Path(dir_okay=False),
+              help="Fichier JSON du rapport (par défaut benchmarks/queries-<date>.json)")
+@with_appcontext
+def bench_queries_command(iterations, warmup, only, baseline_path, update_baseline, max_regression,
+                          min_delta_ms, seq_scan_rows, output):
+    """Latences et plans (EXPLAIN ANALYZE) de chaque méthode de DatabaseQueries, comparés à la référence"""
+    import json
+    import os
+    from datetime import datetime
+    from app.database.benchmark import BenchmarkError, run_benchmarks
+
+    baseline = None
+    if os.path.exists(baseline_path) and not update_baseline:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    try:
+        report = run_benchmarks(iterations=iterations, warmup=warmup, baseline=baseline,
+                                max_regression=max_regression, min_delta_ms=min_delta_ms,
+                                seq_scan_rows=seq_scan_rows, only=set(only) or None)
+    except BenchmarkError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(f"{'Méthode':<36} {'p50':>9} {'p95':>9} {'p99':>9}  Parcours séquentiels")
+    for name, result in report['cases'].items():
+        scans = sorted({table for query in result['queries'].values() for table in query['seq_scans']})
+        click.echo(
+            f"{name:<36} {result['p50_ms']:>7.2f}ms {result['p95_ms']:>7.2f}ms {result['p99_ms']:>7.2f}ms  "
+            f"{', '.join(scans) or '-'}"
+        )
+
+    os.makedirs('benchmarks', exist_ok=True)
+    if output is None:
+        output = os.path.join('benchmarks', f"queries-{datetime.now():%Y%m%d-%H%M%S}.json")
+    for path in (output, baseline_path) if update_baseline else (output,):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+        click.echo(f"Rapport enregistré dans {path}")
+
+    if update_baseline:
+        return
+    if baseline is None:
+        click.echo(f"Pas de référence ({baseline_path}) : seuls les parcours séquentiels sont vérifiés")
+    if report['failures']:
+        for name, failures in report['failures'].items():
+            for failure in failures:
+                click.echo(f"ÉCHEC {name} : {failure}", err=True)
+        raise SystemExit(1)
+    click.echo("OK : aucun changement de plan ni régression de latence")
+
+
+@click.command('startup-time')
+@click.option('--runs', default=5, show_default=True, type=click.IntRange(min=1), help="Processus neufs mesurés")
+@click.option('--path', default='/', show_default=True, help="Route de la première requête d'un worker")
+@click.option('--no-warm-up', 'no_warm_up', is_flag=True, help="Mesurer sans chauffer les caches avant le fork")
+def startup_time_command(runs, path, no_warm_up):
+    """Mesure le démarrage : import, create_app, chauffage du maître et boot d'un worker après fork"""
+    from app.startup import measure_startup
+
+    try:
+        results = measure_startup(path, runs, warm=not no_warm_up)
+    except RuntimeError as e:
+        raise click.ClickException(f"Échec du démarrage : {e}")
+
+    statuses = sorted({result.pop('status') for result in results})
+    click.echo(f"{'étape':<24} {'médiane':>10} {'max':>10}")
+    for phase in results[0]:
+        values = sorted(result[phase] for result in results)
+        click.echo(f"{phase:<24} {values[len(values) // 2] * 1000:>8.1f} ms {values[-1] * 1000:>7.1f} ms")
+    click.echo(f"Statut de la première requête ({path}) : {', '.join(map(str, statuses))}")
+
+
+@click.group('db')
+def db_command():
+    """Migrations versionnées du schéma (SQL/migrations)"""
+
+
+@db_command.command('upgrade')
+@click.option('--target', type=click.IntRange(min=1), help="S'arrêter à cette version (toutes par défaut)")
+@with_appcontext
+def db_upgrade_command(target):
+    """Applique les migrations en attente"""
+    from app.database.migrations import MigrationError, upgrade
+
+    def progress(migration):
+        mode = "" if migration.transactional else " (hors transaction)"
+        click.echo(f"{migration.label}{mode}...")
+
+    try:
+        done = upgrade(target, progress)
+    except MigrationError as e:
+        raise click.ClickException(str(e))
+    if not done:
+        click.echo("Schéma à jour")
+    for migration, seconds, baseline in done:
+        if baseline:
+            click.echo(f"{migration.label} : schéma existant détecté, marquée comme appliquée")
+        else:
+            click.echo(f"{migration.label} appliquée en {seconds:.1f} s")
+
+
+@db_command.command('current')
+@with_appcontext
+def db_current_command():
+    """Affiche la version du schéma et les migrations en attente"""
+    from app.database.migrations import status
+
+    migrations, applied, invalid = status()
+    current = max(applied) if applied else None
+    click.echo(f"Version actuelle : {current:04d}" if current else "Version actuelle : aucune")
+    pending = [migration for migration in migrations if migration.version not in applied]
+    for migration in pending:
+        click.echo(f"En attente : {migration.label}")
+    for index in invalid:
+        click.echo(f"Index invalide : {index} (DROP INDEX CONCURRENTLY {index})", err=True)
+    if pending:
+        raise SystemExit(1)
+
+
+@db_command.command('history')
+@with_appcontext
+def db_history_command():
+    """Liste les migrations, appliquées ou non"""
+    from app.database.migrations import status
+
+    migrations, applied, _ = status()
+    for migration in migrations:
+        row = applied.pop(migration.version, None)
+        if row is None:
+            state = "en attente"
+        else:
+            state = f"appliquée le {row['applied_at']:%Y-%m-%d %H:%M}"
+            if row['baseline']:
+                state += " (schéma existant)"
+            if row['checksum'] in migration.previous_checksums:
+                state += " - fichier révisé, accepté au prochain upgrade"
+            elif row['checksum'] != migration.checksum:
+                state += " - FICHIER MODIFIÉ DEPUIS (upgrade refusé)"
+        click.echo(f"{migration.label:<40} {state:<45} {migration.description}")
+    for version, row in sorted(applied.items()):
+        click.echo(f"{version:04d}_{row['name']:<35} appliquée, fichier introuvable")
+
+
+def register_commands(app):
+    """Enregistre les commandes CLI sur l'application"""
+    app.cli.add_command(load_timetable_command)
+    app.cli.add_command(import_trains_command)
+    app.cli.add_command(reconcile_seats_command)
+    app.cli.add_command(refresh_stats_command)
+    app.cli.add_command(reconcile_stats_command)
+    app.cli.add_command(stress_booking_command)
+    app.cli.add_command(seed_synthetic_command)
+    app.cli.add_command(load_test_command)
+    app.cli.add_command(bench_queries_command)
+    app.cli.add_command(startup_time_command)
+    app.cli.add_command(db_command)
@@ -22,3 +22,77 @@ class Config:
         SQLALCHEMY_DATABASE_URI = f'postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Pool de connexions du moteur SQLAlchemy, partagé par l'ORM et DatabaseQueries
+    DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', '1'))
+    DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '10'))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', '1800'))
+    DB_POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', '30'))
+    
+    # Répliques en lecture (DSN séparés par des virgules) ; vide = toutes les lectures sur le primaire
+    DB_REPLICA_URLS = [url.strip() for url in os.environ.get('DB_REPLICA_URLS', '').split(',') if url.strip()]
+    # Délai (secondes) avant de réessayer une réplique injoignable
+    DB_REPLICA_RETRY_INTERVAL = float(os.environ.get('DB_REPLICA_RETRY_INTERVAL', '30'))
+    # Après une écriture, les lectures de la même session restent sur le primaire pendant N secondes
+    DB_READ_YOUR_WRITES_WINDOW = float(os.environ.get('DB_READ_YOUR_WRITES_WINDOW', '10'))
+    
+    # Registre des requêtes nommées (SQL/queries.sql)
+    SQL_QUERIES_AUTO_RELOAD = os.environ.get('SQL_QUERIES_AUTO_RELOAD', 'False').lower() in ('1', 'true', 'yes')
+    # Nombre d'exécutions sur une connexion avant PREPARE côté serveur (0 = désactivé)
+    SQL_PREPARE_THRESHOLD = int(os.environ.get('SQL_PREPARE_THRESHOLD', '3'))
+    
+    # Durée de vie (secondes) du catalogue des gares en mémoire (0 = illimitée) ; il est aussi reconstruit dès que la
+    # version des horaires change, y compris après une écriture d'un autre processus
+    STATION_CACHE_TTL = float(os.environ.get('STATION_CACHE_TTL', '300'))
+    
+    # Cache des réservations par utilisateur : nombre d'utilisateurs gardés par processus (0 = désactivé),
+    # durée de vie (secondes) d'une entrée et nombre de réservations au-delà duquel un utilisateur n'est pas mis en cache
+    RESERVATION_CACHE_SIZE = int(os.environ.get('RESERVATION_CACHE_SIZE', '10000'))
+    RESERVATION_CACHE_TTL = float(os.environ.get('RESERVATION_CACHE_TTL', '30'))
+    RESERVATION_CACHE_MAX_ROWS = int(os.environ.get('RESERVATION_CACHE_MAX_ROWS', '500'))
+    
+    # Requêtes conditionnelles (ETag) : durée (secondes) pendant laquelle un processus réutilise la version
+    # des horaires lue en base, et max-age des réponses publiques (API des gares)
+    TIMETABLE_VERSION_TTL = float(os.environ.get('TIMETABLE_VERSION_TTL', '5'))
+    TIMETABLE_CACHE_MAX_AGE = int(os.environ.get('TIMETABLE_CACHE_MAX_AGE', '60'))
+    
+    # Autocomplétion des gares (/train/api/stations/suggest)
+    STATION_SUGGEST_LIMIT = int(os.environ.get('STATION_SUGGEST_LIMIT', '10'))
+    STATION_SUGGEST_MAX_LIMIT = int(os.environ.get('STATION_SUGGEST_MAX_LIMIT', '50'))
+    
+    # Pagination par clé des listes de trains et de réservations
+    PAGE_SIZE = int(os.environ.get('PAGE_SIZE', '50'))
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '500'))
+    
+    # API asynchrone en lecture seule (asgi.py) : base interrogée (vide = base principale, ou une réplique)
+    # et bornes de son pool asyncpg, par processus
+    ASYNC_API_DATABASE_URL = os.environ.get('ASYNC_API_DATABASE_URL', '')
+    ASYNC_API_POOL_MIN_SIZE = int(os.environ.get('ASYNC_API_POOL_MIN_SIZE', '1'))
+    ASYNC_API_POOL_MAX_SIZE = int(os.environ.get('ASYNC_API_POOL_MAX_SIZE', '10'))
+    
+    # Jeton des exports d'administration (/admin/export, réservations d'un train) ; vide = exports désactivés
+    EXPORT_TOKEN = os.environ.get('EXPORT_TOKEN', '')
+    
+    # Import groupé de trains (/train/bulk, flask import-trains) : jeton d'opérateur exigé par /train/bulk
+    # (vide = pages désactivées, la commande reste disponible) et nombre maximum de trains par fichier
+    BULK_ADMIN_TOKEN = os.environ.get('BULK_ADMIN_TOKEN', '')
+    TRAIN_UPLOAD_MAX_ROWS = int(os.environ.get('TRAIN_UPLOAD_MAX_ROWS', '50000'))
+    
+    # Recherche en flux (/train/api/trains/stream) et exports : lignes lues par aller-retour sur le curseur serveur
+    STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', '1000'))
+    
+    # Instrumentation : seuil (ms) du journal des requêtes SQL lentes (0 = désactivé),
+    # en-têtes X-DB-Queries / Server-Timing sur toutes les réponses (sinon seulement avec le jeton de /metrics)
+    # et jeton Bearer exigé par /metrics (vide = /metrics désactivé)
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', '200'))
+    DB_TIMING_HEADERS = os.environ.get('DB_TIMING_HEADERS', 'False').lower() in ('1', 'true', 'yes')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    
+    # Profilage à la demande : jeton de l'en-tête X-Profile (et des pages /admin/profiles), part des requêtes
+    # profilées au hasard, intervalle d'échantillonnage, nombre de profils conservés et dossier d'écriture
+    PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '5'))
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', '50'))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', '')
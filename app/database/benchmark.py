@@ -0,0 +1,330 @@
+"""
+Micro-benchmarks de la couche DatabaseQueries (flask bench-queries)
+Chaque méthode est appelée directement sur la base peuplée par flask seed-synthetic ; les latences
+sont mesurées et le plan de chaque requête nommée exécutée est capturé avec EXPLAIN (ANALYZE, BUFFERS),
+sous la forme servie : EXPLAIN EXECUTE pour une requête préparée, texte SQL pour un curseur serveur.
+Une référence enregistrée permet de détecter un plan qui passe en parcours séquentiel d'une grande
+table ou une latence qui régresse
+"""
+
+import math
+import random
+import time
+from datetime import time as dt_time
+
+from app.database.pagination import encode_cursor
+from app.database.pool import get_pool
+from app.database.queries import BookingStatus, DatabaseQueries, search_plan
+from app.database.registry import registry
+from app.database.synthetic import sample_targets, user_credentials
+
+
+# Exécutions d'une requête préparée après lesquelles PostgreSQL peut lui substituer un plan générique
+GENERIC_PLAN_AFTER = 5
+EXPLAIN_PREFIX = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+
+
+class BenchmarkError(Exception):
+    """Jeu de données absent ou inutilisable pour les benchmarks"""
+
+
+class Case:
+    """Appel mesuré d'une méthode de DatabaseQueries"""
+
+    def __init__(self, name, call, cleanup=None, allow_seq_scan=(), setup=None, streamed=None):
+        self.name = name
+        self.call = call
+        # Préparation avant chaque appel (non mesurée), son résultat est passé dans ctx['prepared']
+        self.setup = setup
+        # Remise en état après chaque appel (non mesurée), ex. annuler la réservation créée
+        self.cleanup = cleanup
+        # Tables dont le parcours séquentiel est attendu (requêtes d'agrégat sur toute la table)
+        self.allow_seq_scan = allow_seq_scan
+        # Requêtes lues sur un curseur serveur (hors _execute) : ctx -> [(requête nommée, paramètres)]
+        self.streamed = streamed
+
+
+def _cancel_new_reservation(db_queries, ctx, status):
+    if status == BookingStatus.BOOKED:
+        latest = db_queries.get_user_reservations(ctx['user_id'], 1)
+        if latest:
+            db_queries.cancel_reservation(latest[0]['id_reservation'], ctx['user_id'])
+
+
+def _cancel_new_reservations(db_queries, ctx, statuses):
+    booked = {train_id for train_id, status in statuses.items() if status == BookingStatus.BOOKED}
+    if booked:
+        for row in db_queries.get_user_reservations(ctx['user_id'], len(booked)):
+            if row['id_train'] in booked:
+                db_queries.cancel_reservation(row['id_reservation'], ctx['user_id'])
+
+
+def _book_for_cancel(db_queries, ctx):
+    """Réservation à annuler par le cas mesuré (0 si le train est complet ou déjà réservé : aucune ligne)"""
+    if db_queries.create_reservation(ctx['user_id'], ctx['train_id']) != BookingStatus.BOOKED:
+        return 0
+    latest = db_queries.get_user_reservations(ctx['user_id'], 1)
+    return latest[0]['id_reservation'] if latest else 0
+
+
+def _reservations_cursor(db_queries, ctx):
+    """Curseur de la deuxième page des réservations (ou avant toute réservation si une seule page)"""
+    page = db_queries.get_user_reservations(ctx['user_id'], 10)
+    return page.next_cursor or encode_cursor('reservations', [2 ** 31 - 1])
+
+
+def _reservations_page(db_queries, ctx):
+    # Page lue en base (keyset sur id_reservation) et non dans le cache des réservations
+    db_queries._user_reservations = lambda user_id: None
+    try:
+        return db_queries.get_user_reservations(ctx['user_id'], 10, ctx['prepared'])
+    finally:
+        del db_queries._user_reservations
+
+
+def _search_stream_queries(ctx):
+    query_name, windows, params = search_plan(ctx['source'], ctx['destination'], None, None)
+    return [(query_name, params(window, None, None)) for window in windows]
+
+
+def _export_section(ctx):
+    # Export des réservations de l'utilisateur (/reservation/export), comme reservations_section(user_id=...)
+    return ('export_reservations', (ctx['user_id'], ctx['user_id'], None, None))
+
+
+CASES = (
+    Case('get_user_by_credentials', lambda db, ctx: db.get_user_by_credentials(*ctx['credentials'])),
+    Case('get_user_by_id', lambda db, ctx: db.get_user_by_id(ctx['user_id'])),
+    Case('user_exists', lambda db, ctx: db.user_exists(*ctx['credentials'])),
+    Case('get_all_trains', lambda db, ctx: db.get_all_trains(50)),
+    Case('get_train_by_id', lambda db, ctx: db.get_train_by_id(ctx['train_id'])),
+    Case('search_trains', lambda db, ctx: db.search_trains(ctx['source'], ctx['destination'])),
+    Case('search_trains_by_number', lambda db, ctx: db.search_trains(train_number=ctx['train_number'])),
+    Case('get_trains_count', lambda db, ctx: db.get_trains_count()),
+    Case('get_user_reservations', lambda db, ctx: db.get_user_reservations(ctx['user_id'], 50)),
+    Case('search_trains_by_criteria', lambda db, ctx: db.search_trains_by_criteria(
+        ctx['source'], ctx['destination'], None, None, 50)),
+    Case('search_trains_by_criteria_window', lambda db, ctx: db.search_trains_by_criteria(
+        ctx['source'], ctx['destination'], dt_time(8, 0), dt_time(10, 0), 50)),
+    Case('get_departure_times', lambda db, ctx: db.get_departure_times(), allow_seq_scan=('train',)),
+    Case('get_available_trains_for_user', lambda db, ctx: db.get_available_trains_for_user(
+        ctx['user_id'], ctx['source'], ctx['destination'])),
+    Case('get_unique_stations', lambda db, ctx: db.get_unique_stations()),
+    Case('suggest_stations', lambda db, ctx: db.suggest_stations(ctx['source'][:-1], 10)),
+    Case('get_database_stats', lambda db, ctx: db.get_database_stats()),
+    Case('get_top_trains', lambda db, ctx: db.get_top_trains(5)),
+    Case('get_user_reservations_cursor', _reservations_page, setup=_reservations_cursor),
+    Case('get_available_destinations', lambda db, ctx: db.get_available_destinations(ctx['source'])),
+    Case('get_available_sources', lambda db, ctx: db.get_available_sources(ctx['destination'])),
+    Case('iter_search_trains', lambda db, ctx: sum(1 for _ in db.iter_search_trains(
+        ctx['source'], ctx['destination'])), streamed=_search_stream_queries),
+    Case('iter_export', lambda db, ctx: sum(len(rows) for _, rows in db.iter_export(
+        [('reservations',) + _export_section(ctx)])), streamed=lambda ctx: [_export_section(ctx)]),
+    Case('create_reservation', lambda db, ctx: db.create_reservation(ctx['user_id'], ctx['train_id']),
+         cleanup=_cancel_new_reservation),
+    Case('create_reservations', lambda db, ctx: db.create_reservations(ctx['user_id'], ctx['train_ids']),
+         cleanup=_cancel_new_reservations),
+    Case('cancel_reservation', lambda db, ctx: db.cancel_reservation(ctx['prepared'], ctx['user_id']),
+         setup=_book_for_cancel),
+)
+
+
+def _contexts(count):
+    """Arguments variés (utilisateurs et trajets synthétiques existants) pour ne pas mesurer une seule ligne"""
+    users, routes = sample_targets(count)
+    if not users or not routes:
+        raise BenchmarkError("Jeu de données synthétique absent : lancer flask seed-synthetic")
+
+    db_queries = DatabaseQueries()
+    contexts = []
+    for source, destination in routes:
+        credentials = user_credentials(random.randrange(users))
+        user = db_queries.get_user_by_credentials(*credentials)
+        trains = db_queries.search_trains_by_criteria(source, destination, None, None, 3)
+        if not user or not trains:
+            continue
+        contexts.append({
+            'credentials': credentials,
+            'user_id': user['id_user'],
+            'train_id': trains[0]['id_train'],
+            'train_ids': [train['id_train'] for train in trains],
+            'train_number': trains[0]['train_number'],
+            'source': source,
+            'destination': destination,
+        })
+    if not contexts:
+        raise BenchmarkError("Aucun utilisateur ou trajet synthétique utilisable")
+    return contexts
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _table_sizes():
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(registry.sql('bench_table_sizes'))
+            return dict(cur.fetchall())
+    finally:
+        conn.rollback()
+        pool.putconn(conn)
+
+
+def _seq_scans(node, found):
+    if node.get('Node Type') == 'Seq Scan':
+        found.add(node.get('Relation Name'))
+    for child in node.get('Plans', ()):
+        _seq_scans(child, found)
+    return found
+
+
+def is_prepared(query_name):
+    """Vrai si l'application sert cette requête par PREPARE/EXECUTE (au-delà de SQL_PREPARE_THRESHOLD appels)"""
+    statement = registry.get(query_name)
+    return bool(registry.prepare_threshold and statement is not None and statement.preparable)
+
+
+def _explain_prepared(cur, statement, params):
+    # Nom propre au benchmark : la connexion du pool peut déjà avoir préparé q_<nom>
+    name = f"bench_{statement.prepared_name}"
+    execute_sql = f"EXECUTE {name}"
+    if statement.param_count:
+        execute_sql += f" ({', '.join(['%s'] * statement.param_count)})"
+    cur.execute(f"PREPARE {name} AS {statement.positional_sql}")
+    try:
+        # Exécutions annulées une à une : le plan expliqué est celui d'une connexion en régime établi
+        # (plan générique si PostgreSQL le retient)
+        for _ in range(GENERIC_PLAN_AFTER):
+            cur.execute("SAVEPOINT bench_warmup")
+            cur.execute(execute_sql, params or ())
+            cur.execute("ROLLBACK TO SAVEPOINT bench_warmup")
+        cur.execute(EXPLAIN_PREFIX + execute_sql, params or ())
+        return cur.fetchone()[0][0]
+    finally:
+        # PREPARE n'est pas annulé par ROLLBACK
+        cur.connection.rollback()
+        cur.execute(f"DEALLOCATE {name}")
+
+
+def explain(query_name, params, prepared=False):
+    """Plan exécuté d'une requête nommée, sous la forme servie (EXPLAIN EXECUTE si préparée) ; toute écriture est annulée"""
+    statement = registry.get(query_name)
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            if prepared:
+                return _explain_prepared(cur, statement, params)
+            cur.execute(EXPLAIN_PREFIX + statement.sql, params or ())
+            return cur.fetchone()[0][0]
+    finally:
+        conn.rollback()
+        pool.putconn(conn)
+
+
+def run_case(case, contexts, iterations, warmup, large_tables):
+    """Mesure un cas ; retourne latences et plans des requêtes exécutées"""
+    db_queries = DatabaseQueries()
+    captured = []
+    execute = db_queries._execute
+
+    def capture(cur, query_name, params=None):
+        captured.append((query_name, params, is_prepared(query_name)))
+        return execute(cur, query_name, params)
+
+    latencies = []
+    for index in range(warmup + iterations):
+        ctx = contexts[index % len(contexts)]
+        if case.setup:
+            ctx = dict(ctx, prepared=case.setup(db_queries, ctx))
+        if index == 0 and case.streamed:
+            captured.extend((query_name, params, False) for query_name, params in case.streamed(ctx))
+        # Les requêtes du premier appel servent à capturer les plans
+        db_queries._execute = capture if index == 0 else execute
+        started = time.perf_counter()
+        result = case.call(db_queries, ctx)
+        elapsed = time.perf_counter() - started
+        db_queries._execute = execute
+        if case.cleanup:
+            case.cleanup(db_queries, ctx, result)
+        if index >= warmup:
+            latencies.append(elapsed)
+
+    queries = {}
+    for query_name, params, prepared in captured:
+        if query_name in queries:
+            continue
+        plan = explain(query_name, params, prepared)
+        root = plan['Plan']
+        queries[query_name] = {
+            'prepared': prepared,
+            'execution_ms': plan.get('Execution Time'),
+            'planning_ms': plan.get('Planning Time'),
+            'shared_hit_blocks': root.get('Shared Hit Blocks'),
+            'shared_read_blocks': root.get('Shared Read Blocks'),
+            'seq_scans': sorted(table for table in _seq_scans(root, set()) if table in large_tables),
+            'plan': plan,
+        }
+
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'p50_ms': _percentile(latencies, 0.50) * 1000,
+        'p95_ms': _percentile(latencies, 0.95) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'queries': queries,
+    }
+
+
+def check_case(case, result, reference, max_regression, min_delta_ms):
+    """Écarts d'un cas par rapport à la référence (ou aux parcours séquentiels autorisés sans référence)"""
+    failures = []
+    for query_name, query in result['queries'].items():
+        accepted = set(case.allow_seq_scan)
+        if reference is not None:
+            accepted.update(reference.get('queries', {}).get(query_name, {}).get('seq_scans', ()))
+        for table in query['seq_scans']:
+            if table not in accepted:
+                failures.append(f"{query_name} : parcours séquentiel de {table}")
+
+    if reference is not None and reference.get('p95_ms') is not None:
+        before, after = reference['p95_ms'], result['p95_ms']
+        if after > before * (1 + max_regression) and after - before > min_delta_ms:
+            failures.append(f"p95 {before:.2f} -> {after:.2f} ms (+{(after / before - 1) * 100:.0f} %)")
+    return failures
+
+
+def run_benchmarks(iterations=50, warmup=5, contexts=20, baseline=None, max_regression=0.5,
+                   min_delta_ms=1.0, seq_scan_rows=10000, only=None):
+    """
+    Lance tous les cas (ou ceux de `only`) ; retourne le rapport avec la liste des échecs par cas
+    `baseline` : rapport de référence (dict) ; `seq_scan_rows` : taille à partir de laquelle une table est grande
+    """
+    sample = _contexts(contexts)
+    sizes = _table_sizes()
+    large_tables = {table for table, rows in sizes.items() if rows >= seq_scan_rows}
+
+    cases = {}
+    failures = {}
+    for case in CASES:
+        if only and case.name not in only:
+            continue
+        result = run_case(case, sample, iterations, warmup, large_tables)
+        reference = (baseline or {}).get('cases', {}).get(case.name)
+        case_failures = check_case(case, result, reference, max_regression, min_delta_ms)
+        if case_failures:
+            failures[case.name] = case_failures
+        cases[case.name] = result
+
+    return {
+        'table_rows': sizes,
+        'large_tables': sorted(large_tables),
+        'cases': cases,
+        'failures': failures,
+    }
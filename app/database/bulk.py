@@ -0,0 +1,168 @@
+"""
+Administration groupée des trains : insertion d'un fichier entier, modification et suppression par filtre
+Chaque opération tient en une transaction : tout est appliqué, ou rien (erreur de base, ligne refusée)
+"""
+
+import csv
+import io
+import time
+
+from app.database.cache import timetable_changed
+from app.database.pool import get_pool
+from app.database.registry import registry
+
+# Colonnes renseignées par un fichier ou une modification groupée, dans l'ordre de bulk_copy_trains
+TRAIN_COLUMNS = (
+    'train_number',
+    'source_station_code',
+    'source_station_name',
+    'destination_station_code',
+    'destination_station_name',
+    'departure_time',
+    'arrival_time',
+    'distance',
+    'capacity',
+)
+# Critères de sélection acceptés par update_trains / delete_trains
+FILTER_KEYS = ('ids', 'train_number', 'source_station_name', 'destination_station_name',
+               'departure_from', 'departure_to')
+
+
+class BulkError(Exception):
+    """Opération groupée impossible (fichier illisible, aucun critère de sélection...)"""
+
+
+def _filter_params(filters):
+    if not any(filters.get(key) not in (None, '', []) for key in FILTER_KEYS):
+        raise BulkError("Au moins un critère de sélection est requis")
+    params = []
+    for key in FILTER_KEYS:
+        value = filters.get(key) or None
+        params.extend((value, value))
+    return params
+
+
+def _copy_buffer(trains):
+    """Trains validés au format CSV de COPY (None -> champ vide non cité, lu comme NULL)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for train in trains:
+        writer.writerow(['' if train[column] is None else train[column] for column in TRAIN_COLUMNS])
+    buffer.seek(0)
+    return buffer
+
+
+def insert_trains(trains, dry_run=False):
+    """
+    Insère les trains (dicts validés, clés TRAIN_COLUMNS) en un seul COPY ; retourne le nombre de trains
+    créés. Avec dry_run, l'insertion est exécutée puis annulée (contraintes de la base vérifiées)
+    """
+    if not trains:
+        return 0
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.copy_expert(registry.sql('bulk_copy_trains'), _copy_buffer(trains))
+            created = cur.rowcount
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+    if not dry_run:
+        timetable_changed()
+    return created
+
+
+def update_trains(filters, values, dry_run=False):
+    """
+    Applique `values` (sous-ensemble validé de TRAIN_COLUMNS) aux trains sélectionnés par `filters`.
+    Retourne {'matched', 'updated', 'errors'} ; si un train refuse la modification (capacité inférieure
+    aux places réservées), aucun n'est modifié et `errors` liste les trains en cause
+    """
+    started = time.monotonic()
+    params = _filter_params(filters)
+    if not values:
+        raise BulkError("Aucune valeur à modifier")
+    result = {'matched': 0, 'updated': 0, 'errors': []}
+
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(registry.sql('bulk_select_trains'), params)
+            matched = cur.fetchall()
+            result['matched'] = len(matched)
+
+            capacity = values.get('capacity')
+            if capacity is not None:
+                result['errors'] = [
+                    {'id_train': id_train, 'train_number': train_number,
+                     'error': f"{seats_booked} places déjà réservées pour une capacité de {capacity}"}
+                    for id_train, train_number, seats_booked in matched if seats_booked > capacity
+                ]
+
+            if matched and not result['errors']:
+                update_params = []
+                for column in TRAIN_COLUMNS:
+                    update_params.extend((column in values, values.get(column)))
+                update_params.append([row[0] for row in matched])
+                cur.execute(registry.sql('bulk_update_trains'), update_params)
+                result['updated'] = cur.rowcount
+        if dry_run or result['errors']:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+    if result['updated'] and not dry_run and not result['errors']:
+        timetable_changed()
+    result['elapsed_seconds'] = time.monotonic() - started
+    return result
+
+
+def delete_trains(filters, dry_run=False):
+    """
+    Supprime les trains sélectionnés par `filters` et leurs réservations ;
+    retourne {'matched', 'deleted', 'reservations_deleted'}
+    """
+    started = time.monotonic()
+    params = _filter_params(filters)
+    result = {'matched': 0, 'deleted': 0, 'reservations_deleted': 0}
+
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(registry.sql('bulk_select_trains'), params)
+            matched = cur.fetchall()
+            result['matched'] = len(matched)
+            # seats_booked compte exactement les réservations du train (verrouillé)
+            result['reservations_deleted'] = sum(row[2] for row in matched)
+            if matched:
+                cur.execute(registry.sql('bulk_delete_trains'), ([row[0] for row in matched],))
+                result['deleted'] = cur.rowcount
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+    if result['deleted'] and not dry_run:
+        timetable_changed()
+    result['elapsed_seconds'] = time.monotonic() - started
+    return result
@@ -0,0 +1,278 @@
+"""
+Caches en mémoire des données de référence du réseau (gares et liaisons) et des réservations par utilisateur
+Reconstruits à la demande et invalidés après chaque modification de la table train (ou des réservations)
+"""
+
+import bisect
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from flask import has_request_context, session
+
+from app.config import Config
+from app.database.pool import mark_write
+from app.database.version import timetable_version
+
+
+def normalize_name(value):
+    """Forme de comparaison d'un nom de gare : sans accents ni casse (équivalent de f_normalize en SQL)"""
+    decomposed = unicodedata.normalize('NFKD', value)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+class StationSnapshot:
+    """Vue figée du catalogue des gares et des liaisons départ -> arrivée"""
+
+    def __init__(self, routes, timetable_version=None):
+        stations = set()
+        destinations_by_source = {}
+        sources_by_destination = {}
+
+        for source_name, source_code, destination_name, destination_code in routes:
+            if source_name is not None:
+                stations.add((source_name, source_code))
+            if destination_name is not None:
+                stations.add((destination_name, destination_code))
+            if source_name is not None and destination_name is not None:
+                destinations_by_source.setdefault(source_name, set()).add((destination_name, destination_code))
+                sources_by_destination.setdefault(destination_name, set()).add((source_name, source_code))
+
+        def ordered(pairs):
+            return sorted(pairs, key=lambda pair: (pair[0].casefold(), pair[0], pair[1] or ''))
+
+        self.stations = [
+            {'station_name': name, 'station_code': code} for name, code in ordered(stations)
+        ]
+        self.all_destinations = [
+            {'destination_station_name': s['station_name'], 'destination_station_code': s['station_code']}
+            for s in self.stations
+        ]
+        self.all_sources = [
+            {'source_station_name': s['station_name'], 'source_station_code': s['station_code']}
+            for s in self.stations
+        ]
+        self.destinations_by_source = {
+            source: [
+                {'destination_station_name': name, 'destination_station_code': code}
+                for name, code in ordered(pairs)
+            ]
+            for source, pairs in destinations_by_source.items()
+        }
+        self.sources_by_destination = {
+            destination: [
+                {'source_station_name': name, 'source_station_code': code}
+                for name, code in ordered(pairs)
+            ]
+            for destination, pairs in sources_by_destination.items()
+        }
+        # Index d'autocomplétion : noms normalisés triés (recherche par préfixe en O(log n)), et fin du
+        # nom à partir de chaque début de mot (« paris nord » -> « nord ») pour les préfixes de mot
+        normalized = [normalize_name(station['station_name']) for station in self.stations]
+        self._search_keys = sorted((name, position) for position, name in enumerate(normalized))
+        self._search_names = [key for key, _ in self._search_keys]
+        self._word_keys = sorted(
+            (name[start:], position)
+            for position, name in enumerate(normalized)
+            for start in range(1, len(name))
+            if not name[start - 1].isalnum() and name[start].isalnum()
+        )
+        self._word_names = [key for key, _ in self._word_keys]
+        # Version des horaires lue avant le chargement des liaisons (None : inconnue)
+        self.timetable_version = timetable_version
+        self.built_at = time.monotonic()
+
+    @staticmethod
+    def _prefixed(keys, names, needle):
+        # Parcours par indice : un découpage keys[start:] recopierait la fin de l'index à chaque frappe
+        for index in range(bisect.bisect_left(names, needle), len(keys)):
+            name, position = keys[index]
+            if not name.startswith(needle):
+                break
+            yield position
+
+    def suggest(self, query, limit=10):
+        """
+        Gares dont le nom commence par `query`, puis dont un mot commence par `query` ; une simple
+        sous-chaîne n'est pas proposée (la recherche de trains la trouve par l'index trigramme)
+        """
+        needle = normalize_name(query or '').strip()
+        if not needle or limit <= 0:
+            return []
+
+        results = []
+        seen = set()
+
+        def take(position):
+            if position not in seen:
+                seen.add(position)
+                results.append(self.stations[position])
+            return len(results) >= limit
+
+        # 1. Préfixe du nom complet, puis 2. préfixe d'un mot du nom : deux recherches dichotomiques
+        for keys, names in ((self._search_keys, self._search_names), (self._word_keys, self._word_names)):
+            for position in self._prefixed(keys, names, needle):
+                if take(position):
+                    return results
+        return results
+
+
+class StationCatalogue:
+    """
+    Catalogue des gares partagé par le processus, invalidé sur écriture dans ce processus et reconstruit
+    quand la version des horaires change (écriture d'un autre processus) : le contenu servi correspond
+    toujours à la version qui sert d'ETag aux pages et API des gares
+    """
+
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self.version = 0
+        self._snapshot = None
+        # _lock protège la publication et l'invalidation (instantanées) ; _load_lock sérialise les
+        # chargements sans bloquer invalidate() pendant la lecture de la base
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _fresh(self, snapshot, timetable_state):
+        if snapshot is None:
+            return False
+        if timetable_state is not None and snapshot.timetable_version != timetable_state[0]:
+            return False
+        return not self.ttl or time.monotonic() - snapshot.built_at < self.ttl
+
+    def get(self, loader):
+        """Retourne le snapshot courant ; `loader` renvoie les liaisons (nom/code départ, nom/code arrivée) ou None"""
+        # Version inconnue (base indisponible) : seule la durée de vie borne la fraîcheur
+        state = timetable_version.get()
+        snapshot = self._snapshot
+        if self._fresh(snapshot, state):
+            return snapshot
+
+        with self._load_lock:
+            with self._lock:
+                snapshot = self._snapshot
+                version = self.version
+            if self._fresh(snapshot, state):
+                return snapshot
+            routes = loader()
+            if routes is None:
+                return snapshot
+            snapshot = StationSnapshot(routes, state[0] if state else None)
+            with self._lock:
+                # Une invalidation pendant le chargement rend ce snapshot obsolète : ne pas le publier
+                if version == self.version:
+                    self._snapshot = snapshot
+            return snapshot
+
+    def invalidate(self):
+        """Oublie le snapshot courant ; le prochain accès relira la base"""
+        with self._lock:
+            self.version += 1
+            self._snapshot = None
+
+
+class UserReservations:
+    """Réservations d'un utilisateur (les plus récentes d'abord) et ensemble des trains réservés"""
+
+    def __init__(self, rows=None):
+        # None : trop de réservations pour les garder en mémoire, les pages sont lues en base
+        self.rows = rows
+        self.train_ids = None if rows is None else frozenset(row['id_train'] for row in rows)
+
+
+class ReservationCache:
+    """
+    Réservations par utilisateur : LRU borné à `max_entries` utilisateurs, durée de vie `ttl`.
+    Une entrée n'est valable que pour la version courante de l'utilisateur : compteur conservé dans sa
+    session (incrémenté à chaque réservation ou annulation, quel que soit le processus qui la traite)
+    et version des horaires (train modifié ou supprimé)
+    """
+
+    def __init__(self, max_entries=10000, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # user_id -> (version, UserReservations, date de chargement), du moins au plus récemment utilisé
+        self._entries = OrderedDict()
+        # Incrémenté à chaque invalidation : un chargement commencé avant n'est pas conservé
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def version(user_id):
+        """Version des réservations de `user_id` vue par la requête courante"""
+        own = 0
+        if has_request_context() and session.get('user_id') == user_id:
+            own = session.get('_reservations_version', 0)
+        state = timetable_version.get()
+        return own, state[0] if state else None
+
+    def get(self, user_id, loader=None):
+        """
+        UserReservations de `user_id` ; en cas d'absence, `loader()` les charge (None : erreur, rien n'est
+        conservé). Sans `loader`, retourne None plutôt que d'interroger la base
+        """
+        version = self.version(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == version and (not self.ttl or time.monotonic() - entry[2] < self.ttl):
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        if loader is None:
+            return None
+        reservations = loader()
+        if reservations is None or not self.max_entries:
+            return reservations
+        with self._lock:
+            # Une réservation ou une annulation pendant le chargement rend le résultat obsolète
+            if generation == self._generation:
+                self._entries[user_id] = (version, reservations, time.monotonic())
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return reservations
+
+    def invalidate(self, user_id):
+        """Oublie les réservations de `user_id` dans ce processus et, pour sa session, dans tous les autres"""
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._entries.pop(user_id, None)
+        if has_request_context() and session.get('user_id') == user_id:
+            session['_reservations_version'] = session.get('_reservations_version', 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+            }
+
+
+station_catalogue = StationCatalogue(ttl=Config.STATION_CACHE_TTL)
+reservation_cache = ReservationCache(max_entries=Config.RESERVATION_CACHE_SIZE, ttl=Config.RESERVATION_CACHE_TTL)
+
+
+def timetable_changed():
+    """À appeler après tout commit modifiant la table train"""
+    station_catalogue.invalidate()
+    timetable_version.bump()
+    mark_write()
+
+
+def reservations_changed(user_id):
+    """À appeler après tout commit modifiant les réservations de `user_id`"""
+    reservation_cache.invalidate(user_id)
+    mark_write()
@@ -0,0 +1,256 @@
+"""
+Migrations versionnées du schéma (flask db upgrade / current / history)
+Chaque fichier SQL/migrations/NNNN_nom.sql est appliqué une seule fois, dans l'ordre, et enregistré
+dans schema_migrations avec son empreinte. Une migration est exécutée dans une transaction, sauf si
+son en-tête contient `-- migration: no-transaction` (CREATE INDEX CONCURRENTLY) : ses instructions
+sont alors exécutées une par une en autocommit.
+flask db upgrade refuse de s'exécuter si une migration appliquée a été modifiée depuis, sauf si son
+en-tête déclare l'ancienne empreinte (`-- migration: previous-checksum <md5>`) : une modification sans
+effet sur les bases qui l'ont appliquée, dont l'empreinte enregistrée est alors mise à jour
+"""
+
+import hashlib
+import os
+import re
+import time
+
+from app.database.pool import get_pool
+from app.database.registry import registry
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'SQL', 'migrations')
+NO_TRANSACTION = '-- migration: no-transaction'
+PREVIOUS_CHECKSUM = '-- migration: previous-checksum'
+# Clé du verrou consultatif partagé par tous les flask db upgrade
+LOCK_KEY = 7263001
+
+_FILENAME = re.compile(r'^(\d{4})_(\w+)\.sql$')
+_DOLLAR_TAG = re.compile(r'\$(\w*)\$')
+
+
+class MigrationError(Exception):
+    """Migration introuvable, en double ou en échec"""
+
+
+class Migration:
+    """Fichier de migration : version, nom, SQL et empreinte"""
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, 'r', encoding='utf-8') as f:
+            self.sql = f.read()
+        self.checksum = hashlib.md5(self.sql.encode('utf-8')).hexdigest()
+        header = []
+        for line in self.sql.splitlines():
+            if not line.startswith('--'):
+                break
+            header.append(line.strip())
+        self.transactional = NO_TRANSACTION not in header
+        self.previous_checksums = frozenset(
+            line[len(PREVIOUS_CHECKSUM):].strip() for line in header if line.startswith(PREVIOUS_CHECKSUM)
+        )
+        # Première ligne de l'en-tête, affichée par flask db history
+        self.description = header[0].lstrip('- ').strip() if header else ''
+
+    @property
+    def label(self):
+        return f"{self.version:04d}_{self.name}"
+
+
+def split_statements(sql):
+    """Découpe un script en instructions (points-virgules hors chaînes, commentaires et blocs $$)"""
+    statements = []
+    current = []
+    index = 0
+    length = len(sql)
+    while index < length:
+        char = sql[index]
+        if sql.startswith('--', index):
+            end = sql.find('\n', index)
+            index = length if end == -1 else end + 1
+            current.append('\n')
+            continue
+        if char == "'":
+            end = index + 1
+            while end < length:
+                if sql[end] == "'" and sql.startswith("''", end):
+                    end += 2
+                    continue
+                if sql[end] == "'":
+                    break
+                end += 1
+            current.append(sql[index:end + 1])
+            index = end + 1
+            continue
+        if char == '$':
+            match = _DOLLAR_TAG.match(sql, index)
+            if match:
+                end = sql.find(match.group(0), match.end())
+                end = length if end == -1 else end + len(match.group(0))
+                current.append(sql[index:end])
+                index = end
+                continue
+        if char == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(char)
+        index += 1
+
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Migrations du répertoire, triées par version"""
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Version {version:04d} en double : {migrations[version].path} et {filename}")
+        migrations[version] = Migration(version, match.group(2), os.path.join(directory, filename))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def changed_migrations(migrations, applied):
+    """
+    Migrations appliquées dont le fichier a changé : (refusées, acceptées) ; acceptées = l'empreinte
+    enregistrée est une ancienne empreinte déclarée par le fichier
+    """
+    refused = []
+    accepted = []
+    for migration in migrations:
+        row = applied.get(migration.version)
+        if row is None or row['checksum'] == migration.checksum:
+            continue
+        if row['checksum'] in migration.previous_checksums:
+            accepted.append(migration)
+        else:
+            refused.append(migration)
+    return refused, accepted
+
+
+def _applied(cur):
+    """version -> ligne de schema_migrations (vide si le journal n'existe pas)"""
+    cur.execute(registry.sql('migration_table_exists'))
+    if not cur.fetchone()[0]:
+        return {}
+    cur.execute(registry.sql('migration_applied'))
+    columns = [desc[0] for desc in cur.description]
+    return {row[0]: dict(zip(columns, row)) for row in cur.fetchall()}
+
+
+def _invalid_indexes(cur):
+    cur.execute(registry.sql('migration_invalid_indexes'))
+    return [row[0] for row in cur.fetchall()]
+
+
+def _apply(cur, migration):
+    if migration.transactional:
+        cur.execute("BEGIN")
+        try:
+            cur.execute(migration.sql)
+            cur.execute(registry.sql('migration_record'),
+                        (migration.version, migration.name, migration.checksum, False))
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        return
+
+    for statement in split_statements(migration.sql):
+        try:
+            cur.execute(statement)
+        except Exception as e:
+            invalid = _invalid_indexes(cur)
+            hint = ''
+            if invalid:
+                hint = (f" ; index invalide(s) à supprimer avant de relancer "
+                        f"(DROP INDEX CONCURRENTLY) : {', '.join(invalid)}")
+            raise MigrationError(f"{migration.label} : {e}".strip() + hint) from e
+    cur.execute(registry.sql('migration_record'), (migration.version, migration.name, migration.checksum, False))
+
+
+def status():
+    """Migrations connues et appliquées : (migrations, appliquées par version, index invalides)"""
+    migrations = load_migrations()
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            applied = _applied(cur)
+            invalid = _invalid_indexes(cur)
+        conn.rollback()
+        return migrations, applied, invalid
+    finally:
+        pool.putconn(conn)
+
+
+def upgrade(target=None, progress=None):
+    """
+    Applique les migrations en attente jusqu'à `target` (toutes par défaut) ; retourne
+    la liste (migration, durée en secondes, référence) des migrations enregistrées.
+    `progress(migration)` est appelé avant chaque migration exécutée
+    """
+    migrations = load_migrations()
+    done = []
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        conn.rollback()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(registry.sql('migration_lock'), (LOCK_KEY,))
+            try:
+                cur.execute(registry.sql('migration_create_table'))
+                applied = _applied(cur)
+
+                # Une migration appliquée puis modifiée ne serait jamais rejouée : la base divergerait du dépôt
+                refused, accepted = changed_migrations(migrations, applied)
+                if refused:
+                    raise MigrationError(
+                        f"Migration(s) déjà appliquée(s) modifiée(s) depuis : {', '.join(m.label for m in refused)}. "
+                        f"Restaurer le fichier d'origine et livrer la modification dans une nouvelle migration"
+                    )
+                for migration in accepted:
+                    cur.execute(registry.sql('migration_update_checksum'), (migration.checksum, migration.version))
+
+                # Base créée avant les migrations : le schéma initial (0001) est déjà en place,
+                # les migrations suivantes le complètent ; un schéma partiel n'est jamais marqué
+                cur.execute(registry.sql('migration_schema_exists'))
+                tables = dict(cur.fetchall())
+                if not applied and migrations and any(tables.values()):
+                    missing = [name for name, present in tables.items() if not present]
+                    if missing:
+                        raise MigrationError(
+                            f"Schéma existant incomplet (tables manquantes : {', '.join(missing)}) : "
+                            f"impossible de marquer {migrations[0].label} comme appliquée"
+                        )
+                    baseline = migrations[0]
+                    cur.execute(registry.sql('migration_record'),
+                                (baseline.version, baseline.name, baseline.checksum, True))
+                    applied[baseline.version] = {'version': baseline.version}
+                    done.append((baseline, 0.0, True))
+
+                for migration in migrations:
+                    if migration.version in applied or (target is not None and migration.version > target):
+                        continue
+                    if progress:
+                        progress(migration)
+                    started = time.monotonic()
+                    _apply(cur, migration)
+                    done.append((migration, time.monotonic() - started, False))
+            finally:
+                cur.execute(registry.sql('migration_unlock'), (LOCK_KEY,))
+    finally:
+        conn.autocommit = False
+        pool.putconn(conn)
+    return done
@@ -0,0 +1,74 @@
+"""
+Pagination par clé (keyset) : la page suivante reprend après la dernière ligne vue
+au lieu de sauter N lignes avec OFFSET, le coût d'une page ne dépend donc pas de sa profondeur
+"""
+
+import base64
+import binascii
+import json
+from datetime import time
+
+# Types attendus de chaque élément de la clé, par type de curseur (heure de départ NULL pour un train sans horaire)
+CURSOR_TYPES = {
+    'search': ((time, type(None)), int),
+    'trains': (int,),
+    'reservations': (int,),
+}
+
+
+class Page(list):
+    """Liste de lignes accompagnée du curseur opaque de la page suivante (None si dernière page)"""
+
+    def __init__(self, items=(), next_cursor=None):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+
+
+def _encode_value(value):
+    if isinstance(value, time):
+        return {'t': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and 't' in value:
+        return time.fromisoformat(value['t'])
+    return value
+
+
+def encode_cursor(kind, values):
+    """Encode la clé de la dernière ligne d'une page en un jeton opaque pour les URLs"""
+    payload = json.dumps({'k': kind, 'v': [_encode_value(v) for v in values]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _valid_key(kind, values):
+    types = CURSOR_TYPES.get(kind)
+    if types is None or len(values) != len(types):
+        return False
+    # bool est une sous-classe d'int : true/false ne sont pas des identifiants
+    return all(isinstance(value, expected) and not isinstance(value, bool)
+               for value, expected in zip(values, types))
+
+
+def decode_cursor(kind, token):
+    """Décode un jeton produit par encode_cursor ; None s'il est absent, invalide, d'un autre type ou mal formé"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if payload.get('k') != kind:
+            return None
+        values = tuple(_decode_value(v) for v in payload['v'])
+    except (ValueError, TypeError, KeyError, AttributeError, binascii.Error):
+        return None
+    return values if _valid_key(kind, values) else None
+
+
+def make_page(rows, page_size, kind, key):
+    """Construit une Page à partir de `page_size + 1` lignes lues ; `key(row)` donne la clé de tri d'une ligne"""
+    if page_size is None or len(rows) <= page_size:
+        return Page(rows)
+    rows = rows[:page_size]
+    return Page(rows, encode_cursor(kind, key(rows[-1])))
@@ -0,0 +1,631 @@
+"""
+Pool de connexions PostgreSQL partagé par tout le processus
+Les requêtes SQL brutes empruntent leurs connexions au pool du moteur SQLAlchemy : l'ORM et
+DatabaseQueries partagent une seule limite de connexions et, pendant une requête HTTP, la même
+connexion ; les lectures peuvent être envoyées sur des répliques (DB_REPLICA_URLS)
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+import sqlalchemy.exc
+from flask import g, has_app_context, has_request_context, session
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+
+class PoolTimeout(psycopg2.pool.PoolError):
+    """Levée lorsqu'aucune connexion ne se libère dans le délai imparti"""
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Connexion psycopg2 annotée avec les informations utiles au pool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+        # Requêtes préparées côté serveur sur cette session (nom -> SQL), compteurs d'exécution et
+        # requêtes dont le PREPARE a échoué sur cette session (nom -> SQL, exécutées sans préparation)
+        self.prepared_statements = {}
+        self.statement_counts = {}
+        self.prepare_failed = {}
+        # Pool d'origine (primaire ou réplique), renseigné à la création
+        self.pool = None
+
+
+class ConnectionPool:
+    """Pool de connexions thread-safe avec bornes min/max, contrôle de santé et durée de vie maximale"""
+
+    def __init__(self, connection_params, minconn=1, maxconn=10, timeout=30.0,
+                 max_lifetime=1800.0, health_check_interval=30.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Bornes du pool invalides")
+
+        self.connection_params = dict(connection_params)
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+
+        # Métriques
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+        for _ in range(minconn):
+            self._idle.append(self._connect())
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.connection_params)
+        conn.pool = self
+        self._created += 1
+        return conn
+
+    def _expired(self, conn):
+        return self.max_lifetime and time.monotonic() - conn.created_at > self.max_lifetime
+
+    def _is_healthy(self, conn):
+        """Vérifie qu'une connexion est encore utilisable avant de la prêter"""
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - conn.last_used_at < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        self._discarded += 1
+
+    def getconn(self):
+        """Emprunte une connexion au pool, en attendant au plus `timeout` secondes"""
+        start = time.perf_counter()
+        while True:
+            conn = None
+            create = False
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.pool.PoolError("Le pool de connexions est fermé")
+                deadline = time.monotonic() + self.timeout
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Aucune connexion disponible après {self.timeout}s "
+                            f"({self._in_use}/{self.maxconn} utilisées)"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+                self._in_use += 1
+
+            if create:
+                try:
+                    conn = self._connect()
+                except psycopg2.Error:
+                    self._release_slot()
+                    raise
+            elif self._expired(conn) or not self._is_healthy(conn):
+                self._discard(conn)
+                self._release_slot()
+                continue
+
+            elapsed = time.perf_counter() - start
+            with self._cond:
+                self._checkouts += 1
+                self._checkout_time_total += elapsed
+                self._checkout_time_max = max(self._checkout_time_max, elapsed)
+            return conn
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            self._cond.notify()
+
+    def putconn(self, conn, close=False):
+        """Rend une connexion au pool après avoir annulé toute transaction en cours"""
+        if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                close = True
+
+        if close or conn.closed or self._closed or self._expired(conn):
+            self._discard(conn)
+            self._release_slot()
+            return
+
+        conn.last_used_at = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._in_use -= 1
+            self._cond.notify()
+
+    def closeall(self):
+        """Ferme toutes les connexions inactives et refuse les nouveaux emprunts"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+                self._size -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        """Retourne les métriques courantes du pool"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'waiting': self._waiting,
+                'max_size': self.maxconn,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'connections_created': self._created,
+                'connections_discarded': self._discarded,
+                'checkout_time_avg_ms': (self._checkout_time_total / self._checkouts * 1000) if self._checkouts else 0.0,
+                'checkout_time_max_ms': self._checkout_time_max * 1000,
+            }
+
+
+def _unwrap(error):
+    """Erreur psycopg2 d'origine d'une erreur SQLAlchemy, pour les appelants qui attendent psycopg2.Error"""
+    if isinstance(error, sqlalchemy.exc.TimeoutError):
+        return PoolTimeout(str(error))
+    if isinstance(error, sqlalchemy.exc.DBAPIError) and isinstance(error.orig, psycopg2.Error):
+        return error.orig
+    return error
+
+
+class EnginePool:
+    """Connexions psycopg2 brutes empruntées au pool du moteur SQLAlchemy (mêmes bornes et métriques que l'ORM)"""
+
+    def __init__(self, engine, minconn=1, health_check_interval=30.0):
+        self.engine = engine
+        self.minconn = minconn
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Lock()
+        # Connexions prêtées par getconn : connexion psycopg2 -> proxy du pool SQLAlchemy
+        self._lent = {}
+        self._warmed = False
+
+        # Métriques (ORM et requêtes brutes confondus, sauf les temps d'attente mesurés ici)
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+        self._timed_checkouts = 0
+
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+        event.listen(engine, 'close', self._on_discard)
+
+    def _on_connect(self, dbapi_conn, record):
+        with self._lock:
+            self._created += 1
+
+    def _on_checkout(self, dbapi_conn, record, proxy):
+        """Vérifie une connexion restée inactive plus de health_check_interval secondes avant de la prêter"""
+        with self._lock:
+            self._checkouts += 1
+        last_used_at = getattr(dbapi_conn, 'last_used_at', None)
+        if last_used_at is None or time.monotonic() - last_used_at < self.health_check_interval:
+            return
+        try:
+            with dbapi_conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            dbapi_conn.rollback()
+        except psycopg2.Error:
+            # Le pool SQLAlchemy jette la connexion et en ouvre une autre
+            raise sqlalchemy.exc.DisconnectionError()
+
+    def _on_checkin(self, dbapi_conn, record):
+        if isinstance(dbapi_conn, PooledConnection):
+            dbapi_conn.last_used_at = time.monotonic()
+
+    def _on_discard(self, dbapi_conn, record):
+        with self._lock:
+            self._discarded += 1
+
+    def _record_wait(self, start):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._timed_checkouts += 1
+            self._checkout_time_total += elapsed
+            self._checkout_time_max = max(self._checkout_time_max, elapsed)
+
+    def _warm_up(self):
+        """Ouvre minconn connexions au premier emprunt"""
+        with self._lock:
+            if self._warmed:
+                return
+            self._warmed = True
+        proxies = []
+        try:
+            for _ in range(self.minconn):
+                proxies.append(self.engine.raw_connection())
+        except sqlalchemy.exc.SQLAlchemyError as e:
+            print(f"Erreur lors de l'ouverture des connexions initiales: {e}")
+        finally:
+            for proxy in proxies:
+                proxy.close()
+
+    def getconn(self):
+        """Emprunte une connexion psycopg2 au pool du moteur, en attendant au plus DB_POOL_TIMEOUT secondes"""
+        if not self._warmed:
+            self._warm_up()
+        start = time.perf_counter()
+        try:
+            proxy = self.engine.raw_connection()
+        except sqlalchemy.exc.TimeoutError as e:
+            with self._lock:
+                self._timeouts += 1
+            raise _unwrap(e) from e
+        except sqlalchemy.exc.DBAPIError as e:
+            raise _unwrap(e) from e
+        self._record_wait(start)
+        conn = proxy.dbapi_connection
+        with self._lock:
+            self._lent[conn] = proxy
+        return conn
+
+    def session_connection(self):
+        """Connexion psycopg2 de la session ORM courante : requêtes brutes et ORM dans la même transaction"""
+        from app import db
+        if not self._warmed:
+            self._warm_up()
+        start = time.perf_counter()
+        try:
+            conn = db.session.connection().connection.dbapi_connection
+        except sqlalchemy.exc.TimeoutError as e:
+            with self._lock:
+                self._timeouts += 1
+            raise _unwrap(e) from e
+        except sqlalchemy.exc.DBAPIError as e:
+            raise _unwrap(e) from e
+        self._record_wait(start)
+        return conn
+
+    def owns(self, conn):
+        """Vrai si la connexion a été prêtée par getconn (et non par la session ORM)"""
+        with self._lock:
+            return conn in self._lent
+
+    def putconn(self, conn, close=False):
+        """Rend une connexion prêtée par getconn ; le pool SQLAlchemy annule la transaction en cours"""
+        with self._lock:
+            proxy = self._lent.pop(conn)
+        if close or conn.closed:
+            proxy.invalidate()
+        else:
+            proxy.close()
+
+    def closeall(self):
+        """Ferme toutes les connexions inactives du moteur"""
+        self.engine.dispose()
+
+    def after_fork(self):
+        """Dans un processus fils : oublie les connexions héritées du parent sans les fermer"""
+        self.engine.dispose(close=False)
+        self._lock = threading.Lock()
+        self._lent = {}
+        self._warmed = False
+        self._checkouts = self._timeouts = self._created = self._discarded = self._timed_checkouts = 0
+        self._checkout_time_total = self._checkout_time_max = 0.0
+
+    def stats(self):
+        """Retourne les métriques courantes du pool (mêmes clés que ConnectionPool.stats)"""
+        pool = self.engine.pool
+        with self._lock:
+            stats = {
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'connections_created': self._created,
+                'connections_discarded': self._discarded,
+                'checkout_time_avg_ms': (
+                    self._checkout_time_total / self._timed_checkouts * 1000 if self._timed_checkouts else 0.0
+                ),
+                'checkout_time_max_ms': self._checkout_time_max * 1000,
+            }
+        if isinstance(pool, QueuePool):
+            stats.update({
+                'size': pool.checkedin() + pool.checkedout(),
+                'idle': pool.checkedin(),
+                'in_use': pool.checkedout(),
+                'max_size': pool.size() + max(pool._max_overflow, 0),
+            })
+        return stats
+
+
+class ReplicaSet:
+    """Pools des répliques en lecture, parcourus à tour de rôle ; une réplique injoignable est écartée un temps"""
+
+    def __init__(self, pools, retry_interval=30.0):
+        self.pools = list(pools)
+        self.retry_interval = retry_interval
+        self._down_until = [0.0] * len(self.pools)
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def getconn(self):
+        """Connexion sur la prochaine réplique disponible, ou None si aucune ne répond"""
+        if not self.pools:
+            return None
+        start = next(self._next)
+        for offset in range(len(self.pools)):
+            index = (start + offset) % len(self.pools)
+            if self._down_until[index] > time.monotonic():
+                continue
+            try:
+                return self.pools[index].getconn()
+            except psycopg2.OperationalError as e:
+                print(f"Réplique {index} indisponible: {e}")
+                with self._lock:
+                    self._down_until[index] = time.monotonic() + self.retry_interval
+            except PoolTimeout:
+                # Réplique saturée : essayer la suivante sans l'écarter
+                continue
+        return None
+
+    def closeall(self):
+        for pool in self.pools:
+            pool.closeall()
+
+    def stats(self):
+        """Métriques de chaque réplique et indicateur de disponibilité"""
+        now = time.monotonic()
+        return [
+            dict(pool.stats(), available=self._down_until[index] <= now)
+            for index, pool in enumerate(self.pools)
+        ]
+
+
+# ===========================================
+# POOL GLOBAL AU PROCESSUS
+# ===========================================
+
+_pool = None
+_replicas = None
+_pool_lock = threading.Lock()
+
+
+def engine_options(config):
+    """Options du moteur SQLAlchemy : le pool de l'ORM est aussi celui des requêtes brutes"""
+    if not config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+        return {}
+    return {
+        'pool_size': config['DB_POOL_MAX_SIZE'],
+        'max_overflow': 0,
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_MAX_LIFETIME'] or -1,
+        # Connexions annotées (requêtes préparées du registre, date de dernière utilisation)
+        'connect_args': {'connection_factory': PooledConnection},
+    }
+
+
+def get_pool():
+    """Retourne le pool du processus (créé par init_pool à partir du moteur SQLAlchemy)"""
+    if _pool is None:
+        raise RuntimeError("Pool de connexions non initialisé : appeler init_pool(app) dans create_app")
+    return _pool
+
+
+def get_replicas():
+    """Retourne les répliques du processus (ensemble vide si DB_REPLICA_URLS n'est pas renseigné)"""
+    global _replicas
+    if _replicas is None:
+        with _pool_lock:
+            if _replicas is None:
+                from app.config import Config
+                _replicas = ReplicaSet(
+                    [
+                        ConnectionPool(
+                            # Une écriture envoyée par erreur sur une réplique échoue immédiatement
+                            {'dsn': url, 'options': '-c default_transaction_read_only=on'},
+                            minconn=0,
+                            maxconn=Config.DB_POOL_MAX_SIZE,
+                            timeout=Config.DB_POOL_TIMEOUT,
+                            max_lifetime=Config.DB_POOL_MAX_LIFETIME,
+                            health_check_interval=Config.DB_POOL_HEALTH_CHECK_INTERVAL
+                        )
+                        for url in Config.DB_REPLICA_URLS
+                    ],
+                    retry_interval=Config.DB_REPLICA_RETRY_INTERVAL
+                )
+    return _replicas
+
+
+def mark_write():
+    """Signale une écriture : les lectures qui suivent (requête et session en cours) lisent le primaire"""
+    if has_app_context():
+        g._db_wrote = True
+    if has_request_context():
+        session['_db_write_at'] = time.time()
+
+
+def _read_from_primary():
+    """Lecture de ses propres écritures : primaire si la session vient d'écrire"""
+    if has_app_context() and g.get('_db_wrote'):
+        return True
+    if has_request_context() and '_db_write_at' in session:
+        from app.config import Config
+        if time.time() - session['_db_write_at'] < Config.DB_READ_YOUR_WRITES_WINDOW:
+            return True
+        session.pop('_db_write_at', None)
+    return False
+
+
+def get_read_connection():
+    """Connexion pour les lectures : une réplique si possible, sinon la connexion du primaire"""
+    replicas = get_replicas()
+    if not replicas.pools:
+        return get_request_connection()
+    if not has_app_context():
+        return replicas.getconn() or get_pool().getconn()
+    if _read_from_primary():
+        return get_request_connection()
+    conn = g.get('_db_read_conn')
+    if conn is None or conn.closed:
+        conn = replicas.getconn()
+        if conn is None:
+            return get_request_connection()
+        g._db_read_conn = conn
+    return conn
+
+
+def get_request_connection():
+    """Retourne la connexion de la session ORM courante, ou une connexion libre hors contexte d'application"""
+    if not has_app_context():
+        return get_pool().getconn()
+    # Redemandée à chaque appel : après un commit ORM la session rend sa connexion au pool
+    return get_pool().session_connection()
+
+
+def get_stream_connection():
+    """
+    Connexion dédiée à un flux (curseurs serveur, transaction propre), jamais celle de la session ORM :
+    une réplique si possible, sinon une connexion prêtée par le pool du primaire. Rendue par release_connection
+    """
+    replicas = get_replicas()
+    if replicas.pools and not _read_from_primary():
+        conn = replicas.getconn()
+        if conn is not None:
+            return conn
+    return get_pool().getconn()
+
+
+def is_session_connection(conn):
+    """Vrai si `conn` est la connexion de la session ORM (ni prêtée par getconn, ni d'une réplique)"""
+    return has_app_context() and getattr(conn, 'pool', None) is None and not get_pool().owns(conn)
+
+
+class _ConnectionSavepoint:
+    """Équivalent de begin_nested() pour une connexion prêtée : sa transaction ne contient que nos requêtes"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.conn.rollback()
+
+
+def commit_transaction(conn):
+    """Valide la transaction ; par la session ORM si `conn` est sa connexion (l'état de la session reste cohérent)"""
+    if is_session_connection(conn):
+        from app import db
+        db.session.commit()
+    else:
+        conn.commit()
+
+
+def rollback_transaction(conn):
+    """Annule la transaction (connexion réutilisable après une erreur) ; par la session ORM si `conn` est sa connexion"""
+    if is_session_connection(conn):
+        from app import db
+        db.session.rollback()
+    elif not conn.closed:
+        conn.rollback()
+
+
+def begin_nested(conn):
+    """
+    Portée annulable seule (rollback()) ou conservée (commit()) sans toucher au reste de la transaction :
+    savepoint de la session ORM si `conn` est sa connexion
+    """
+    if is_session_connection(conn):
+        from app import db
+        return db.session.begin_nested()
+    return _ConnectionSavepoint(conn)
+
+
+def release_connection(conn):
+    """Rend la connexion à son pool sauf si elle appartient à la session ORM ou à la requête courante"""
+    if getattr(conn, 'pool', None) is not None:
+        if has_app_context() and g.get('_db_read_conn') is conn:
+            return
+        conn.pool.putconn(conn)
+    elif get_pool().owns(conn):
+        get_pool().putconn(conn)
+
+
+def _teardown_connection(exception=None):
+    # La connexion du primaire est rendue par Flask-SQLAlchemy avec la session
+    conn = g.pop('_db_read_conn', None)
+    if conn is not None:
+        conn.pool.putconn(conn, close=conn.closed)
+
+
+def close_before_fork():
+    """Ferme les connexions du processus maître (gunicorn --preload) avant la création des workers"""
+    global _replicas
+    if _pool is not None:
+        _pool.closeall()
+    if _replicas is not None:
+        _replicas.closeall()
+        _replicas = None
+
+
+def reset_after_fork():
+    """Dans un worker : pools vides, les sockets hérités du maître ne sont ni réutilisés ni fermés"""
+    global _replicas, _pool_lock
+    _pool_lock = threading.Lock()
+    _replicas = None
+    if _pool is not None:
+        _pool.after_fork()
+
+
+def init_pool(app):
+    """Crée le pool du processus sur le moteur SQLAlchemy et restitue les connexions en fin de requête"""
+    global _pool
+    from app import db
+    with app.app_context():
+        _pool = EnginePool(
+            db.engine,
+            minconn=app.config['DB_POOL_MIN_SIZE'],
+            health_check_interval=app.config['DB_POOL_HEALTH_CHECK_INTERVAL']
+        )
+    app.teardown_appcontext(_teardown_connection)
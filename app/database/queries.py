@@ -3,32 +3,91 @@ Module de requêtes SQL sécurisées pour l'application Gare de Train
 Toutes les requêtes utilisent des paramètres pour éviter les injections SQL
 """
 
+import time
+
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from app.config import Config
+from app.database.pool import (begin_nested, commit_transaction, get_read_connection, get_request_connection,
+                               get_stream_connection, release_connection, rollback_transaction)
+from app.database.registry import registry
+from app.database.cache import UserReservations, reservation_cache, reservations_changed, station_catalogue
+from app.database.pagination import Page, decode_cursor, make_page
+from app.metrics import instrumented, record_query, streamed_query
+
+
+def contains_pattern(value):
+    """Motif LIKE « contient » pour une saisie utilisateur (caractères spéciaux échappés), None si vide"""
+    if not value:
+        return None
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+def search_plan(source_station, destination_station, departure_from, departure_to, after=None):
+    """Requête nommée, intervalles horaires à parcourir et paramètres d'une recherche de trains"""
+    # Une plage qui traverse minuit (ex. 22:00 -> 02:00) est parcourue en deux intervalles successifs
+    if departure_from and departure_to and departure_from > departure_to:
+        windows = [(departure_from, None), (None, departure_to)]
+        # Un curseur situé après minuit appartient au second intervalle
+        if after and after[0] is not None and after[0] < departure_from:
+            windows = windows[1:]
+    else:
+        windows = [(departure_from, departure_to)]
+    include_unscheduled = departure_from is None and departure_to is None
+    
+    if source_station and destination_station:
+        query_name = 'search_trains_by_route'
+        station_params = (source_station, destination_station)
+    else:
+        query_name = 'search_trains_by_criteria'
+        station_params = (contains_pattern(source_station) or '%',
+                          contains_pattern(destination_station) or '%')
+    
+    def params(window, after, limit):
+        after_time, after_id = after if after else (None, None)
+        return station_params + (
+            window[0], window[1], include_unscheduled,
+            after_id, after_time, after_id, after_time, after_id,
+            limit
+        )
+    
+    return query_name, windows, params
+
+class BookingStatus:
+    """Résultat d'une réservation"""
+    BOOKED = 'booked'                    # Réservation créée
+    ALREADY_BOOKED = 'already_booked'    # L'utilisateur avait déjà réservé ce train
+    FULL = 'full'                        # Plus aucune place dans le train
+    ERROR = 'error'                      # Train inexistant ou erreur de base de données
+
 
 class DatabaseQueries:
     """Classe pour gérer les requêtes SQL sécurisées"""
     
     def __init__(self):
         self.config = Config()
-        self.connection_params = {
-            'host': self.config.DB_HOST,
-            'port': int(self.config.DB_PORT),
-            'database': self.config.DB_NAME,
-            'user': self.config.DB_USERNAME,
-            'password': self.config.DB_PASSWORD
-        }
     
     def get_connection(self):
-        """Établit une connexion à la base de données"""
+        """Emprunte une connexion au pool partagé (réutilisée pendant toute la requête)"""
         try:
-            conn = psycopg2.connect(**self.connection_params)
-            return conn
+            return get_request_connection()
         except psycopg2.Error as e:
             print(f"Erreur de connexion à PostgreSQL: {e}")
             return None
     
+    def get_read_connection(self):
+        """Connexion pour une lecture : réplique si configurée, primaire juste après une écriture"""
+        try:
+            return get_read_connection()
+        except psycopg2.Error as e:
+            print(f"Erreur de connexion à PostgreSQL: {e}")
+            return None
+    
+    def release_connection(self, conn):
+        """Rend la connexion au pool (sans effet si elle appartient à la requête courante)"""
+        release_connection(conn)
+    
+    @instrumented
     def execute_query(self, query_name, params=None, fetch_one=False, fetch_all=False, commit=False):
         """Exécute une requête SQL sécurisée"""
         conn = self.get_connection()
@@ -37,15 +96,10 @@ class DatabaseQueries:
 
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # Charger la requête depuis le fichier SQL
-                query = self._load_query(query_name)
-                if not query:
-                    raise ValueError(f"Query '{query_name}' not found")
-                
-                cur.execute(query, params or ())
+                self._execute(cur, query_name, params)
                 
                 if commit:
-                    conn.commit()
+                    commit_transaction(conn)
                     return cur.rowcount
                 elif fetch_one:
                     return cur.fetchone()
@@ -53,47 +107,26 @@ class DatabaseQueries:
                     return cur.fetchall()
                 else:
                     return None
-        except psycopg2.Error as e:
+        except (psycopg2.Error, ValueError) as e:
             print(f"Erreur lors de l'exécution de la requête '{query_name}': {e}")
-            conn.rollback()
+            rollback_transaction(conn)
             return None
         finally:
-            conn.close()
+            self.release_connection(conn)
     
-    def _load_query(self, query_name):
-        """Charge une requête depuis le fichier SQL/queries.sql"""
-        import os
-        queries_path = os.path.join(os.path.dirname(__file__), '..', '..', 'SQL', 'queries.sql')
-        
+    def _execute(self, cur, query_name, params=None):
+        """Exécute une requête nommée de SQL/queries.sql (préparée côté serveur si fréquente)"""
+        started = time.perf_counter()
         try:
-            with open(queries_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            queries = {}
-            current_query_name = None
-            current_query_lines = []
-
-            for line in content.splitlines():
-                if line.startswith('-- name:'):
-                    if current_query_name and current_query_lines:
-                        queries[current_query_name.strip()] = "\n".join(current_query_lines).strip()
-                    current_query_name = line.split(':', 1)[1].strip()
-                    current_query_lines = []
-                elif current_query_name and line.strip():
-                    current_query_lines.append(line)
-            
-            if current_query_name and current_query_lines:
-                queries[current_query_name.strip()] = "\n".join(current_query_lines).strip()
-            
-            return queries.get(query_name)
-        except Exception as e:
-            print(f"Erreur lors du chargement de la requête '{query_name}': {e}")
-            return None
+            registry.execute(cur, query_name, params)
+        finally:
+            record_query(query_name, time.perf_counter() - started, cur.rowcount, params)
     
     # ===========================================
     # REQUÊTES UTILISATEURS
     # ===========================================
     
+    @instrumented
     def get_user_by_credentials(self, nom, prenom, age):
         """Récupère un utilisateur par ses informations de connexion"""
         conn = self.get_connection()
@@ -102,18 +135,16 @@ class DatabaseQueries:
         
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT id_user, nom, prenom, age 
-                    FROM utilisateur 
-                    WHERE nom = %s AND prenom = %s AND age = %s
-                """, (nom, prenom, age))
+                self._execute(cur, 'get_user_by_credentials', (nom, prenom, age))
                 return cur.fetchone()
         except psycopg2.Error as e:
             print(f"Erreur lors de la récupération de l'utilisateur: {e}")
+            rollback_transaction(conn)
             return None
         finally:
-            conn.close()
+            self.release_connection(conn)
     
+    @instrumented
     def get_user_by_id(self, user_id):
         """Récupère un utilisateur par son ID"""
         conn = self.get_connection()
@@ -122,18 +153,16 @@ class DatabaseQueries:
         
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT id_user, nom, prenom, age 
-                    FROM utilisateur 
-                    WHERE id_user = %s
-                """, (user_id,))
+                self._execute(cur, 'get_user_by_id', (user_id,))
                 return cur.fetchone()
         except psycopg2.Error as e:
             print(f"Erreur lors de la récupération de l'utilisateur: {e}")
+            rollback_transaction(conn)
             return None
         finally:
-            conn.close()
+            self.release_connection(conn)
     
+    @instrumented
     def create_user(self, nom, prenom, age):
         """Crée un nouvel utilisateur"""
         conn = self.get_connection()
@@ -142,21 +171,18 @@ class DatabaseQueries:
         
         try:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO utilisateur (nom, prenom, age) 
-                    VALUES (%s, %s, %s) 
-                    RETURNING id_user
-                """, (nom, prenom, age))
+                self._execute(cur, 'create_user', (nom, prenom, age))
                 user_id = cur.fetchone()[0]
-                conn.commit()
+                commit_transaction(conn)
                 return user_id
         except psycopg2.Error as e:
             print(f"Erreur lors de la création de l'utilisateur: {e}")
-            conn.rollback()
+            rollback_transaction(conn)
             return None
         finally:
-            conn.close()
+            self.release_connection(conn)
     
+    @instrumented
     def user_exists(self, nom, prenom, age):
         """Vérifie si un utilisateur existe déjà"""
         conn = self.get_connection()
@@ -165,377 +191,491 @@ class DatabaseQueries:
         
         try:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT COUNT(*) 
-                    FROM utilisateur 
-                    WHERE nom = %s AND prenom = %s AND age = %s
-                """, (nom, prenom, age))
+                self._execute(cur, 'user_exists', (nom, prenom, age))
                 count = cur.fetchone()[0]
                 return count > 0
         except psycopg2.Error as e:
             print(f"Erreur lors de la vérification de l'utilisateur: {e}")
+            rollback_transaction(conn)
             return False
         finally:
-            conn.close()
+            self.release_connection(conn)
     
     # ===========================================
     # REQUÊTES TRAINS
     # ===========================================
     
-    def get_all_trains(self, limit=50, offset=0):
-        """Récupère tous les trains avec pagination"""
-        conn = self.get_connection()
+    @instrumented
+    def get_all_trains(self, limit=50, cursor=None):
+        """Récupère une page de trains par ordre d'id (pagination par clé, `cursor` = jeton de la page précédente)"""
+        conn = self.get_read_connection()
         if not conn:
-            return []
+            return Page()
         
+        after = decode_cursor('trains', cursor)
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT id_train, train_number, source_station_name, destination_station_name, 
-                           departure_time, arrival_time, distance, source_station_code, destination_station_code
-                    FROM train 
-                    ORDER BY id_train 
-                    LIMIT %s OFFSET %s
-                """, (limit, offset))
-                return cur.fetchall()
+                self._execute(cur, 'get_all_trains', (after[0] if after else None, limit + 1))
+                return make_page(cur.fetchall(), limit, 'trains', lambda row: (row['id_train'],))
         except psycopg2.Error as e:
             print(f"Erreur lors de la récupération des trains: {e}")
-            return []
+            rollback_transaction(conn)
+            return Page()
         finally:
-            conn.close()
+            self.release_connection(conn)
     
+    @instrumented
     def get_train_by_id(self, train_id):
         """Récupère un train par son ID"""
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         if not conn:
             return None
         
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT id_train, train_number, source_station_name, destination_station_name, 
-                           departure_time, arrival_time, distance, source_station_code, destination_station_code
-                    FROM train 
-                    WHERE id_train = %s
-                """, (train_id,))
+                self._execute(cur, 'get_train_by_id', (train_id,))
                 return cur.fetchone()
         except psycopg2.Error as e:
             print(f"Erreur lors de la récupération du train: {e}")
+            rollback_transaction(conn)
             return None
         finally:
-            conn.close()
+            self.release_connection(conn)
     
+    @instrumented
     def search_trains(self, source_station=None, destination_station=None, train_number=None):
         """Recherche des trains par critères"""
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         if not conn:
             return []
         
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # Construction dynamique de la requête
-                query = """
-                    SELECT id_train, train_number, source_station_name, destination_station_name, 
-                           departure_time, arrival_time, distance
-                    FROM train 
-                    WHERE 1=1
-                """
-                params = []
-                
-                if source_station:
-                    query += " AND source_station_name ILIKE %s"
-                    params.append(f"%{source_station}%")
-                
-                if destination_station:
-                    query += " AND destination_station_name ILIKE %s"
-                    params.append(f"%{destination_station}%")
-                
-                if train_number:
-                    query += " AND train_number ILIKE %s"
-                    params.append(f"%{train_number}%")
-                
-                query += " ORDER BY departure_time"
-                
-                cur.execute(query, params)
+                # Les critères absents sont passés à NULL et ignorés par la requête
+                source_pattern = contains_pattern(source_station)
+                destination_pattern = contains_pattern(destination_station)
+                number_pattern = contains_pattern(train_number)
+                self._execute(cur, 'search_trains', (source_pattern, source_pattern,
+                                                     destination_pattern, destination_pattern,
+                                                     number_pattern, number_pattern))
                 return cur.fetchall()
         except psycopg2.Error as e:
             print(f"Erreur lors de la recherche de trains: {e}")
+            rollback_transaction(conn)
             return []
         finally:
-            conn.close()
+            self.release_connection(conn)
     
+    @instrumented
     def get_trains_count(self):
         """Compte le nombre total de trains"""
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         if not conn:
             return 0
         
         try:
             with conn.cursor() as cur:
-                cur.execute("SELECT COUNT(*) FROM train")
+                self._execute(cur, 'get_trains_count')
                 return cur.fetchone()[0]
         except psycopg2.Error as e:
             print(f"Erreur lors du comptage des trains: {e}")
+            rollback_transaction(conn)
             return 0
         finally:
-            conn.close()
+            self.release_connection(conn)
     
     # ===========================================
     # REQUÊTES RÉSERVATIONS
     # ===========================================
     
-    def get_user_reservations(self, user_id):
-        """Récupère les réservations d'un utilisateur"""
-        conn = self.get_connection()
+    @instrumented
+    def get_user_reservations(self, user_id, limit=None, cursor=None):
+        """Récupère les réservations d'un utilisateur, les plus récentes d'abord (toutes, ou une page de `limit`)"""
+        before = decode_cursor('reservations', cursor)
+        reservations = self._user_reservations(user_id)
+        if reservations is not None and reservations.rows is not None:
+            rows = reservations.rows
+            if before:
+                rows = [row for row in rows if row['id_reservation'] < before[0]]
+            return make_page(rows, limit, 'reservations', lambda row: (row['id_reservation'],))
+        
+        conn = self.get_read_connection()
         if not conn:
-            return []
+            return Page()
         
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT r.id_reservation, r.id_user, r.id_train,
-                           u.nom, u.prenom, u.age,
-                           t.train_number, t.source_station_name, t.destination_station_name,
-                           t.departure_time, t.arrival_time, t.distance
-                    FROM reservation r
-                    JOIN utilisateur u ON r.id_user = u.id_user
-                    JOIN train t ON r.id_train = t.id_train
-                    WHERE r.id_user = %s
-                    ORDER BY r.id_reservation DESC
-                """, (user_id,))
-                return cur.fetchall()
+                self._execute(cur, 'get_reservations_by_user', (user_id,
+                                                                before[0] if before else None,
+                                                                None if limit is None else limit + 1))
+                return make_page(cur.fetchall(), limit, 'reservations', lambda row: (row['id_reservation'],))
         except psycopg2.Error as e:
             print(f"Erreur lors de la récupération des réservations: {e}")
-            return []
+            rollback_transaction(conn)
+            return Page()
         finally:
-            conn.close()
+            self.release_connection(conn)
     
+    def _user_reservations(self, user_id):
+        """UserReservations de l'utilisateur depuis le cache, chargées au besoin (None en cas d'erreur)"""
+        return reservation_cache.get(user_id, lambda: self._load_user_reservations(user_id))
+    
+    def _load_user_reservations(self, user_id):
+        max_rows = self.config.RESERVATION_CACHE_MAX_ROWS
+        conn = self.get_read_connection()
+        if not conn:
+            return None
+        
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                self._execute(cur, 'get_reservations_by_user', (user_id, None, max_rows + 1))
+                rows = cur.fetchall()
+            return UserReservations(rows if len(rows) <= max_rows else None)
+        except psycopg2.Error as e:
+            print(f"Erreur lors de la récupération des réservations: {e}")
+            rollback_transaction(conn)
+            return None
+        finally:
+            self.release_connection(conn)
+    
+    @instrumented
+    def booked_train_ids(self, user_id):
+        """
+        Trains réservés par l'utilisateur, lus dans le cache des réservations ; None s'ils ne sont pas
+        connus (erreur, trop de réservations). Indication d'affichage seulement : le cache peut ignorer
+        une annulation faite depuis une autre session, seule create_reservation fait foi
+        """
+        reservations = self._user_reservations(user_id)
+        return reservations.train_ids if reservations is not None else None
+    
+    @staticmethod
+    def _booking_status(row):
+        """BookingStatus d'une ligne renvoyée par create_reservation(s)"""
+        if row['id_reservation'] is not None:
+            return BookingStatus.BOOKED
+        if row['seat_taken'] or row['already_booked']:
+            return BookingStatus.ALREADY_BOOKED
+        if not row['train_exists']:
+            return BookingStatus.ERROR
+        return BookingStatus.FULL
+    
+    @instrumented
     def create_reservation(self, user_id, train_id):
-        """Crée une nouvelle réservation"""
+        """Réserve une place en une seule requête ; retourne un BookingStatus"""
         conn = self.get_connection()
         if not conn:
-            return False
+            return BookingStatus.ERROR
         
         try:
-            with conn.cursor() as cur:
-                # Vérifier si la réservation existe déjà
-                cur.execute("""
-                    SELECT COUNT(*) 
-                    FROM reservation 
-                    WHERE id_user = %s AND id_train = %s
-                """, (user_id, train_id))
-                
-                if cur.fetchone()[0] > 0:
-                    return False  # Réservation déjà existante
-                
-                cur.execute("""
-                    INSERT INTO reservation (id_user, id_train) 
-                    VALUES (%s, %s)
-                """, (user_id, train_id))
-                conn.commit()
-                return True
+            savepoint = begin_nested(conn)
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # Place et réservation dans la même instruction : pas de lecture-modification-écriture
+                self._execute(cur, 'create_reservation', (user_id, train_id))
+                row = cur.fetchone()
+            if row['id_reservation'] is not None:
+                savepoint.commit()
+                commit_transaction(conn)
+                reservations_changed(user_id)
+            else:
+                # Double clic concurrent : la place prise pour rien est rendue
+                savepoint.rollback()
+            return self._booking_status(row)
         except psycopg2.Error as e:
             print(f"Erreur lors de la création de la réservation: {e}")
-            conn.rollback()
-            return False
+            rollback_transaction(conn)
+            return BookingStatus.ERROR
+        finally:
+            self.release_connection(conn)
+    
+    @instrumented
+    def create_reservations(self, user_id, train_ids, attempts=3):
+        """Réserve plusieurs trains en une seule requête ; retourne {id_train: BookingStatus}"""
+        train_ids = sorted({int(train_id) for train_id in train_ids})
+        if not train_ids:
+            return {}
+        
+        conn = self.get_connection()
+        if not conn:
+            return {train_id: BookingStatus.ERROR for train_id in train_ids}
+        
+        try:
+            for attempt in range(attempts):
+                savepoint = begin_nested(conn)
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    self._execute(cur, 'create_reservations', (train_ids, user_id))
+                    rows = cur.fetchall()
+                # Une place prise sans réservation signale un doublon concurrent : on rejoue
+                # la requête, qui verra alors la réservation validée par l'autre transaction
+                if not any(row['seat_taken'] and row['id_reservation'] is None for row in rows):
+                    savepoint.commit()
+                    commit_transaction(conn)
+                    if any(row['id_reservation'] is not None for row in rows):
+                        reservations_changed(user_id)
+                    return {row['id_train']: self._booking_status(row) for row in rows}
+                savepoint.rollback()
+            return {train_id: BookingStatus.ERROR for train_id in train_ids}
+        except psycopg2.Error as e:
+            print(f"Erreur lors de la création des réservations: {e}")
+            rollback_transaction(conn)
+            return {train_id: BookingStatus.ERROR for train_id in train_ids}
         finally:
-            conn.close()
+            self.release_connection(conn)
     
+    @instrumented
     def cancel_reservation(self, reservation_id, user_id):
-        """Annule une réservation"""
+        """Annule une réservation et rend sa place au train"""
         conn = self.get_connection()
         if not conn:
             return False
         
         try:
             with conn.cursor() as cur:
-                cur.execute("""
-                    DELETE FROM reservation 
-                    WHERE id_reservation = %s AND id_user = %s
-                """, (reservation_id, user_id))
+                self._execute(cur, 'cancel_reservation', (reservation_id, user_id))
                 deleted_count = cur.rowcount
-                conn.commit()
+                commit_transaction(conn)
+                if deleted_count > 0:
+                    reservations_changed(user_id)
                 return deleted_count > 0
         except psycopg2.Error as e:
             print(f"Erreur lors de l'annulation de la réservation: {e}")
-            conn.rollback()
+            rollback_transaction(conn)
             return False
         finally:
-            conn.close()
+            self.release_connection(conn)
 
-    def search_trains_by_criteria(self, source_station, destination_station, departure_time=None):
-        """Recherche des trains par critères"""
+    @instrumented
+    def reconcile_seats_booked(self):
+        """Recalcule seats_booked là où il ne correspond plus aux réservations ; retourne le nombre de trains corrigés"""
         conn = self.get_connection()
         if not conn:
-            return []
+            return None
         
         try:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                departure_pattern = f"%{departure_time}%" if departure_time else None
-                cur.execute("""
-                    SELECT DISTINCT t.id_train, t.train_number, t.source_station_name, t.destination_station_name, 
-                           t.departure_time, t.arrival_time, t.distance
-                    FROM train t
-                    WHERE t.source_station_name ILIKE %s
-                      AND t.destination_station_name ILIKE %s
-                      AND (t.departure_time::text LIKE %s OR %s IS NULL)
-                    ORDER BY t.departure_time
-                """, (f"%{source_station}%", f"%{destination_station}%", 
-                      departure_pattern, departure_pattern))
-                return cur.fetchall()
+            with conn.cursor() as cur:
+                self._execute(cur, 'reconcile_seats_booked')
+                fixed = cur.rowcount
+                commit_transaction(conn)
+                return fixed
         except psycopg2.Error as e:
-            print(f"Erreur lors de la recherche de trains: {e}")
-            return []
+            print(f"Erreur lors du recalcul des places réservées: {e}")
+            rollback_transaction(conn)
+            return None
         finally:
-            conn.close()
+            self.release_connection(conn)
 
-    def get_unique_stations(self):
-        """Récupère toutes les gares uniques"""
-        conn = self.get_connection()
+    @instrumented
+    def search_trains_by_criteria(self, source_station, destination_station,
+                                  departure_from=None, departure_to=None, limit=None, cursor=None):
+        """Recherche des trains par gares et plage horaire de départ, triés par heure de départ
+        
+        Si les deux gares sont renseignées, la recherche porte sur le trajet exact (index composite) ;
+        sinon les gares renseignées sont cherchées par sous-chaîne. `limit` donne la taille de page
+        (les N prochains départs) et `cursor` reprend après la dernière ligne d'une page précédente.
+        """
+        conn = self.get_read_connection()
         if not conn:
-            return []
+            return Page()
+        
+        after = decode_cursor('search', cursor)
+        query_name, windows, params = search_plan(
+            source_station, destination_station, departure_from, departure_to, after
+        )
         
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT DISTINCT station_name, station_code
-                    FROM (
-                        SELECT source_station_name as station_name, source_station_code as station_code
-                        FROM train
-                        WHERE source_station_name IS NOT NULL
-                        UNION
-                        SELECT destination_station_name as station_name, destination_station_code as station_code
-                        FROM train
-                        WHERE destination_station_name IS NOT NULL
-                    ) stations
-                    ORDER BY station_name
-                """)
-                return cur.fetchall()
+                rows = []
+                fetch = None if limit is None else limit + 1
+                for window in windows:
+                    remaining = None if fetch is None else fetch - len(rows)
+                    if remaining == 0:
+                        break
+                    self._execute(cur, query_name, params(window, after, remaining))
+                    rows.extend(cur.fetchall())
+                    # Le curseur ne concerne que l'intervalle dans lequel il se trouve
+                    after = None
+                return make_page(rows, limit, 'search', lambda row: (row['departure_time'], row['id_train']))
         except psycopg2.Error as e:
-            print(f"Erreur lors de la récupération des gares: {e}")
-            return []
+            print(f"Erreur lors de la recherche de trains: {e}")
+            rollback_transaction(conn)
+            return Page()
         finally:
-            conn.close()
+            self.release_connection(conn)
+    
+    @instrumented
+    def iter_search_trains(self, source_station, destination_station,
+                           departure_from=None, departure_to=None, batch_size=1000):
+        """Générateur des trains d'une recherche, lus par lots sur un curseur côté serveur
+        
+        La mémoire utilisée ne dépend que de `batch_size`, quel que soit le nombre de résultats.
+        Le flux a sa propre connexion (pas celle de la session ORM), empruntée jusqu'à épuisement
+        (ou fermeture) du générateur.
+        """
+        conn = get_stream_connection()
+        if not conn:
+            raise psycopg2.OperationalError("Aucune connexion disponible")
+        
+        query_name, windows, params = search_plan(
+            source_station, destination_station, departure_from, departure_to
+        )
+        
+        try:
+            for position, window in enumerate(windows):
+                # Curseur nommé (DECLARE ... CURSOR) : le texte SQL est envoyé tel quel, sans PREPARE
+                window_params = params(window, None, None)
+                with conn.cursor(name=f"search_stream_{position}", cursor_factory=RealDictCursor) as cur, \
+                        streamed_query(query_name, window_params) as stream:
+                    cur.itersize = batch_size
+                    stream.execute(cur, registry.sql(query_name), window_params)
+                    while True:
+                        rows = stream.fetch(cur, batch_size)
+                        if not rows:
+                            break
+                        yield from rows
+        finally:
+            # Fin de la transaction de lecture ouverte par DECLARE
+            rollback_transaction(conn)
+            self.release_connection(conn)
 
-    def get_departure_times(self):
-        """Récupère tous les horaires de départ uniques"""
-        conn = self.get_connection()
+    @instrumented
+    def iter_export(self, sections, batch_size=1000):
+        """Générateur de lots (section, lignes) pour un export en masse, lus sur des curseurs côté serveur
+        
+        `sections` : liste de (section, requête nommée, paramètres). Les lignes sont des tuples, sans
+        conversion par ligne côté Python. Toutes les sections sont lues dans la même transaction
+        REPEATABLE READ, sur une connexion dédiée (pas celle de la session ORM) : un export en
+        plusieurs requêtes reste cohérent.
+        """
+        conn = get_stream_connection()
         if not conn:
-            return []
+            raise psycopg2.OperationalError("Aucune connexion disponible")
         
         try:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT DISTINCT departure_time
-                    FROM train
-                    WHERE departure_time IS NOT NULL
-                    ORDER BY departure_time
-                """)
-                return cur.fetchall()
-        except psycopg2.Error as e:
-            print(f"Erreur lors de la récupération des horaires: {e}")
-            return []
+            # Connexion neuve : SET TRANSACTION est la première instruction de la transaction
+            with conn.cursor() as cur:
+                cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            for position, (section, query_name, params) in enumerate(sections):
+                with conn.cursor(name=f"export_{position}") as cur, streamed_query(query_name, params) as stream:
+                    cur.itersize = batch_size
+                    stream.execute(cur, registry.sql(query_name), params or ())
+                    while True:
+                        rows = stream.fetch(cur, batch_size)
+                        if not rows:
+                            break
+                        yield section, rows
         finally:
-            conn.close()
+            rollback_transaction(conn)
+            self.release_connection(conn)
+
+    @instrumented
+    def get_unique_stations(self):
+        """Récupère toutes les gares uniques (depuis le catalogue en mémoire)"""
+        snapshot = self._station_snapshot()
+        return snapshot.stations if snapshot else []
 
-    def get_available_destinations(self, source_station):
-        """Récupère les gares d'arrivée disponibles pour une gare de départ donnée"""
+    def _station_snapshot(self):
+        """Catalogue des gares du processus, chargé depuis la base au premier accès ou après invalidation"""
+        return station_catalogue.get(self._load_station_routes)
+
+    def _load_station_routes(self):
+        """Charge les liaisons distinctes départ -> arrivée servant à construire le catalogue des gares"""
+        # Lu sur le primaire : le catalogue est gardé en mémoire, une réplique en retard le figerait périmé
         conn = self.get_connection()
         if not conn:
-            return []
+            return None
         
         try:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT DISTINCT destination_station_name, destination_station_code
-                    FROM train
-                    WHERE source_station_name = %s
-                    ORDER BY destination_station_name
-                """, (source_station,))
+            with conn.cursor() as cur:
+                self._execute(cur, 'get_station_routes')
                 return cur.fetchall()
         except psycopg2.Error as e:
-            print(f"Erreur lors de la récupération des destinations: {e}")
-            return []
+            print(f"Erreur lors de la récupération des gares: {e}")
+            rollback_transaction(conn)
+            return None
         finally:
-            conn.close()
+            self.release_connection(conn)
 
-    def get_available_sources(self, destination_station):
-        """Récupère les gares de départ disponibles pour une gare d'arrivée donnée"""
-        conn = self.get_connection()
+    @instrumented
+    def suggest_stations(self, query, limit=10):
+        """Suggestions de gares pour l'autocomplétion, classées (début de nom, puis début de mot)"""
+        snapshot = self._station_snapshot()
+        if snapshot is None:
+            return []
+        return snapshot.suggest(query, limit)
+
+    @instrumented
+    def get_departure_times(self):
+        """Récupère tous les horaires de départ uniques"""
+        conn = self.get_read_connection()
         if not conn:
             return []
         
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT DISTINCT source_station_name, source_station_code
-                    FROM train
-                    WHERE destination_station_name = %s
-                    ORDER BY source_station_name
-                """, (destination_station,))
+                self._execute(cur, 'get_departure_times')
                 return cur.fetchall()
         except psycopg2.Error as e:
-            print(f"Erreur lors de la récupération des sources: {e}")
+            print(f"Erreur lors de la récupération des horaires: {e}")
+            rollback_transaction(conn)
             return []
         finally:
-            conn.close()
+            self.release_connection(conn)
+
+    @instrumented
+    def get_available_destinations(self, source_station=None):
+        """Récupère les gares d'arrivée disponibles pour une gare de départ donnée (toutes si aucune)"""
+        snapshot = self._station_snapshot()
+        if snapshot is None:
+            return []
+        if not source_station:
+            return snapshot.all_destinations
+        return snapshot.destinations_by_source.get(source_station, [])
+
+    @instrumented
+    def get_available_sources(self, destination_station=None):
+        """Récupère les gares de départ disponibles pour une gare d'arrivée donnée (toutes si aucune)"""
+        snapshot = self._station_snapshot()
+        if snapshot is None:
+            return []
+        if not destination_station:
+            return snapshot.all_sources
+        return snapshot.sources_by_destination.get(destination_station, [])
     
+    @instrumented
     def get_available_trains_for_user(self, user_id, source_station=None, destination_station=None):
         """Récupère les trains disponibles pour un utilisateur (non réservés)"""
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         if not conn:
             return []
         
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                query = """
-                    SELECT t.id_train, t.train_number, t.source_station_name, t.destination_station_name, 
-                           t.departure_time, t.arrival_time, t.distance
-                    FROM train t
-                    WHERE t.id_train NOT IN (
-                        SELECT r.id_train 
-                        FROM reservation r 
-                        WHERE r.id_user = %s
-                    )
-                """
-                params = [user_id]
-                
-                if source_station:
-                    query += " AND t.source_station_name ILIKE %s"
-                    params.append(f"%{source_station}%")
-                
-                if destination_station:
-                    query += " AND t.destination_station_name ILIKE %s"
-                    params.append(f"%{destination_station}%")
-                
-                query += " ORDER BY t.departure_time"
-                
-                cur.execute(query, params)
+                source_pattern = contains_pattern(source_station)
+                destination_pattern = contains_pattern(destination_station)
+                self._execute(cur, 'get_available_trains_for_user', (user_id,
+                                                                     source_pattern, source_pattern,
+                                                                     destination_pattern, destination_pattern))
                 return cur.fetchall()
         except psycopg2.Error as e:
             print(f"Erreur lors de la récupération des trains disponibles: {e}")
+            rollback_transaction(conn)
             return []
         finally:
-            conn.close()
+            self.release_connection(conn)
     
     # ===========================================
     # REQUÊTES DE STATISTIQUES
     # ===========================================
     
+    @instrumented
     def get_database_stats(self):
         """Récupère les statistiques générales de la base de données"""
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         if not conn:
             return {}
         
         try:
             with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT 
-                        (SELECT COUNT(*) FROM utilisateur) as total_users,
-                        (SELECT COUNT(*) FROM train) as total_trains,
-                        (SELECT COUNT(*) FROM reservation) as total_reservations
-                """)
+                self._execute(cur, 'get_database_stats')
                 result = cur.fetchone()
                 return {
                     'total_users': result[0],
@@ -544,30 +684,69 @@ class DatabaseQueries:
                 }
         except psycopg2.Error as e:
             print(f"Erreur lors de la récupération des statistiques: {e}")
+            rollback_transaction(conn)
             return {}
         finally:
-            conn.close()
+            self.release_connection(conn)
     
+    @instrumented
     def get_top_trains(self, limit=5):
-        """Récupère les trains les plus réservés"""
-        conn = self.get_connection()
+        """Récupère les trains les plus réservés (classement matérialisé, voir refresh_top_trains)"""
+        conn = self.get_read_connection()
         if not conn:
             return []
         
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT t.train_number, t.source_station_name, t.destination_station_name,
-                           COUNT(r.id_reservation) as reservation_count
-                    FROM train t
-                    LEFT JOIN reservation r ON t.id_train = r.id_train
-                    GROUP BY t.id_train, t.train_number, t.source_station_name, t.destination_station_name
-                    ORDER BY reservation_count DESC
-                    LIMIT %s
-                """, (limit,))
+                self._execute(cur, 'get_top_trains', (limit,))
                 return cur.fetchall()
         except psycopg2.Error as e:
             print(f"Erreur lors de la récupération des top trains: {e}")
+            rollback_transaction(conn)
             return []
         finally:
-            conn.close()
+            self.release_connection(conn)
+    
+    @instrumented
+    def refresh_top_trains(self):
+        """Recalcule le classement des trains les plus réservés"""
+        conn = self.get_connection()
+        if not conn:
+            return False
+        
+        try:
+            with conn.cursor() as cur:
+                cur.execute(registry.sql('refresh_top_trains'))
+                commit_transaction(conn)
+                return True
+        except psycopg2.Error as e:
+            print(f"Erreur lors du rafraîchissement du classement des trains: {e}")
+            rollback_transaction(conn)
+            return False
+        finally:
+            self.release_connection(conn)
+    
+    @instrumented
+    def reconcile_stats(self):
+        """Recalcule les compteurs de stats_counter ; retourne [{'name', 'stored', 'actual'}] avant correction"""
+        conn = self.get_connection()
+        if not conn:
+            return None
+        
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # Écritures suspendues le temps des COUNT(*) : aucun incrément ne peut être perdu
+                cur.execute(registry.sql('stats_lock_tables'))
+                self._execute(cur, 'stats_counter_drift')
+                drift = cur.fetchall()
+                self._execute(cur, 'stats_counter_reset', ([row['name'] for row in drift],))
+                for row in drift:
+                    self._execute(cur, 'stats_counter_set', (row['name'], row['actual']))
+                commit_transaction(conn)
+                return drift
+        except psycopg2.Error as e:
+            print(f"Erreur lors du recalcul des statistiques: {e}")
+            rollback_transaction(conn)
+            return None
+        finally:
+            self.release_connection(conn)
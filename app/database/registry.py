@@ -0,0 +1,181 @@
+"""
+Registre des requêtes nommées de SQL/queries.sql
+Le fichier est analysé une seule fois au chargement du module ; les requêtes fréquentes
+sont préparées côté serveur (PREPARE) sur chaque connexion du pool
+"""
+
+import os
+import re
+import threading
+
+import psycopg2
+from psycopg2 import errorcodes
+
+from app.config import Config
+
+QUERIES_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'SQL', 'queries.sql')
+
+_PLACEHOLDER = re.compile(r'%%|%s')
+
+# Échecs de PREPARE qui tiennent au texte de la requête : elle ne sera préparable sur aucune connexion
+DETERMINISTIC_PREPARE_ERRORS = frozenset((
+    errorcodes.SYNTAX_ERROR,
+    errorcodes.INDETERMINATE_DATATYPE,
+    errorcodes.AMBIGUOUS_PARAMETER,
+    errorcodes.FEATURE_NOT_SUPPORTED,
+))
+# Au-delà de ce nombre d'échecs (sur des connexions différentes), la requête n'est plus préparée nulle part
+PREPARE_FAILURE_LIMIT = 3
+
+
+class Statement:
+    """Requête nommée avec sa forme préparée (paramètres positionnels $1, $2, ...)"""
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+        self.prepared_name = f"q_{name}"
+        self.param_count = 0
+
+        def to_positional(match):
+            if match.group(0) == '%%':
+                return '%'
+            self.param_count += 1
+            return f"${self.param_count}"
+
+        # Forme à paramètres positionnels, aussi utilisée telle quelle par l'API asynchrone (asyncpg)
+        self.positional_sql = _PLACEHOLDER.sub(to_positional, sql)
+        self.prepare_sql = f"PREPARE {self.prepared_name} AS {self.positional_sql}"
+        if self.param_count:
+            self.execute_sql = f"EXECUTE {self.prepared_name} ({', '.join(['%s'] * self.param_count)})"
+        else:
+            self.execute_sql = f"EXECUTE {self.prepared_name}"
+        self.preparable = True
+        self.prepare_failures = 0
+
+
+def parse_queries(content):
+    """Découpe le contenu d'un fichier SQL en requêtes nommées par `-- name:`"""
+    queries = {}
+    current_name = None
+    current_lines = []
+
+    for line in content.splitlines():
+        stripped = line.strip()
+        if line.startswith('-- name:'):
+            current_name = line.split(':', 1)[1].strip()
+            current_lines = []
+        elif current_name is None or not stripped or stripped.startswith('--'):
+            continue
+        else:
+            current_lines.append(line.rstrip())
+            # Une requête nommée se termine au premier point-virgule
+            if stripped.endswith(';'):
+                queries[current_name] = "\n".join(current_lines).rstrip(';').strip()
+                current_name = None
+
+    if current_name and current_lines:
+        queries[current_name] = "\n".join(current_lines).rstrip(';').strip()
+
+    return queries
+
+
+class QueryRegistry:
+    """Dictionnaire nom -> requête, rechargé à chaud en développement si le fichier change"""
+
+    def __init__(self, path=QUERIES_PATH, auto_reload=False, prepare_threshold=3):
+        self.path = path
+        self.auto_reload = auto_reload
+        self.prepare_threshold = prepare_threshold
+        self._lock = threading.Lock()
+        self._statements = {}
+        self._mtime = None
+        self.load()
+
+    def load(self):
+        """(Re)charge le fichier de requêtes"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        statements = {name: Statement(name, sql) for name, sql in parse_queries(content).items()}
+        with self._lock:
+            self._statements = statements
+            self._mtime = os.path.getmtime(self.path)
+
+    def _reload_if_changed(self):
+        try:
+            if os.path.getmtime(self.path) != self._mtime:
+                self.load()
+        except OSError as e:
+            print(f"Erreur lors du rechargement des requêtes: {e}")
+
+    def get(self, name):
+        """Retourne la Statement associée à `name` ou None"""
+        if self.auto_reload:
+            self._reload_if_changed()
+        return self._statements.get(name)
+
+    def sql(self, name):
+        """Retourne le texte SQL associé à `name` ou None"""
+        statement = self.get(name)
+        return statement.sql if statement else None
+
+    def names(self):
+        return sorted(self._statements)
+
+    def execute(self, cur, name, params=None):
+        """Exécute la requête `name` sur le curseur, via PREPARE/EXECUTE dès qu'elle devient fréquente"""
+        statement = self.get(name)
+        if statement is None:
+            raise ValueError(f"Query '{name}' not found")
+
+        conn = cur.connection
+        prepared = getattr(conn, 'prepared_statements', None)
+        if not self.prepare_threshold or not statement.preparable or prepared is None:
+            cur.execute(statement.sql, params or ())
+            return
+
+        if prepared.get(statement.prepared_name) != statement.sql:
+            if conn.prepare_failed.get(name) == statement.sql:
+                cur.execute(statement.sql, params or ())
+                return
+            counts = conn.statement_counts
+            counts[name] = counts.get(name, 0) + 1
+            if counts[name] < self.prepare_threshold or not self._prepare(cur, statement):
+                cur.execute(statement.sql, params or ())
+                return
+
+        cur.execute(statement.execute_sql, params or ())
+
+    def _prepare(self, cur, statement):
+        """
+        Prépare la requête sur la connexion du curseur ; un échec n'interrompt pas la transaction en cours.
+        Après un échec, la requête n'est plus préparée sur cette connexion ; elle ne l'est plus sur aucune
+        si l'erreur tient à son texte (syntaxe, type de paramètre indéterminé) ou se répète
+        """
+        conn = cur.connection
+        use_savepoint = not conn.autocommit
+        try:
+            if use_savepoint:
+                cur.execute("SAVEPOINT registry_prepare")
+            if statement.prepared_name in conn.prepared_statements:
+                cur.execute(f"DEALLOCATE {statement.prepared_name}")
+            cur.execute(statement.prepare_sql)
+            if use_savepoint:
+                cur.execute("RELEASE SAVEPOINT registry_prepare")
+        except psycopg2.Error as e:
+            print(f"Impossible de préparer la requête '{statement.name}': {e}")
+            if use_savepoint:
+                cur.execute("ROLLBACK TO SAVEPOINT registry_prepare")
+            conn.prepare_failed[statement.name] = statement.sql
+            statement.prepare_failures += 1
+            if e.pgcode in DETERMINISTIC_PREPARE_ERRORS or statement.prepare_failures >= PREPARE_FAILURE_LIMIT:
+                statement.preparable = False
+            return False
+        conn.prepared_statements[statement.prepared_name] = statement.sql
+        return True
+
+
+registry = QueryRegistry(
+    auto_reload=Config.SQL_QUERIES_AUTO_RELOAD,
+    prepare_threshold=Config.SQL_PREPARE_THRESHOLD
+)
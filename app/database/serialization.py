@@ -0,0 +1,58 @@
+"""
+Conversion des lignes renvoyées par DatabaseQueries en objets sérialisables en JSON
+"""
+
+from datetime import time
+
+
+def row_to_json(row):
+    """Copie d'une ligne (dict) où les heures sont formatées en HH:MM, comme Train.to_dict()"""
+    return {
+        key: value.strftime('%H:%M') if isinstance(value, time) else value
+        for key, value in row.items()
+    }
+
+
+def page_to_json(page):
+    """Corps JSON d'une page de résultats : éléments et curseur de la page suivante"""
+    return {
+        'items': [row_to_json(row) for row in page],
+        'next_cursor': getattr(page, 'next_cursor', None)
+    }
+
+
+# Lignes (tuples) des requêtes d'export, déjà formatées par PostgreSQL : aucun strftime par ligne
+_TRAIN_KEYS = (
+    'id', 'train_number', 'arrival_time', 'departure_time', 'distance',
+    'source_station_code', 'source_station_name', 'destination_station_code', 'destination_station_name',
+    'capacity', 'seats_left',
+)
+
+
+def user_export_to_json(row):
+    """Ligne de export_users au format de User.to_dict()"""
+    id_user, nom, prenom, age = row
+    return {'id': id_user, 'nom': nom, 'prenom': prenom, 'age': age}
+
+
+def train_export_to_json(row):
+    """Ligne de export_trains au format de Train.to_dict()"""
+    return dict(zip(_TRAIN_KEYS, row))
+
+
+def reservation_link_to_json(row):
+    """Ligne de export_reservation_links : réservation sans les données liées"""
+    id_reservation, id_user, id_train = row
+    return {'id': id_reservation, 'user_id': id_user, 'train_id': id_train}
+
+
+def reservation_export_to_json(row):
+    """Ligne de export_reservations au format de Reservation.to_dict() (utilisateur et train inclus)"""
+    id_reservation, id_user, id_train, nom, prenom, age = row[:6]
+    return {
+        'id': id_reservation,
+        'user_id': id_user,
+        'train_id': id_train,
+        'user': {'id': id_user, 'nom': nom, 'prenom': prenom, 'age': age},
+        'train': dict(zip(_TRAIN_KEYS, (id_train,) + tuple(row[6:]))),
+    }
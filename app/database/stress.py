@@ -0,0 +1,96 @@
+"""
+Test de charge des réservations : de nombreux utilisateurs réservent en même temps le même
+train (avec des doubles clics) et l'on vérifie qu'aucune place n'est vendue deux fois
+"""
+
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg2.extras import RealDictCursor
+
+from app.database.pool import get_pool
+from app.database.queries import BookingStatus, DatabaseQueries
+from app.database.registry import registry
+
+
+def _run(statement, params=None, fetch=True):
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(registry.sql(statement), params or ())
+            rows = cur.fetchall() if fetch else None
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+
+def run_booking_stress(users=500, capacity=100, workers=100, clicks=2):
+    """
+    Lance users * clicks réservations concurrentes sur un train de `capacity` places
+    Retourne les compteurs, le débit et la liste des anomalies détectées (vide si tout est correct)
+    """
+    tag = f"stress-{uuid.uuid4().hex[:8]}"
+    train_id = _run('stress_create_train', (tag, capacity))[0]['id_train']
+    user_ids = []
+    try:
+        user_ids = [row['id_user'] for row in _run('stress_create_users', (tag, users))]
+        attempts = [user_id for user_id in user_ids for _ in range(clicks)]
+        random.shuffle(attempts)
+
+        statuses = {}
+        statuses_lock = threading.Lock()
+        db_queries = DatabaseQueries()
+
+        def book(user_id):
+            status = db_queries.create_reservation(user_id, train_id)
+            with statuses_lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(book, attempts))
+        elapsed = time.monotonic() - started
+
+        counts = _run('stress_booking_counts', (train_id,))[0]
+        booked = statuses.get(BookingStatus.BOOKED, 0)
+        expected = min(users, capacity)
+
+        anomalies = []
+        if counts['reservations'] != counts['seats_booked']:
+            anomalies.append(
+                f"compteur seats_booked={counts['seats_booked']} pour {counts['reservations']} réservations"
+            )
+        if counts['reservations'] > capacity:
+            anomalies.append(f"survente : {counts['reservations']} réservations pour {capacity} places")
+        if counts['distinct_users'] != counts['reservations']:
+            anomalies.append("plusieurs réservations pour un même utilisateur")
+        if booked != counts['reservations']:
+            anomalies.append(f"{booked} réservations annoncées pour {counts['reservations']} enregistrées")
+        if counts['reservations'] != expected:
+            anomalies.append(f"{counts['reservations']} réservations au lieu de {expected}")
+        if statuses.get(BookingStatus.ERROR):
+            anomalies.append(f"{statuses[BookingStatus.ERROR]} réservations en erreur")
+
+        return {
+            'attempts': len(attempts),
+            'statuses': statuses,
+            'capacity': capacity,
+            'reservations': counts['reservations'],
+            'seats_booked': counts['seats_booked'],
+            'elapsed_seconds': elapsed,
+            'attempts_per_second': len(attempts) / elapsed if elapsed > 0 else 0.0,
+            'bookings_per_second': booked / elapsed if elapsed > 0 else 0.0,
+            'anomalies': anomalies,
+        }
+    finally:
+        if user_ids:
+            _run('stress_delete_users', (user_ids,), fetch=False)
+        _run('stress_delete_train', (train_id,), fetch=False)
@@ -0,0 +1,121 @@
+"""
+Jeu de données synthétique pour les tests de charge (flask seed-synthetic)
+Gares, trains, utilisateurs et réservations sont générés côté serveur (generate_series), par lots
+validés séparément ; les données sont reconnaissables (nom 'Synthetique', trains 'SYN-') et peuvent
+être supprimées sans toucher au reste de la base. Le n-ième utilisateur se connecte avec
+('Synthetique', 'U<n>', 30) et les trains relient des gares 'Synthetique <s>'
+"""
+
+import time
+
+from app.database.cache import timetable_changed
+from app.database.pool import get_pool
+from app.database.queries import DatabaseQueries
+from app.database.registry import registry
+
+SYNTHETIC_NOM = 'Synthetique'
+SYNTHETIC_AGE = 30
+
+
+def user_credentials(n):
+    """Identifiants de connexion (nom, prénom, âge) du n-ième utilisateur synthétique"""
+    return SYNTHETIC_NOM, f"U{n}", SYNTHETIC_AGE
+
+
+def sample_targets(routes=1000):
+    """Nombre d'utilisateurs synthétiques et échantillon de trajets (départ, arrivée) existants"""
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(registry.sql('synthetic_user_count'))
+            users = cur.fetchone()[0]
+            cur.execute(registry.sql('synthetic_sample_routes'), (routes,))
+            sample = [tuple(row) for row in cur.fetchall()]
+        conn.commit()
+        return users, sample
+    finally:
+        pool.putconn(conn)
+
+
+def _batches(total, size):
+    for start in range(0, total, size):
+        yield start, min(start + size, total)
+
+
+def delete_synthetic():
+    """Supprime les données synthétiques ; retourne (utilisateurs, trains) supprimés"""
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(registry.sql('synthetic_delete_users'))
+            users = cur.rowcount
+            cur.execute(registry.sql('synthetic_delete_trains'))
+            trains = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+    if trains:
+        timetable_changed()
+    return users, trains
+
+
+def seed_synthetic(stations=10000, trains=100000, users=1000000, reservations=10000000,
+                   capacity=1000, batch_size=100000, progress=None):
+    """
+    Génère le jeu de données (après suppression du précédent) ; retourne les volumes et durées
+    `progress(étape, fait, total)` est appelé après chaque lot
+    """
+    if stations < 2:
+        raise ValueError("Il faut au moins deux gares")
+    if trains < 1 or users < 1:
+        raise ValueError("Il faut au moins un train et un utilisateur")
+    if reservations > users * trains:
+        raise ValueError("Plus de réservations que de couples (utilisateur, train) distincts")
+
+    started = time.monotonic()
+    timings = {}
+    delete_synthetic()
+
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            steps = (
+                ('users', users, lambda start, end: (start, end)),
+                ('trains', trains, lambda start, end: (stations, capacity, start, end)),
+                ('reservations', reservations, lambda start, end: (users, trains, start, end)),
+            )
+            for step, total, params in steps:
+                step_started = time.monotonic()
+                for start, end in _batches(total, batch_size):
+                    cur.execute(registry.sql(f"synthetic_insert_{step}"), params(start, end))
+                    conn.commit()
+                    if progress:
+                        progress(step, end, total)
+                timings[f"{step}_seconds"] = time.monotonic() - step_started
+
+            cur.execute(registry.sql('synthetic_sync_seats'))
+            cur.execute(registry.sql('synthetic_analyze'))
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+    timetable_changed()
+    DatabaseQueries().refresh_top_trains()
+
+    return dict(
+        timings,
+        stations=stations,
+        trains=trains,
+        users=users,
+        reservations=reservations,
+        elapsed_seconds=time.monotonic() - started,
+    )
@@ -0,0 +1,206 @@
+"""
+Chargement en masse des horaires détaillés (data/Train_details.csv)
+Le fichier est envoyé par blocs à PostgreSQL via COPY dans une table temporaire,
+puis train_stop et train sont mis à jour par numéro de train : relancer le
+chargement avec le même fichier ne crée aucun doublon. Seuls les trains du chargement
+(timetable_managed) sont modifiés ou supprimés. Un numéro du fichier sans train géré
+reprend son plus ancien train existant (base remplie avant timetable_managed) plutôt que
+d'en créer un second
+"""
+
+import os
+import time
+
+import psycopg2
+from psycopg2 import sql
+
+from app.database.cache import timetable_changed
+from app.database.pool import get_pool
+from app.database.registry import registry
+
+DEFAULT_CSV_PATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'Train_details.csv'))
+
+# Colonnes attendues dans le fichier et noms alternatifs rencontrés dans les exports
+COLUMNS = (
+    'train_number',
+    'station_code',
+    'station_name',
+    'arrival_time',
+    'departure_time',
+    'distance',
+    'source_station_code',
+    'source_station_name',
+    'destination_station_code',
+    'destination_station_name',
+)
+COLUMN_ALIASES = {
+    'train_no': 'train_number',
+    'source_station': 'source_station_code',
+    'destination_station': 'destination_station_code',
+}
+
+
+class TimetableError(Exception):
+    """Fichier d'horaires inutilisable (en-tête incomplet, fichier vide...)"""
+
+
+def map_header(header_line):
+    """Noms des colonnes de la table de chargement, dans l'ordre du fichier"""
+    names = []
+    for position, raw in enumerate(header_line.split(',')):
+        name = raw.strip().strip('"').strip().lower().replace(' ', '_')
+        name = COLUMN_ALIASES.get(name, name)
+        if name not in COLUMNS or name in names:
+            # Colonne inconnue ou en double : chargée puis ignorée
+            name = f"extra_{position}"
+        names.append(name)
+
+    missing = [column for column in COLUMNS if column not in names]
+    if missing:
+        raise TimetableError(f"Colonnes manquantes dans le fichier: {', '.join(missing)}")
+    return names
+
+
+class ProgressReader:
+    """Enveloppe un fichier binaire lu par COPY et signale périodiquement l'avancement"""
+
+    def __init__(self, raw, total_bytes, callback=None, interval=0.5):
+        self.raw = raw
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.callback = callback
+        self.interval = interval
+        self._last_report = 0.0
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.bytes_read += len(data)
+        now = time.monotonic()
+        if self.callback and (not data or now - self._last_report >= self.interval):
+            self._last_report = now
+            self.callback(self.bytes_read, self.total_bytes)
+        return data
+
+    def readline(self, size=-1):
+        line = self.raw.readline(size)
+        self.bytes_read += len(line)
+        return line
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _copy_file(cur, path, chunk_size, progress):
+    """Envoie le fichier dans timetable_stage via COPY ; retourne le nombre de lignes lues"""
+    with open(path, 'rb') as f:
+        reader = ProgressReader(f, os.path.getsize(path), progress)
+        header = reader.readline().decode('utf-8-sig')
+        if not header.strip():
+            raise TimetableError("Le fichier est vide")
+        columns = map_header(header)
+
+        cur.execute(sql.SQL(
+            "CREATE TEMP TABLE timetable_stage (line_no BIGINT GENERATED ALWAYS AS IDENTITY, {})"
+        ).format(sql.SQL(', ').join(
+            sql.SQL("{} TEXT").format(sql.Identifier(column)) for column in columns
+        )))
+
+        # L'identité line_no suit l'ordre du flux COPY : elle donne l'ordre des arrêts
+        cur.copy_expert(
+            sql.SQL("COPY timetable_stage ({}) FROM STDIN WITH (FORMAT csv)").format(
+                sql.SQL(', ').join(sql.Identifier(column) for column in columns)
+            ),
+            reader,
+            size=chunk_size
+        )
+        return cur.rowcount
+
+
+def load_timetable(path=DEFAULT_CSV_PATH, delta=False, batch_size=500, chunk_size=1024 * 1024, progress=None):
+    """
+    Charge le fichier d'horaires ; retourne les compteurs et durées du chargement
+    En mode complet tous les trains du fichier sont réécrits dans une seule transaction ;
+    en mode delta seuls les trains dont l'empreinte a changé sont réécrits et ceux retirés
+    du fichier supprimés, par lots de `batch_size` trains validés chacun séparément
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    started = time.monotonic()
+    result = {
+        'rows_read': 0,
+        'rows_rejected': 0,
+        'trains_in_file': 0,
+        'trains_created': 0,
+        'trains_updated': 0,
+        'trains_removed': 0,
+        'trains_unchanged': 0,
+        'stops_loaded': 0,
+    }
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(registry.sql('timetable_drop_staging'))
+            result['rows_read'] = _copy_file(cur, path, chunk_size, progress)
+            result['copy_seconds'] = time.monotonic() - started
+
+            cur.execute(registry.sql('timetable_clean_stops'))
+            result['rows_rejected'] = result['rows_read'] - cur.rowcount
+            for name in ('timetable_index_stops', 'timetable_digests', 'timetable_derive_trains'):
+                cur.execute(registry.sql(name))
+            result['trains_in_file'] = cur.rowcount
+
+            if delta:
+                cur.execute(registry.sql('timetable_changed_trains'))
+                changed = [row[0] for row in cur.fetchall()]
+                cur.execute(registry.sql('timetable_removed_trains'))
+                removed = [row[0] for row in cur.fetchall()]
+                # Les tables temporaires survivent au commit : chaque lot a sa propre transaction
+                conn.commit()
+            else:
+                cur.execute(registry.sql('timetable_all_trains'))
+                changed = [row[0] for row in cur.fetchall()]
+                removed = []
+            result['trains_unchanged'] = result['trains_in_file'] - len(changed)
+
+            for batch in _batches(changed, batch_size):
+                cur.execute(registry.sql('timetable_delete_stops'), (batch,))
+                cur.execute(registry.sql('timetable_insert_stops'), (batch,))
+                result['stops_loaded'] += cur.rowcount
+                cur.execute(registry.sql('timetable_adopt_trains'), (batch,))
+                cur.execute(registry.sql('timetable_update_trains'), (batch,))
+                cur.execute(registry.sql('timetable_insert_trains'), (batch,))
+                result['trains_created'] += cur.rowcount
+                result['trains_updated'] += len(batch) - cur.rowcount
+                cur.execute(registry.sql('timetable_upsert_digests'), (batch,))
+                if delta:
+                    conn.commit()
+
+            for batch in _batches(removed, batch_size):
+                cur.execute(registry.sql('timetable_delete_stops'), (batch,))
+                cur.execute(registry.sql('timetable_delete_trains'), (batch,))
+                result['trains_removed'] += cur.rowcount
+                cur.execute(registry.sql('timetable_delete_digests'), (batch,))
+                conn.commit()
+
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(registry.sql('timetable_drop_staging'))
+            conn.commit()
+        except psycopg2.Error as e:
+            print(f"Erreur lors de la suppression des tables de chargement: {e}")
+        pool.putconn(conn)
+
+    if result['trains_created'] or result['trains_updated'] or result['trains_removed']:
+        timetable_changed()
+
+    elapsed = time.monotonic() - started
+    result['elapsed_seconds'] = elapsed
+    result['rows_per_second'] = result['rows_read'] / elapsed if elapsed > 0 else 0.0
+    return result
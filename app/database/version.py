@@ -0,0 +1,77 @@
+"""
+Version des horaires partagée par tous les processus (table timetable_version)
+Chaque processus garde la dernière valeur lue quelques secondes : une requête conditionnelle
+peut être résolue en 304 sans accès à la base
+"""
+
+import threading
+import time
+
+import psycopg2
+
+from app.config import Config
+from app.database.pool import get_pool
+from app.database.registry import registry
+
+
+class TimetableVersion:
+    """Version (entier croissant) et date de la dernière modification des horaires"""
+
+    def __init__(self, ttl=5.0):
+        self.ttl = ttl
+        self._state = None
+        self._read_at = 0.0
+        self._lock = threading.Lock()
+
+    def _query(self, name):
+        pool = get_pool()
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(registry.sql(name))
+                row = cur.fetchone()
+            conn.commit()
+            return row
+        except psycopg2.Error:
+            conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn)
+
+    def get(self):
+        """Retourne (version, updated_at), ou None si la version ne peut pas être lue"""
+        state = self._state
+        if state is not None and time.monotonic() - self._read_at < self.ttl:
+            return state
+
+        with self._lock:
+            if self._state is not None and time.monotonic() - self._read_at < self.ttl:
+                return self._state
+            try:
+                row = self._query('get_timetable_version')
+            except psycopg2.Error as e:
+                print(f"Erreur lors de la lecture de la version des horaires: {e}")
+                return self._state
+            self._state = tuple(row) if row else (0, None)
+            self._read_at = time.monotonic()
+            return self._state
+
+    def bump(self):
+        """Incrémente la version en base ; la nouvelle valeur est visible immédiatement dans ce processus"""
+        try:
+            row = self._query('bump_timetable_version')
+        except psycopg2.Error as e:
+            print(f"Erreur lors de l'incrément de la version des horaires: {e}")
+            self.forget()
+            return
+        with self._lock:
+            self._state = tuple(row)
+            self._read_at = time.monotonic()
+
+    def forget(self):
+        """Force la relecture de la version au prochain accès"""
+        with self._lock:
+            self._state = None
+
+
+timetable_version = TimetableVersion(ttl=Config.TIMETABLE_VERSION_TTL)
@@ -0,0 +1,126 @@
+"""
+Exports JSON en masse : réservations d'un utilisateur, d'un train, copie complète pour l'administration
+Chaque section est lue en une seule requête (jointures, pas de chargement paresseux par ligne) sur un
+curseur côté serveur, convertie depuis les tuples et envoyée au fil de l'eau (NDJSON par défaut, ou
+?format=json) : la mémoire du worker reste constante quelle que soit la taille de l'export
+"""
+
+import itertools
+import json
+from datetime import datetime
+from operator import itemgetter
+
+import psycopg2
+from flask import Response, abort, current_app, jsonify, request, stream_with_context
+
+from app.database.queries import DatabaseQueries
+from app.database.serialization import (
+    reservation_export_to_json, reservation_link_to_json, train_export_to_json, user_export_to_json
+)
+from app.tokens import bearer_matches
+
+# Encodeur partagé ; les lignes ne contiennent que des types simples (pas de références circulaires)
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), check_circular=False).encode
+
+
+def export_format():
+    """Format demandé par ?format= (ndjson par défaut), None s'il est invalide"""
+    output_format = request.args.get('format', 'ndjson')
+    return output_format if output_format in ('ndjson', 'json') else None
+
+
+def require_export_token():
+    """Exports d'administration : 404 sans EXPORT_TOKEN configuré, 401 sans le bon jeton"""
+    token = current_app.config['EXPORT_TOKEN']
+    if not token:
+        abort(404)
+    if not bearer_matches(token):
+        abort(401)
+
+
+def reservations_section(user_id=None, train_id=None):
+    """Section des réservations (utilisateur et train inclus), filtrées par utilisateur et/ou train"""
+    return ('reservations', 'export_reservations', (user_id, user_id, train_id, train_id),
+            reservation_export_to_json)
+
+
+def stream_export(sections, output_format, filename):
+    """
+    Réponse en flux ; `sections` : liste de (nom, requête nommée, paramètres, conversion d'une ligne)
+    Une section : tableau JSON (ou un objet par ligne). Plusieurs : objet {nom: [...]} (ou lignes
+    {"type": nom, "data": ...})
+    """
+    names = [section[0] for section in sections]
+    converters = {section[0]: section[3] for section in sections}
+    multiple = len(sections) > 1
+    batches = DatabaseQueries().iter_export(
+        [(name, query_name, params) for name, query_name, params, _ in sections],
+        current_app.config['STREAM_BATCH_SIZE']
+    )
+
+    # Lecture du premier lot avant d'envoyer les en-têtes : une erreur de base donne encore un 503
+    try:
+        first = next(batches, None)
+    except psycopg2.Error as e:
+        print(f"Erreur lors de l'export: {e}")
+        return jsonify({'error': 'Base de données indisponible'}), 503
+
+    def encode_rows(name, rows):
+        convert = converters[name]
+        if output_format == 'json':
+            return ','.join([_encode(convert(row)) for row in rows])
+        if multiple:
+            return ''.join([_encode({'type': name, 'data': convert(row)}) + '\n' for row in rows])
+        return ''.join([_encode(convert(row)) + '\n' for row in rows])
+
+    def generate():
+        try:
+            if output_format == 'json':
+                yield '{' if multiple else '['
+            stream = itertools.chain([first] if first is not None else [], batches)
+            groups = itertools.groupby(stream, key=itemgetter(0))
+            group = next(groups, None)
+            for index, name in enumerate(names):
+                if output_format == 'json' and multiple:
+                    yield f"{',' if index else ''}{_encode(name)}:["
+                # Les lots arrivent dans l'ordre des sections ; une section vide n'en produit aucun
+                if group is not None and group[0] == name:
+                    separator = ''
+                    for _, rows in group[1]:
+                        yield separator + encode_rows(name, rows)
+                        if output_format == 'json':
+                            separator = ','
+                    group = next(groups, None)
+                if output_format == 'json' and multiple:
+                    yield ']'
+            if output_format == 'json':
+                yield '}' if multiple else ']'
+        except psycopg2.Error as e:
+            # Les en-têtes sont partis : le flux est interrompu (document JSON tronqué)
+            print(f"Erreur lors de l'export: {e}")
+        finally:
+            batches.close()
+
+    mimetype = 'application/json' if output_format == 'json' else 'application/x-ndjson'
+    extension = 'json' if output_format == 'json' else 'ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}.{extension}"'
+    })
+
+
+def admin_export_view():
+    """Copie complète (utilisateurs, trains, réservations) lue dans un même instantané de la base"""
+    require_export_token()
+    output_format = export_format()
+    if output_format is None:
+        return jsonify({'error': 'Format invalide, attendu ndjson ou json'}), 400
+    return stream_export([
+        ('users', 'export_users', None, user_export_to_json),
+        ('trains', 'export_trains', None, train_export_to_json),
+        ('reservations', 'export_reservation_links', None, reservation_link_to_json),
+    ], output_format, f"trainstation-{datetime.now():%Y%m%d-%H%M%S}")
+
+
+def init_exports(app):
+    """Enregistre la route d'export complet (active seulement avec EXPORT_TOKEN)"""
+    app.add_url_rule('/admin/export', 'admin_export', admin_export_view)
@@ -1,6 +1,8 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, IntegerField, TimeField, SubmitField, SelectField
-from wtforms.validators import DataRequired, Length, NumberRange, Optional
+from flask_wtf.file import FileAllowed, FileField, FileRequired
+from datetime import time
+from wtforms import StringField, IntegerField, TimeField, SubmitField, SelectField, HiddenField, BooleanField, PasswordField
+from wtforms.validators import DataRequired, Length, NumberRange, Optional, Regexp
 
 class UserForm(FlaskForm):
     nom = StringField('Nom', validators=[DataRequired(), Length(min=1, max=100)])
@@ -17,24 +19,114 @@ class TrainForm(FlaskForm):
     departure_time = TimeField('Heure de départ', validators=[Optional()])
     arrival_time = TimeField('Heure d\'arrivée', validators=[Optional()])
     distance = IntegerField('Distance (km)', validators=[Optional(), NumberRange(min=0)])
+    capacity = IntegerField('Nombre de places', default=500, validators=[DataRequired(), NumberRange(min=1)])
     submit = SubmitField('Ajouter le train')
 
+class BulkUnlockForm(FlaskForm):
+    """Jeton d'opérateur (BULK_ADMIN_TOKEN) ouvrant l'administration groupée pour la session"""
+    token = PasswordField('Jeton d\'opérateur', validators=[DataRequired()])
+    submit = SubmitField('Déverrouiller')
+
+class ProfileUnlockForm(FlaskForm):
+    """Jeton de profilage (PROFILE_TOKEN) ouvrant les pages /admin/profiles pour la session"""
+    token = PasswordField('Jeton de profilage', validators=[DataRequired()])
+    submit = SubmitField('Déverrouiller')
+
+class TrainUploadForm(FlaskForm):
+    """Fichier de trains : CSV avec en-tête ou liste JSON, colonnes nommées comme les champs de TrainForm"""
+    file = FileField('Fichier CSV ou JSON', validators=[
+        FileRequired(), FileAllowed(['csv', 'json'], 'Fichier .csv ou .json attendu')
+    ])
+    dry_run = BooleanField('Vérifier seulement (rien n\'est enregistré)')
+    submit = SubmitField('Importer')
+
+class TrainBatchForm(FlaskForm):
+    """Sélection de trains (au moins un critère) et nouvelles valeurs d'une modification groupée"""
+    ids = StringField('Identifiants (séparés par des virgules)', validators=[
+        Optional(), Regexp(r'^\s*\d+(\s*,\s*\d+)*\s*$', message='Liste d\'identifiants invalide')
+    ])
+    train_number = StringField('Numéro de train', validators=[Optional()])
+    source_station_name = StringField('Nom gare départ', validators=[Optional()])
+    destination_station_name = StringField('Nom gare arrivée', validators=[Optional()])
+    departure_from = TimeField('Départ à partir de', validators=[Optional()])
+    departure_to = TimeField('Départ jusqu\'à', validators=[Optional()])
+    # Nouvelles valeurs, validées par les règles de TrainForm ; un champ vide reste inchangé
+    set_train_number = StringField('Numéro de train')
+    set_source_station_code = StringField('Code gare départ')
+    set_source_station_name = StringField('Nom gare départ')
+    set_destination_station_code = StringField('Code gare arrivée')
+    set_destination_station_name = StringField('Nom gare arrivée')
+    set_departure_time = StringField('Heure de départ')
+    set_arrival_time = StringField('Heure d\'arrivée')
+    set_distance = StringField('Distance (km)')
+    set_capacity = StringField('Nombre de places')
+    dry_run = BooleanField('Simuler (rien n\'est enregistré)')
+    update = SubmitField('Modifier la sélection')
+    delete = SubmitField('Supprimer la sélection')
+
+    def filters(self):
+        """Critères de sélection pour update_trains / delete_trains"""
+        return {
+            'ids': [int(value) for value in self.ids.data.split(',')] if self.ids.data else None,
+            'train_number': self.train_number.data or None,
+            'source_station_name': self.source_station_name.data or None,
+            'destination_station_name': self.destination_station_name.data or None,
+            'departure_from': self.departure_from.data,
+            'departure_to': self.departure_to.data,
+        }
+
+    def values(self):
+        """Nouvelles valeurs saisies (chaînes non vides), par nom de colonne"""
+        return {
+            field.name[len('set_'):]: field.data.strip()
+            for field in self if field.name.startswith('set_') and field.data and field.data.strip()
+        }
+
 class ReservationForm(FlaskForm):
     train_id = SelectField('Sélectionner un train', coerce=int, validators=[DataRequired()])
     submit = SubmitField('Réserver')
 
-class TrainSearchForm(FlaskForm):
-    source_station = SelectField('Gare de départ', coerce=str, validators=[DataRequired()])
-    destination_station = SelectField('Gare d\'arrivée', coerce=str, validators=[DataRequired()])
+class DepartureWindowForm(FlaskForm):
+    """Champs communs aux recherches : plage horaire de départ et nombre de prochains départs"""
     departure_hour = SelectField('Heure', coerce=str, validators=[Optional()])
     departure_minute = SelectField('Minute', coerce=str, validators=[Optional()])
+    departure_hour_to = SelectField('Jusqu\'à', coerce=str, validators=[Optional()])
+    departure_minute_to = SelectField('Minute', coerce=str, validators=[Optional()])
+    max_results = SelectField('Prochains départs', coerce=str, validators=[Optional()])
+    # Jeton de pagination : reprend la recherche après la dernière ligne de la page précédente
+    cursor = HiddenField()
+
+    def populate_departure_choices(self):
+        """Remplit les listes d'heures, de minutes et de nombre de résultats"""
+        hours = [(str(i).zfill(2), str(i).zfill(2)) for i in range(24)]
+        minutes = [(str(i).zfill(2), str(i).zfill(2)) for i in range(0, 60, 5)]  # Par pas de 5 minutes
+        self.departure_hour.choices = [('', 'Heure')] + hours
+        self.departure_minute.choices = [('', 'Minute')] + minutes
+        self.departure_hour_to.choices = [('', 'Heure')] + hours
+        self.departure_minute_to.choices = [('', 'Minute')] + minutes
+        self.max_results.choices = [('', 'Tous')] + [(str(n), str(n)) for n in (5, 10, 20, 50)]
+
+    def departure_window(self):
+        """Retourne (départ au plus tôt, départ au plus tard, nombre maximum de résultats), chacun pouvant être None"""
+        def to_time(hour, minute, default_minute):
+            if not hour:
+                return None
+            return time(int(hour), int(minute) if minute else default_minute)
+
+        # Une heure sans minute couvre toute l'heure : 14h -> de 14:00 à 14:59
+        departure_from = to_time(self.departure_hour.data, self.departure_minute.data, 0)
+        departure_to = to_time(self.departure_hour_to.data, self.departure_minute_to.data, 59)
+        limit = int(self.max_results.data) if self.max_results.data else None
+        return departure_from, departure_to, limit
+
+class TrainSearchForm(DepartureWindowForm):
+    source_station = SelectField('Gare de départ', coerce=str, validators=[DataRequired()])
+    destination_station = SelectField('Gare d\'arrivée', coerce=str, validators=[DataRequired()])
     submit = SubmitField('Chercher des trains')
 
-class ReservationSearchForm(FlaskForm):
+class ReservationSearchForm(DepartureWindowForm):
     source_station = SelectField('Gare de départ', coerce=str, validators=[DataRequired()])
     destination_station = SelectField('Gare d\'arrivée', coerce=str, validators=[DataRequired()])
-    departure_hour = SelectField('Heure', coerce=str, validators=[Optional()])
-    departure_minute = SelectField('Minute', coerce=str, validators=[Optional()])
     submit = SubmitField('Chercher des trajets')
 
 class LoginForm(FlaskForm):
@@ -0,0 +1,79 @@
+"""
+Requêtes conditionnelles (ETag / Last-Modified) pour les pages et API qui ne dépendent que des horaires
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+from app.database.version import timetable_version
+
+
+def timetable_etag(version, full_path, extra=()):
+    """ETag d'une réponse qui ne dépend que de la version des horaires et de l'URL (chemin et paramètres)"""
+    parts = [str(version), full_path, *extra]
+    digest = hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+    return f"tt{version}-{digest}"
+
+
+def _etag(version, public):
+    extra = []
+    if not public:
+        # Les pages HTML contiennent le nom de l'utilisateur et un jeton CSRF à durée limitée
+        extra.append(str(session.get('user_id')))
+        csrf_time_limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+        if csrf_time_limit:
+            extra.append(str(int(time.time() // max(csrf_time_limit // 2, 1))))
+    return timetable_etag(version, request.full_path, extra)
+
+
+def _cache_control(response, public):
+    if public:
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config['TIMETABLE_CACHE_MAX_AGE']
+    else:
+        # Conservée par le navigateur seulement, revalidée à chaque affichage (304 sans accès à la base)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+
+
+def timetable_cached(public=False):
+    """Décorateur de vue GET : ETag dérivé de la version des horaires, 304 si le client est à jour
+
+    `public` : réponse identique pour tous les utilisateurs (API JSON), cacheable par un CDN.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            # Un message flash en attente doit être affiché par un vrai rendu de la page
+            # (les réponses publiques ne lisent pas la session : pas de « Vary: Cookie »)
+            if not public and session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            state = timetable_version.get()
+            if state is None:
+                return view(*args, **kwargs)
+            version, updated_at = state
+            etag = _etag(version, public)
+
+            not_modified = request.if_none_match.contains(etag)
+            if not request.if_none_match and public and updated_at and request.if_modified_since:
+                not_modified = updated_at.replace(microsecond=0) <= request.if_modified_since
+            if not_modified:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if updated_at:
+                response.last_modified = updated_at
+            _cache_control(response, public)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,234 @@
+"""
+Test de charge HTTP de bout en bout (flask load-test)
+Des utilisateurs virtuels enchaînent connexion -> recherche -> réservation -> liste -> annulation
+sur une instance en cours d'exécution, avec le jeu de données synthétique (flask seed-synthetic) ;
+le débit et les latences p50/p95/p99 par route sont enregistrés en JSON pour comparer les versions
+"""
+
+import http.client
+import json
+import math
+import random
+import re
+import subprocess
+import threading
+import time
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+_CSRF = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+_BOOK = re.compile(r'action="/reservation/book/(\d+)"')
+_CANCEL = re.compile(r'action="/reservation/(\d+)/cancel"')
+
+
+class LoadTestError(Exception):
+    """Réponse inattendue pendant un scénario"""
+
+
+class VirtualUser:
+    """Client HTTP avec connexion persistante et cookie de session, qui mesure chaque appel"""
+
+    def __init__(self, base_url, recorder, timeout=30.0):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.netloc, timeout=timeout)
+        self.prefix = parts.path.rstrip('/')
+        self.recorder = recorder
+        self.cookies = {}
+        self.csrf_token = None
+
+    def request(self, label, method, path, form=None, expect=(200,)):
+        headers = {}
+        body = None
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{name}={value}" for name, value in self.cookies.items())
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read().decode('utf-8', 'replace')
+        except (OSError, http.client.HTTPException) as e:
+            self.connection.close()
+            self.recorder.record(label, time.perf_counter() - started, ok=False)
+            raise LoadTestError(f"{label}: {e}")
+        elapsed = time.perf_counter() - started
+
+        for header in response.headers.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+
+        ok = response.status in expect
+        self.recorder.record(label, elapsed, ok=ok)
+        if not ok:
+            raise LoadTestError(f"{label}: statut {response.status}")
+        return content
+
+    def refresh_csrf(self, content):
+        match = _CSRF.search(content)
+        if match:
+            self.csrf_token = match.group(1)
+
+    def close(self):
+        self.connection.close()
+
+
+class Recorder:
+    """Latences par route, partagées par tous les utilisateurs virtuels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.flows = 0
+        self.failed_flows = 0
+
+    def record(self, label, seconds, ok=True):
+        with self._lock:
+            self.latencies.setdefault(label, []).append(seconds)
+            if not ok:
+                self.errors[label] = self.errors.get(label, 0) + 1
+
+    def flow_done(self, ok):
+        with self._lock:
+            if ok:
+                self.flows += 1
+            else:
+                self.failed_flows += 1
+
+
+def percentile(sorted_values, fraction):
+    """Percentile par rang le plus proche d'une liste triée"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_flow(user, credentials, route, cancel_ratio):
+    """Un parcours complet : connexion, recherche, réservation, liste, annulation éventuelle, déconnexion"""
+    nom, prenom, age = credentials
+    source, destination = route
+
+    user.cookies.clear()
+    user.refresh_csrf(user.request('GET /auth/login', 'GET', '/auth/login'))
+    user.request('POST /auth/login', 'POST', '/auth/login', {
+        'csrf_token': user.csrf_token, 'nom': nom, 'prenom': prenom, 'age': age
+    }, expect=(302,))
+
+    # Appel de la liste déroulante (JavaScript) puis recherche
+    user.request('GET /reservation/api/available-destinations', 'GET',
+                 '/reservation/api/available-destinations?' + urlencode({'source_station': source}),
+                 expect=(200, 304))
+    page = user.request('POST /reservation/add', 'POST', '/reservation/add', {
+        'csrf_token': user.csrf_token, 'source_station': source, 'destination_station': destination,
+        'departure_hour': '', 'departure_minute': '', 'departure_hour_to': '', 'departure_minute_to': '',
+        'max_results': '', 'cursor': ''
+    })
+    user.refresh_csrf(page)
+
+    train_ids = _BOOK.findall(page)
+    if train_ids:
+        user.request('POST /reservation/book/<id>', 'POST', f"/reservation/book/{random.choice(train_ids)}",
+                     {'csrf_token': user.csrf_token}, expect=(302,))
+
+    page = user.request('GET /reservation/', 'GET', '/reservation/')
+    reservation_ids = _CANCEL.findall(page)
+    if reservation_ids and random.random() < cancel_ratio:
+        user.request('POST /reservation/<id>/cancel', 'POST', f"/reservation/{reservation_ids[0]}/cancel",
+                     {'csrf_token': user.csrf_token}, expect=(302,))
+
+    user.request('GET /auth/logout', 'GET', '/auth/logout', expect=(302,))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=5, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_load_test(base_url, users, routes, credentials, concurrency=20, duration=60.0, cancel_ratio=0.5):
+    """
+    Lance `concurrency` utilisateurs virtuels pendant `duration` secondes
+    `users` : nombre d'utilisateurs synthétiques, `routes` : trajets (départ, arrivée) existants,
+    `credentials(n)` : identifiants du n-ième utilisateur. Retourne le rapport (sérialisable en JSON)
+    """
+    if not users or not routes:
+        raise LoadTestError("Jeu de données synthétique absent : lancer flask seed-synthetic")
+
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+
+    def worker():
+        user = VirtualUser(base_url, recorder)
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    run_flow(user, credentials(random.randrange(users)), random.choice(routes), cancel_ratio)
+                    recorder.flow_done(True)
+                except LoadTestError:
+                    recorder.flow_done(False)
+        finally:
+            user.close()
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    report_routes = {}
+    for label, values in sorted(recorder.latencies.items()):
+        values.sort()
+        report_routes[label] = {
+            'requests': len(values),
+            'errors': recorder.errors.get(label, 0),
+            'throughput_rps': len(values) / elapsed,
+            'mean_ms': sum(values) / len(values) * 1000,
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+            'max_ms': values[-1] * 1000,
+        }
+
+    total_requests = sum(route['requests'] for route in report_routes.values())
+    return {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'base_url': base_url,
+        'concurrency': concurrency,
+        'duration_seconds': elapsed,
+        'cancel_ratio': cancel_ratio,
+        'dataset': {'users': users, 'sampled_routes': len(routes)},
+        'flows': recorder.flows,
+        'failed_flows': recorder.failed_flows,
+        'requests': total_requests,
+        'throughput_rps': total_requests / elapsed if elapsed > 0 else 0.0,
+        'routes': report_routes,
+    }
+
+
+def compare_reports(current, baseline):
+    """Lignes (route, p95 de référence, p95 actuel, écart %, débit de référence, débit actuel)"""
+    rows = []
+    for label, route in current['routes'].items():
+        reference = baseline.get('routes', {}).get(label)
+        if reference is None:
+            continue
+        delta = (route['p95_ms'] - reference['p95_ms']) / reference['p95_ms'] * 100 if reference['p95_ms'] else 0.0
+        rows.append((label, reference['p95_ms'], route['p95_ms'], delta,
+                     reference['throughput_rps'], route['throughput_rps']))
+    return rows
+
+
+def save_report(report, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
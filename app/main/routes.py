@@ -1,4 +1,5 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, session
+from app.database.queries import DatabaseQueries
 
 main_bp = Blueprint('main', __name__)
 
@@ -11,4 +12,9 @@ def dashboard():
     if not session.get('user_id'):
         flash('Vous devez être connecté pour accéder au tableau de bord.', 'error')
         return redirect(url_for('auth.login'))
-    return render_template('dashboard.html')
+    
+    # Compteurs et classement matérialisés : lecture en temps constant
+    db_queries = DatabaseQueries()
+    stats = db_queries.get_database_stats()
+    top_trains = db_queries.get_top_trains(5)
+    return render_template('dashboard.html', stats=stats, top_trains=top_trains)
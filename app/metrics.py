@@ -0,0 +1,325 @@
+"""
+Instrumentation des requêtes HTTP et SQL
+Compteurs par requête (en-têtes X-DB-Queries / Server-Timing), journal des requêtes SQL lentes
+et histogrammes par route exposés au format Prometheus sur /metrics (avec l'état du pool et du cache des réservations)
+"""
+
+import bisect
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import Response, abort, current_app, g, has_request_context, request
+
+from app.tokens import bearer_matches
+
+# Bornes (secondes) des histogrammes de durée
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bornes du nombre de requêtes SQL par requête HTTP (repère les N+1)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Métriques cumulées du pool (les autres sont des jauges)
+POOL_COUNTERS = ('checkouts', 'timeouts', 'connections_created', 'connections_discarded')
+
+
+class Histogram:
+    """Histogramme cumulatif à bornes fixes"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestStats:
+    """Compteurs de la requête HTTP courante, conservés dans flask.g"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.rows = 0
+        self.db_time = 0.0
+        # nom -> [appels, durée] pour les requêtes SQL et les méthodes de DatabaseQueries
+        self.by_query = {}
+        self.by_method = {}
+
+
+class MetricsRegistry:
+    """Métriques cumulées du processus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_duration = {}
+        self.request_db_time = {}
+        self.request_db_queries = {}
+        self.query_duration = {}
+        self.query_rows = {}
+        self.method_calls = {}
+
+    @staticmethod
+    def _histogram(table, key, buckets):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram(buckets)
+        return histogram
+
+    def observe_request(self, route, method, status, seconds, stats):
+        labels = (route, method, str(status))
+        with self._lock:
+            self._histogram(self.request_duration, labels, DURATION_BUCKETS).observe(seconds)
+            self._histogram(self.request_db_time, labels, DURATION_BUCKETS).observe(stats.db_time)
+            self._histogram(self.request_db_queries, labels, COUNT_BUCKETS).observe(stats.queries)
+
+    def observe_query(self, name, seconds, rows):
+        with self._lock:
+            self._histogram(self.query_duration, (name,), DURATION_BUCKETS).observe(seconds)
+            self.query_rows[name] = self.query_rows.get(name, 0) + rows
+
+    def observe_method(self, name):
+        with self._lock:
+            self.method_calls[name] = self.method_calls.get(name, 0) + 1
+
+    def render(self):
+        """Texte au format d'exposition Prometheus"""
+        lines = []
+        with self._lock:
+            self._render_histograms(lines, 'http_request_duration_seconds',
+                                    "Durée des requêtes HTTP par route", ('route', 'method', 'status'),
+                                    self.request_duration)
+            self._render_histograms(lines, 'http_request_db_seconds',
+                                    "Temps passé en base par requête HTTP", ('route', 'method', 'status'),
+                                    self.request_db_time)
+            self._render_histograms(lines, 'http_request_db_queries',
+                                    "Requêtes SQL par requête HTTP", ('route', 'method', 'status'),
+                                    self.request_db_queries)
+            self._render_histograms(lines, 'db_query_duration_seconds',
+                                    "Durée d'exécution des requêtes nommées", ('query',),
+                                    self.query_duration)
+            self._render_counters(lines, 'db_query_rows_total',
+                                  "Lignes retournées ou modifiées par requête nommée", 'query', self.query_rows)
+            self._render_counters(lines, 'db_method_calls_total',
+                                  "Appels des méthodes de DatabaseQueries", 'method', self.method_calls)
+        self._render_pool(lines)
+        self._render_reservation_cache(lines)
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _labels(names, values):
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for value in values)
+        return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+    def _render_histograms(self, lines, metric, help_text, label_names, table):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for key in sorted(table):
+            histogram = table[key]
+            labels = self._labels(label_names, key)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"{metric}_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+
+    def _render_counters(self, lines, metric, help_text, label_name, table):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for key in sorted(table):
+            lines.append(f"{metric}{{{self._labels((label_name,), (key,))}}} {table[key]}")
+
+    @staticmethod
+    def _render_pool(lines):
+        from app.database.pool import get_pool
+        try:
+            stats = get_pool().stats()
+        except RuntimeError:
+            return
+        for key, value in sorted(stats.items()):
+            if key in POOL_COUNTERS:
+                metric, kind = f"db_pool_{key}_total", 'counter'
+            else:
+                metric, kind = f"db_pool_{key}", 'gauge'
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric} {value}")
+
+    @staticmethod
+    def _render_reservation_cache(lines):
+        from app.database.cache import reservation_cache
+        for key, value in sorted(reservation_cache.stats().items()):
+            if key == 'entries':
+                metric, kind = 'reservation_cache_entries', 'gauge'
+            else:
+                metric, kind = f"reservation_cache_{key}_total", 'counter'
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric} {value}")
+
+
+metrics = MetricsRegistry()
+
+
+def record_query(name, seconds, rows, params=None):
+    """Enregistre une exécution de requête nommée (appelée par DatabaseQueries._execute)"""
+    metrics.observe_query(name, seconds, max(rows, 0))
+
+    if has_request_context():
+        stats = g.get('_request_stats')
+        if stats is not None:
+            stats.queries += 1
+            stats.rows += max(rows, 0)
+            stats.db_time += seconds
+            entry = stats.by_query.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+        threshold = current_app.config['SLOW_QUERY_THRESHOLD_MS']
+    else:
+        from app.config import Config
+        threshold = Config.SLOW_QUERY_THRESHOLD_MS
+
+    if threshold and seconds * 1000 >= threshold:
+        # Les valeurs des paramètres (noms, âges...) ne sont jamais journalisées
+        param_count = len(params) if params else 0
+        route = f" route={request.endpoint}" if has_request_context() else ''
+        print(f"Requête lente: {name} {seconds * 1000:.1f} ms, {rows} lignes, "
+              f"{param_count} paramètre(s) masqué(s){route}")
+
+
+class StreamedQuery:
+    """Durée (execute et fetchmany seulement) et nombre de lignes d'une requête lue par lots"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.rows = 0
+
+    def execute(self, cur, query, params=None):
+        started = time.perf_counter()
+        try:
+            cur.execute(query, params)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+    def fetch(self, cur, size):
+        started = time.perf_counter()
+        try:
+            rows = cur.fetchmany(size)
+        finally:
+            self.seconds += time.perf_counter() - started
+        self.rows += len(rows)
+        return rows
+
+
+@contextmanager
+def streamed_query(name, params=None):
+    """
+    Mesure d'une requête nommée lue sur un curseur côté serveur (qui ne passe pas par _execute) : enregistrée
+    par record_query une seule fois, quand le curseur est épuisé, en erreur ou que son générateur est fermé
+    """
+    stream = StreamedQuery()
+    try:
+        yield stream
+    finally:
+        record_query(name, stream.seconds, stream.rows, params)
+
+
+def _observe_method(name, started):
+    metrics.observe_method(name)
+    # Générateur fermé après la requête (ramasse-miettes) : plus de statistiques de requête à compléter
+    stats = g.get('_request_stats') if has_request_context() else None
+    if stats is not None:
+        entry = stats.by_method.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += time.perf_counter() - started
+
+
+def instrumented(method):
+    """
+    Décorateur des méthodes de DatabaseQueries : nombre d'appels et durée par méthode
+    Pour un générateur, la durée va jusqu'à son épuisement ou sa fermeture, pas seulement sa création
+    """
+    name = method.__name__
+
+    if inspect.isgeneratorfunction(method):
+        @wraps(method)
+        def generator_wrapper(*args, **kwargs):
+            if not has_request_context():
+                metrics.observe_method(name)
+                yield from method(*args, **kwargs)
+                return
+            started = time.perf_counter()
+            try:
+                yield from method(*args, **kwargs)
+            finally:
+                _observe_method(name, started)
+
+        return generator_wrapper
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        if not has_request_context():
+            metrics.observe_method(name)
+            return method(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _observe_method(name, started)
+
+    return wrapper
+
+
+def _start_request():
+    g._request_stats = RequestStats()
+
+
+def _server_timing(stats, total):
+    entries = [
+        f"app;dur={total * 1000:.1f}",
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} SQL, {stats.rows} rows"',
+    ]
+    for prefix, table in (('m', stats.by_method), ('q', stats.by_query)):
+        for name, (calls, seconds) in sorted(table.items(), key=lambda item: -item[1][1]):
+            entries.append(f'{prefix}_{name};dur={seconds * 1000:.1f};desc="{calls} calls"')
+    return ', '.join(entries)
+
+
+def _finish_request(response):
+    stats = g.pop('_request_stats', None)
+    if stats is None:
+        return response
+    total = time.perf_counter() - stats.started
+    route = request.url_rule.rule if request.url_rule is not None else 'inconnue'
+    metrics.observe_request(route, request.method, response.status_code, total, stats)
+
+    # Détail des requêtes SQL : en-têtes activés pour tous, ou pour qui présente METRICS_TOKEN
+    if current_app.config['DB_TIMING_HEADERS'] or _metrics_token_presented():
+        response.headers['X-DB-Queries'] = str(stats.queries)
+        response.headers['Server-Timing'] = _server_timing(stats, total)
+    return response
+
+
+def _metrics_token_presented():
+    """Vrai si la requête porte "Authorization: Bearer <METRICS_TOKEN>" (jamais sans jeton configuré)"""
+    return bearer_matches(current_app.config['METRICS_TOKEN'])
+
+
+def metrics_view():
+    """Métriques au format Prometheus : 404 sans METRICS_TOKEN configuré, 401 sans le bon jeton"""
+    if not current_app.config['METRICS_TOKEN']:
+        abort(404)
+    if not _metrics_token_presented():
+        abort(401)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_metrics(app):
+    """Enregistre les hooks d'instrumentation et la route /metrics"""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -36,6 +36,17 @@ class Train(db.Model):
     source_station_name = db.Column(db.String(200), nullable=True)
     destination_station_code = db.Column(db.String(50), nullable=True)
     destination_station_name = db.Column(db.String(200), nullable=True)
+    # Nombre de places et compteur de places réservées (mis à jour par les requêtes de réservation)
+    capacity = db.Column(db.Integer, nullable=False, default=500, server_default='500')
+    seats_booked = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Train créé par le chargement des horaires (numéro unique parmi ces trains)
+    timetable_managed = db.Column(db.Boolean, nullable=False, default=False, server_default='false')
+    
+    __table_args__ = (
+        db.CheckConstraint('seats_booked >= 0 AND seats_booked <= capacity', name='ck_train_seats'),
+        db.Index('uq_train_timetable_number', 'train_number', unique=True,
+                 postgresql_where=db.text('timetable_managed'), sqlite_where=db.text('timetable_managed')),
+    )
     
     # Relation avec les réservations
     reservations = db.relationship('Reservation', backref='train', lazy=True, cascade='all, delete-orphan')
@@ -53,9 +64,15 @@ class Train(db.Model):
             'source_station_code': self.source_station_code,
             'source_station_name': self.source_station_name,
             'destination_station_code': self.destination_station_code,
-            'destination_station_name': self.destination_station_name
+            'destination_station_name': self.destination_station_name,
+            'capacity': self.capacity,
+            'seats_left': self.seats_left
         }
     
+    @property
+    def seats_left(self):
+        return self.capacity - self.seats_booked if self.capacity is not None else None
+    
     @property
     def display_name(self):
         """Nom d'affichage du train pour les formulaires"""
@@ -63,8 +80,59 @@ class Train(db.Model):
             return f"{self.train_number} - {self.source_station_name} → {self.destination_station_name}"
         return f"Train {self.train_number}"
 
+class TrainStop(db.Model):
+    __tablename__ = 'train_stop'
+    
+    # Un arrêt par gare desservie, dans l'ordre du parcours (chargé depuis data/Train_details.csv)
+    train_number = db.Column(db.String, primary_key=True)
+    stop_sequence = db.Column(db.Integer, primary_key=True)
+    station_code = db.Column(db.String(50), nullable=True)
+    station_name = db.Column(db.String(200), nullable=True)
+    arrival_time = db.Column(db.Time, nullable=True)
+    departure_time = db.Column(db.Time, nullable=True)
+    distance = db.Column(db.Integer, nullable=True)  # Distance cumulée depuis la gare d'origine
+    
+    def __repr__(self):
+        return f'<TrainStop {self.train_number}#{self.stop_sequence} {self.station_name}>'
+
+class TrainStopDigest(db.Model):
+    __tablename__ = 'train_stop_digest'
+    
+    # Empreinte de la suite d'arrêts d'un train au dernier chargement (rechargement incrémental)
+    train_number = db.Column(db.String, primary_key=True)
+    digest = db.Column(db.String(32), nullable=False)
+    loaded_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<TrainStopDigest {self.train_number} {self.digest}>'
+
+class TimetableVersion(db.Model):
+    __tablename__ = 'timetable_version'
+    
+    # Ligne unique (id = 1) : version des horaires servant aux ETag
+    id = db.Column(db.SmallInteger, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    
+    def __repr__(self):
+        return f'<TimetableVersion {self.version}>'
+
+class StatsCounter(db.Model):
+    __tablename__ = 'stats_counter'
+    
+    # Compteur de lignes d'une table, réparti en tranches (voir Creation_script.sql pour les triggers)
+    name = db.Column(db.String(50), primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<StatsCounter {self.name}[{self.shard}]={self.value}>'
+
 class Reservation(db.Model):
     __tablename__ = 'reservation'
+    __table_args__ = (
+        db.UniqueConstraint('id_user', 'id_train', name='uq_res_user_train'),
+    )
     
     id_reservation = db.Column(db.Integer, primary_key=True)
     id_user = db.Column(db.Integer, db.ForeignKey('utilisateur.id_user'), nullable=False)
@@ -0,0 +1,305 @@
+"""
+Profilage à la demande des requêtes en production
+Une requête est profilée si elle porte l'en-tête X-Profile avec PROFILE_TOKEN, ou au hasard selon
+PROFILE_SAMPLE_RATE ; un thread échantillonne la pile du thread de la requête et les piles agrégées
+(format « collapsed », lisible par flamegraph.pl / speedscope) sont conservées pour les plus lentes.
+Avec PROFILE_DIR, les profils de tous les processus y sont écrits et les pages les lisent depuis ce dossier.
+Sans jeton ni taux d'échantillonnage, aucun hook n'est enregistré
+"""
+
+import heapq
+import itertools
+import json
+import os
+import re
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import Response, abort, current_app, flash, g, redirect, render_template, request, url_for
+
+from app.forms import ProfileUnlockForm
+from app.tokens import session_unlocked, token_matches, unlock_session
+
+PROFILE_HEADER = 'X-Profile'
+TOKEN_HEADER = 'X-Profile-Token'
+SESSION_KEY = '_profile_viewer'
+# Nom d'un profil écrit dans PROFILE_DIR (sans extension) : rien qui puisse sortir du dossier
+PROFILE_FILE_NAME = re.compile(r'^[\w.-]+$')
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    path = code.co_filename.replace('\\', '/').split('/')
+    return f"{'/'.join(path[-2:])}:{code.co_name}"
+
+
+class Sampler:
+    """Thread qui relève la pile d'un autre thread toutes les `interval` secondes"""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+
+class Profile:
+    """Profil d'une requête : piles échantillonnées et contexte"""
+
+    def __init__(self, profile_id, endpoint, method, path, duration, interval, stacks, samples, recorded_at=None):
+        self.id = profile_id
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.duration = duration
+        self.interval = interval
+        self.stacks = stacks
+        self.samples = samples
+        self.recorded_at = recorded_at or datetime.now()
+        # Identifiant dans les URL : numéro dans le processus, ou nom du fichier dans PROFILE_DIR
+        self.key = str(profile_id)
+
+    def metadata(self):
+        """Contexte du profil, écrit à côté des piles dans PROFILE_DIR"""
+        return {
+            'id': self.id,
+            'pid': os.getpid(),
+            'endpoint': self.endpoint,
+            'method': self.method,
+            'path': self.path,
+            'duration': self.duration,
+            'interval': self.interval,
+            'samples': self.samples,
+            'recorded_at': self.recorded_at.isoformat(),
+        }
+
+    def collapsed(self):
+        """Une ligne « pile;appelée nombre » par pile distincte"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_functions(self, limit=20):
+        """Fonctions les plus souvent en sommet de pile : (fonction, échantillons, part)"""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        total = self.samples or 1
+        return [(name, count, count / total) for name, count in leaves.most_common(limit)]
+
+
+class ProfileStore:
+    """
+    Conserve les `keep` profils les plus lents du processus. Avec `directory`, chaque profil y est aussi écrit
+    (piles .collapsed et contexte .json) et la liste comme le détail sont lus dans ce dossier, partagé par
+    tous les processus : un profil reste consultable quel que soit le worker qui sert la page
+    """
+
+    def __init__(self, keep=50, directory=None):
+        self.keep = keep
+        self.directory = directory
+        self._heap = []
+        self._by_id = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        return next(self._ids)
+
+    def add(self, profile):
+        with self._lock:
+            self._by_id[profile.id] = profile
+            heapq.heappush(self._heap, (profile.duration, profile.id))
+            if len(self._heap) > self.keep:
+                _, evicted = heapq.heappop(self._heap)
+                self._by_id.pop(evicted, None)
+
+        if self.directory:
+            # Le pid distingue les profils de même numéro écrits par des processus différents
+            profile.key = f"{profile.recorded_at:%Y%m%d-%H%M%S}-{os.getpid()}-{profile.id}-{profile.endpoint}"
+            base = os.path.join(self.directory, profile.key)
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+                    f.write(profile.collapsed())
+                # Contexte écrit en dernier : un profil n'est listé qu'une fois ses piles complètes
+                with open(base + '.json', 'w', encoding='utf-8') as f:
+                    json.dump(profile.metadata(), f)
+            except OSError as e:
+                print(f"Erreur lors de l'écriture du profil: {e}")
+
+    def _read(self, key, with_stacks=True):
+        """Profil `key` lu dans le dossier (piles seulement si `with_stacks`), None s'il est absent ou illisible"""
+        base = os.path.join(self.directory, key)
+        stacks = Counter()
+        try:
+            with open(base + '.json', encoding='utf-8') as f:
+                meta = json.load(f)
+            if with_stacks:
+                with open(base + '.collapsed', encoding='utf-8') as f:
+                    for line in f:
+                        stack, _, count = line.rstrip('\n').rpartition(' ')
+                        if stack and count.isdigit():
+                            stacks[stack] += int(count)
+            profile = Profile(meta['id'], meta['endpoint'], meta['method'], meta['path'], meta['duration'],
+                              meta['interval'], stacks, meta['samples'],
+                              datetime.fromisoformat(meta['recorded_at']))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Erreur lors de la lecture du profil {key}: {e}")
+            return None
+        profile.key = key
+        return profile
+
+    def get(self, key):
+        """Profil identifié par `key` (Profile.key), None s'il n'existe pas"""
+        if self.directory:
+            if not PROFILE_FILE_NAME.match(key):
+                return None
+            return self._read(key)
+        if not key.isdigit():
+            return None
+        with self._lock:
+            return self._by_id.get(int(key))
+
+    def slowest(self):
+        """Les `keep` profils les plus lents, de tous les processus avec `directory`"""
+        if self.directory:
+            try:
+                names = os.listdir(self.directory)
+            except OSError as e:
+                print(f"Erreur lors de la lecture des profils: {e}")
+                return []
+            profiles = (self._read(name[:-len('.json')], with_stacks=False)
+                        for name in names if name.endswith('.json'))
+            return heapq.nlargest(self.keep, (p for p in profiles if p is not None),
+                                  key=lambda profile: profile.duration)
+        with self._lock:
+            return sorted(self._by_id.values(), key=lambda profile: profile.duration, reverse=True)
+
+
+profile_store = ProfileStore()
+
+
+def _token_matches(header):
+    """Vrai si l'en-tête `header` porte PROFILE_TOKEN (comparaison à temps constant, jamais sans jeton)"""
+    return token_matches(request.headers.get(header), current_app.config['PROFILE_TOKEN'])
+
+
+def _should_profile():
+    if _token_matches(PROFILE_HEADER):
+        return True
+    rate = current_app.config['PROFILE_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+
+def _start_profile():
+    if request.endpoint in ('profiles', 'profile_detail', 'profiles_unlock', 'static') or not _should_profile():
+        return
+    sampler = Sampler(threading.get_ident(), current_app.config['PROFILE_INTERVAL_MS'] / 1000)
+    g._profile = (sampler, time.perf_counter())
+    sampler.start()
+
+
+def _finish_profile(exception=None):
+    state = g.pop('_profile', None)
+    if state is None:
+        return
+    sampler, started = state
+    sampler.stop()
+    profile_store.add(Profile(
+        profile_store.next_id(),
+        request.endpoint or 'inconnue',
+        request.method,
+        request.full_path.rstrip('?'),
+        time.perf_counter() - started,
+        sampler.interval,
+        sampler.stacks,
+        sampler.samples
+    ))
+
+
+def _is_profile_viewer():
+    """
+    Vrai sur présentation de PROFILE_TOKEN : en-tête X-Profile-Token (outils), ou session déverrouillée par le
+    formulaire (navigateur). Jamais dans l'URL : le jeton finirait dans les journaux d'accès et l'historique
+    """
+    token = current_app.config['PROFILE_TOKEN']
+    if not token:
+        abort(404)
+    return _token_matches(TOKEN_HEADER) or session_unlocked(SESSION_KEY, token)
+
+
+def _unlock_page(form):
+    return render_template('admin/profiles_unlock.html', form=form), 401
+
+
+def profiles_view():
+    """Liste des profils les plus lents (du processus, ou de tous avec PROFILE_DIR)"""
+    if not _is_profile_viewer():
+        return _unlock_page(ProfileUnlockForm())
+    return render_template('admin/profiles.html', profiles=profile_store.slowest(),
+                           shared=bool(profile_store.directory))
+
+
+def profiles_unlock_view():
+    """Ouvre les pages de profils pour la session sur présentation de PROFILE_TOKEN"""
+    token = current_app.config['PROFILE_TOKEN']
+    if not token:
+        abort(404)
+    form = ProfileUnlockForm()
+    if form.validate_on_submit():
+        if token_matches(form.token.data, token):
+            unlock_session(SESSION_KEY, token)
+            return redirect(url_for('profiles'))
+        flash('Jeton de profilage invalide.', 'error')
+    return _unlock_page(form)
+
+
+def profile_detail_view(profile_key):
+    """Détail d'un profil ; ?format=collapsed renvoie les piles pour flamegraph.pl / speedscope"""
+    if not _is_profile_viewer():
+        return _unlock_page(ProfileUnlockForm())
+    profile = profile_store.get(profile_key)
+    if profile is None:
+        abort(404)
+    if request.args.get('format') == 'collapsed':
+        return Response(profile.collapsed(), mimetype='text/plain', headers={
+            'Content-Disposition': f'attachment; filename="profile-{profile.id}-{profile.endpoint}.collapsed"'
+        })
+    return render_template('admin/profile.html', profile=profile)
+
+
+def init_profiling(app):
+    """Enregistre les hooks de profilage si PROFILE_TOKEN ou PROFILE_SAMPLE_RATE est défini"""
+    if not app.config['PROFILE_TOKEN'] and app.config['PROFILE_SAMPLE_RATE'] <= 0:
+        return
+    profile_store.keep = app.config['PROFILE_KEEP']
+    profile_store.directory = app.config['PROFILE_DIR'] or None
+    app.before_request(_start_profile)
+    app.teardown_request(_finish_profile)
+    app.add_url_rule('/admin/profiles', 'profiles', profiles_view)
+    app.add_url_rule('/admin/profiles/unlock', 'profiles_unlock', profiles_unlock_view, methods=['POST'])
+    app.add_url_rule('/admin/profiles/<profile_key>', 'profile_detail', profile_detail_view)
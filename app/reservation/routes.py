@@ -1,8 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from app import db
 from app.models import Reservation, Train, User
 from app.forms import ReservationForm, ReservationSearchForm
-from app.database.queries import DatabaseQueries
+from app.http_cache import timetable_cached
+from app.database.queries import DatabaseQueries, BookingStatus
+from app.database.serialization import page_to_json
+from app.export import export_format, reservations_section, stream_export
 
 reservation_bp = Blueprint('reservation', __name__)
 
@@ -14,9 +17,56 @@ def list_reservations():
         return redirect(url_for('auth.login'))
     
     db_queries = DatabaseQueries()
-    reservations = db_queries.get_user_reservations(user_id)
+    reservations = db_queries.get_user_reservations(user_id, current_app.config['PAGE_SIZE'],
+                                                    request.args.get('cursor'))
     return render_template('reservation/list.html', reservations=reservations)
 
+@reservation_bp.route('/api/reservations')
+def api_list_reservations():
+    """API endpoint : réservations paginées de l'utilisateur connecté"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Authentification requise'}), 401
+    
+    limit = request.args.get('limit', current_app.config['PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+    db_queries = DatabaseQueries()
+    reservations = db_queries.get_user_reservations(user_id, limit, request.args.get('cursor'))
+    return jsonify(page_to_json(reservations))
+
+@reservation_bp.route('/api/reservations/export')
+def api_export_reservations():
+    """API endpoint : toutes les réservations de l'utilisateur connecté, en flux (NDJSON ou ?format=json)"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Authentification requise'}), 401
+    output_format = export_format()
+    if output_format is None:
+        return jsonify({'error': 'Format invalide, attendu ndjson ou json'}), 400
+    return stream_export([reservations_section(user_id=user_id)], output_format, f"reservations-{user_id}")
+
+@reservation_bp.route('/api/reservations', methods=['POST'])
+def api_book_trains():
+    """API endpoint : réserve une liste de trains ({"train_ids": [...]}) pour l'utilisateur connecté"""
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Authentification requise'}), 401
+    
+    payload = request.get_json(silent=True) or {}
+    train_ids = payload.get('train_ids')
+    if (not isinstance(train_ids, list) or not train_ids
+            or len(train_ids) > current_app.config['MAX_PAGE_SIZE']
+            or not all(isinstance(train_id, int) and not isinstance(train_id, bool) for train_id in train_ids)):
+        return jsonify({'error': 'train_ids doit être une liste non vide d\'identifiants de trains'}), 400
+    
+    db_queries = DatabaseQueries()
+    results = db_queries.create_reservations(user_id, train_ids)
+    booked = sum(1 for status in results.values() if status == BookingStatus.BOOKED)
+    return jsonify({
+        'results': {str(train_id): status for train_id, status in results.items()},
+        'booked': booked
+    }), 201 if booked else 200
+
 @reservation_bp.route('/add', methods=['GET', 'POST'])
 def add_reservation():
     user_id = session.get('user_id')
@@ -32,24 +82,28 @@ def add_reservation():
     search_form.source_station.choices = [('', 'Sélectionner une gare')] + [(station['station_name'], station['station_name']) for station in stations]
     search_form.destination_station.choices = [('', 'Sélectionner une gare')] + [(station['station_name'], station['station_name']) for station in stations]
     
-    # Remplir les listes d'heures et de minutes
-    search_form.departure_hour.choices = [('', 'Heure')] + [(str(i).zfill(2), str(i).zfill(2)) for i in range(24)]
-    search_form.departure_minute.choices = [('', 'Minute')] + [(str(i).zfill(2), str(i).zfill(2)) for i in range(0, 60, 5)]  # Par pas de 5 minutes
+    # Remplir les listes d'heures, de minutes et de nombre de résultats
+    search_form.populate_departure_choices()
     
     trains = []
+    booked_train_ids = frozenset()
     if search_form.validate_on_submit():
-        # Construire l'heure de départ si les deux champs sont remplis
-        departure_time = None
-        if search_form.departure_hour.data and search_form.departure_minute.data:
-            departure_time = f"{search_form.departure_hour.data}:{search_form.departure_minute.data}"
+        departure_from, departure_to, limit = search_form.departure_window()
         
         trains = db_queries.search_trains_by_criteria(
             search_form.source_station.data,
             search_form.destination_station.data,
-            departure_time
+            departure_from,
+            departure_to,
+            limit or current_app.config['PAGE_SIZE'],
+            search_form.cursor.data
         )
+        if trains:
+            # Trains déjà réservés signalés depuis le cache des réservations de l'utilisateur
+            booked_train_ids = db_queries.booked_train_ids(user_id) or frozenset()
     
-    return render_template('reservation/add.html', search_form=search_form, trains=trains)
+    return render_template('reservation/add.html', search_form=search_form, trains=trains,
+                           booked_train_ids=booked_train_ids)
 
 @reservation_bp.route('/book/<int:train_id>', methods=['POST'])
 def book_train(train_id):
@@ -59,12 +113,18 @@ def book_train(train_id):
         return redirect(url_for('auth.login'))
     
     db_queries = DatabaseQueries()
-    success = db_queries.create_reservation(user_id, train_id)
+    # Pas de réponse depuis le cache : une annulation faite depuis un autre appareil n'y est pas visible.
+    # La double soumission est tranchée par la requête elle-même (uq_res_user_train)
+    status = db_queries.create_reservation(user_id, train_id)
     
-    if success:
+    if status == BookingStatus.BOOKED:
         flash('Réservation effectuée avec succès!', 'success')
+    elif status == BookingStatus.ALREADY_BOOKED:
+        flash('Vous avez déjà réservé ce train.', 'info')
+    elif status == BookingStatus.FULL:
+        flash('Ce train est complet.', 'warning')
     else:
-        flash('Vous avez déjà réservé ce train ou une erreur s\'est produite!', 'error')
+        flash('Une erreur s\'est produite lors de la réservation!', 'error')
     
     return redirect(url_for('reservation.list_reservations'))
 
@@ -86,43 +146,23 @@ def cancel_reservation(reservation_id):
     return redirect(url_for('reservation.list_reservations'))
 
 @reservation_bp.route('/api/available-destinations')
+@timetable_cached(public=True)
 def get_available_destinations():
     """API endpoint pour récupérer les gares d'arrivée disponibles pour une gare de départ donnée"""
     source_station = request.args.get('source_station')
     db_queries = DatabaseQueries()
     
-    if not source_station:
-        # Si aucune gare de départ n'est spécifiée, retourner toutes les gares d'arrivée
-        destinations = db_queries.get_unique_stations()
-        # Filtrer pour ne garder que les gares d'arrivée
-        arrival_stations = []
-        for station in destinations:
-            arrival_stations.append({
-                'destination_station_name': station['station_name'],
-                'destination_station_code': station['station_code']
-            })
-        return jsonify(arrival_stations)
-    
+    # Sans gare de départ, toutes les gares sont proposées en arrivée
     destinations = db_queries.get_available_destinations(source_station)
     return jsonify(destinations)
 
 @reservation_bp.route('/api/available-sources')
+@timetable_cached(public=True)
 def get_available_sources():
     """API endpoint pour récupérer les gares de départ disponibles pour une gare d'arrivée donnée"""
     destination_station = request.args.get('destination_station')
     db_queries = DatabaseQueries()
     
-    if not destination_station:
-        # Si aucune gare d'arrivée n'est spécifiée, retourner toutes les gares de départ
-        sources = db_queries.get_unique_stations()
-        # Filtrer pour ne garder que les gares de départ
-        departure_stations = []
-        for station in sources:
-            departure_stations.append({
-                'source_station_name': station['station_name'],
-                'source_station_code': station['station_code']
-            })
-        return jsonify(departure_stations)
-    
+    # Sans gare d'arrivée, toutes les gares sont proposées en départ
     sources = db_queries.get_available_sources(destination_station)
     return jsonify(sources)
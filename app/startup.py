@@ -0,0 +1,105 @@
+"""
+Démarrage des workers en production (gunicorn.conf.py, wsgi.py)
+Avec preload_app, l'application est construite une seule fois dans le processus maître ; les caches
+en lecture seule y sont chauffés avant le fork et partagés par les workers (copie sur écriture).
+Les connexions ne doivent jamais traverser un fork : le maître ferme les siennes après le chauffage
+et chaque worker repart de pools vides
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+from sqlalchemy.orm import configure_mappers
+
+
+def warm_up(app):
+    """Chauffe les caches partagés (modèles, templates, requêtes, catalogue des gares) ; retourne les durées"""
+    from app.database import pool
+    from app.database.queries import DatabaseQueries
+    from app.database.registry import registry
+
+    timings = {}
+    with app.app_context():
+        started = time.perf_counter()
+        configure_mappers()
+        timings['mappers'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+        timings['templates'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        registry.load()
+        timings['queries'] = time.perf_counter() - started
+
+        # Lu sur le primaire ; en cas d'échec, chaque worker le chargera à la première demande
+        started = time.perf_counter()
+        DatabaseQueries()._station_snapshot()
+        timings['stations'] = time.perf_counter() - started
+
+    pool.close_before_fork()
+    return timings
+
+
+def reset_after_fork():
+    """À appeler dans chaque worker juste après le fork (hook post_fork de gunicorn)"""
+    from app.database import pool
+    pool.reset_after_fork()
+
+
+# Mesure exécutée dans un processus neuf : import, create_app, chauffage puis, dans un fils
+# obtenu par fork, remise à zéro des pools et première requête (coût d'un worker gunicorn ajouté)
+_MEASURE_SCRIPT = r'''
+import json, os, sys, time
+started = time.perf_counter()
+from app import create_app
+from app.startup import reset_after_fork, warm_up
+timings = {'import': time.perf_counter() - started}
+started = time.perf_counter()
+app = create_app()
+timings['create_app'] = time.perf_counter() - started
+started = time.perf_counter()
+if sys.argv[2] == '1':
+    timings.update({f"warm_up_{name}": value for name, value in warm_up(app).items()})
+timings['warm_up'] = time.perf_counter() - started
+
+def first_request():
+    started = time.perf_counter()
+    reset_after_fork()
+    status = app.test_client().get(sys.argv[1]).status_code
+    return {'worker_boot': time.perf_counter() - started, 'status': status}
+
+if hasattr(os, 'fork'):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        os.write(write_fd, json.dumps(first_request()).encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        timings.update(json.loads(f.read()))
+    os.waitpid(pid, 0)
+else:
+    timings.update(first_request())
+print(json.dumps(timings))
+'''
+
+
+def measure_startup(path='/', runs=5, warm=True):
+    """Durées de démarrage (secondes) de `runs` processus neufs ; lève RuntimeError si l'un échoue"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, '-c', _MEASURE_SCRIPT, path, '1' if warm else '0'],
+            cwd=root, capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.strip() or f"code de sortie {completed.returncode}")
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return results
@@ -0,0 +1,40 @@
+"""
+Jetons d'accès des routes d'administration (métriques, exports, administration groupée, profils)
+Toutes les comparaisons sont à temps constant : la durée de la vérification ne renseigne pas sur le jeton
+"""
+
+import hashlib
+import hmac
+
+from flask import request, session
+
+
+def token_matches(presented, token):
+    """Vrai si `presented` est le jeton `token` (jamais sans jeton configuré)"""
+    if not token or presented is None:
+        return False
+    return hmac.compare_digest(presented.encode('utf-8'), token.encode('utf-8'))
+
+
+def bearer_matches(token):
+    """Vrai si la requête porte "Authorization: Bearer <token>" (jamais sans jeton configuré)"""
+    if not token:
+        return False
+    return token_matches(request.headers.get('Authorization', ''), f"Bearer {token}")
+
+
+def token_fingerprint(token):
+    # Empreinte retenue dans la session : changer le jeton révoque les sessions déverrouillées
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def unlock_session(key, token):
+    """Mémorise dans la session (clé `key`) qu'elle a présenté `token`"""
+    session[key] = token_fingerprint(token)
+
+
+def session_unlocked(key, token):
+    """Vrai si la session a été déverrouillée avec le jeton `token` courant"""
+    if not token:
+        return False
+    return hmac.compare_digest(session.get(key, ''), token_fingerprint(token))
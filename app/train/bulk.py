@@ -0,0 +1,133 @@
+"""
+Lecture et validation des fichiers de trains (CSV ou JSON) pour l'administration groupée
+Chaque ligne est validée par les règles de TrainForm, comme un ajout depuis le formulaire, puis le
+fichier entier est inséré en un seul COPY (app/database/bulk.py) : une ligne refusée n'insère rien
+"""
+
+import csv
+import io
+import json
+import time
+
+from werkzeug.datastructures import MultiDict
+
+from app.config import Config
+from app.database.bulk import TRAIN_COLUMNS, BulkError, insert_trains
+from app.forms import TrainForm
+
+# Nombre maximum de lignes refusées détaillées dans un rapport
+MAX_REPORTED_ERRORS = 100
+
+
+def _read_csv(text):
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, None)
+    if not header:
+        raise BulkError("Le fichier est vide")
+    names = [name.strip().lower().replace(' ', '_') for name in header]
+    if 'train_number' not in names:
+        raise BulkError("Colonne train_number manquante dans l'en-tête")
+
+    rows = []
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        # Colonnes inconnues ignorées ; line_num suit les champs sur plusieurs lignes
+        rows.append((reader.line_num, {
+            name: value for name, value in zip(names, values) if name in TRAIN_COLUMNS
+        }))
+    return rows
+
+
+def _read_json(text):
+    try:
+        items = json.loads(text)
+    except ValueError as e:
+        raise BulkError(f"JSON invalide : {e}")
+    if not isinstance(items, list):
+        raise BulkError("Le fichier JSON doit contenir une liste de trains")
+
+    rows = []
+    for position, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            rows.append((position, None))
+            continue
+        rows.append((position, {
+            name: '' if value is None else str(value)
+            for name, value in item.items() if name in TRAIN_COLUMNS
+        }))
+    return rows
+
+
+def read_upload(content, filename):
+    """Lignes (numéro de ligne ou d'élément, valeurs en chaînes) d'un fichier CSV ou JSON ; BulkError s'il est illisible"""
+    try:
+        text = content.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise BulkError("Le fichier doit être encodé en UTF-8")
+    if filename.lower().endswith('.json'):
+        return _read_json(text)
+    return _read_csv(text)
+
+
+def validate_train(values, columns=TRAIN_COLUMNS):
+    """Valide `values` (chaînes) avec TrainForm ; retourne (valeurs converties de `columns`, {colonne: erreurs})"""
+    # Cellule vide = champ absent du formulaire : la valeur par défaut s'applique (capacity = 500)
+    form = TrainForm(formdata=MultiDict({name: value for name, value in values.items() if value.strip()}),
+                     meta={'csrf': False})
+    form.validate()
+    errors = {name: form.errors[name] for name in columns if name in form.errors}
+    # Champ texte vide : NULL en base (comme une gare absente du fichier d'horaires)
+    train = {name: form[name].data if form[name].data != '' else None for name in columns}
+    return train, errors
+
+
+def validate_values(values):
+    """Nouvelles valeurs d'une modification groupée, validées par TrainForm pour les seules colonnes fournies"""
+    return validate_train(values, [name for name in TRAIN_COLUMNS if name in values])
+
+
+def validate_rows(rows):
+    """Trains valides et rapport [{'line', 'train_number', 'errors'}] des lignes refusées"""
+    trains = []
+    errors = []
+    for line, values in rows:
+        if values is None:
+            errors.append({'line': line, 'train_number': None, 'errors': ["objet JSON attendu"]})
+            continue
+        train, field_errors = validate_train(values)
+        if field_errors:
+            errors.append({
+                'line': line,
+                'train_number': values.get('train_number') or None,
+                'errors': [f"{name} : {message}" for name, messages in field_errors.items() for message in messages],
+            })
+        else:
+            trains.append(train)
+    return trains, errors
+
+
+def import_trains(content, filename, dry_run=False):
+    """
+    Valide puis insère les trains d'un fichier en une transaction ; retourne le rapport d'import.
+    Lève BulkError si le fichier est illisible, psycopg2.Error si la base refuse l'insertion
+    """
+    started = time.monotonic()
+    rows = read_upload(content, filename)
+    if not rows:
+        raise BulkError("Aucun train dans le fichier")
+    if len(rows) > Config.TRAIN_UPLOAD_MAX_ROWS:
+        raise BulkError(f"{len(rows)} trains dans le fichier, au plus {Config.TRAIN_UPLOAD_MAX_ROWS} par import")
+
+    trains, errors = validate_rows(rows)
+    created = 0
+    if not errors:
+        created = insert_trains(trains, dry_run)
+    return {
+        'rows_read': len(rows),
+        'rows_rejected': len(errors),
+        'trains_created': created,
+        'dry_run': dry_run,
+        'errors': errors[:MAX_REPORTED_ERRORS],
+        'elapsed_seconds': time.monotonic() - started,
+    }
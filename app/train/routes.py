@@ -1,12 +1,24 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response, stream_with_context, abort
+import json
+import psycopg2
+from datetime import time
+from sqlalchemy.exc import IntegrityError
 from app import db
 from app.models import Train
-from app.forms import TrainForm, TrainSearchForm
+from app.forms import TrainForm, TrainSearchForm, TrainUploadForm, TrainBatchForm, BulkUnlockForm
+from app.http_cache import timetable_cached
 from app.database.queries import DatabaseQueries
+from app.database.cache import timetable_changed
+from app.database.bulk import BulkError, delete_trains, update_trains
+from app.database.serialization import page_to_json, row_to_json
+from app.export import export_format, require_export_token, reservations_section, stream_export
+from app.tokens import bearer_matches, session_unlocked, token_matches, unlock_session
+from app.train.bulk import import_trains, validate_values
 
 train_bp = Blueprint('train', __name__)
 
 @train_bp.route('/', methods=['GET', 'POST'])
+@timetable_cached()
 def list_trains():
     db_queries = DatabaseQueries()
     search_form = TrainSearchForm()
@@ -16,27 +28,27 @@ def list_trains():
     search_form.source_station.choices = [('', 'Toutes les gares')] + [(station['station_name'], station['station_name']) for station in stations]
     search_form.destination_station.choices = [('', 'Toutes les gares')] + [(station['station_name'], station['station_name']) for station in stations]
     
-    # Remplir les listes d'heures et de minutes
-    search_form.departure_hour.choices = [('', 'Heure')] + [(str(i).zfill(2), str(i).zfill(2)) for i in range(24)]
-    search_form.departure_minute.choices = [('', 'Minute')] + [(str(i).zfill(2), str(i).zfill(2)) for i in range(0, 60, 5)]  # Par pas de 5 minutes
+    # Remplir les listes d'heures, de minutes et de nombre de résultats
+    search_form.populate_departure_choices()
     
     trains = []
-    if search_form.validate_on_submit():
-        # Construire l'heure de départ si les deux champs sont remplis
-        departure_time = None
-        if search_form.departure_hour.data and search_form.departure_minute.data:
-            departure_time = f"{search_form.departure_hour.data}:{search_form.departure_minute.data}"
+    searched = search_form.validate_on_submit()
+    if searched:
+        departure_from, departure_to, limit = search_form.departure_window()
         
         trains = db_queries.search_trains_by_criteria(
             search_form.source_station.data or '',
             search_form.destination_station.data or '',
-            departure_time
+            departure_from,
+            departure_to,
+            limit or current_app.config['PAGE_SIZE'],
+            search_form.cursor.data
         )
     else:
-        # Afficher tous les trains par défaut
-        trains = db_queries.get_all_trains()
+        # Afficher tous les trains par défaut, page par page
+        trains = db_queries.get_all_trains(current_app.config['PAGE_SIZE'], request.args.get('cursor'))
     
-    return render_template('train/list.html', trains=trains, search_form=search_form)
+    return render_template('train/list.html', trains=trains, search_form=search_form, searched=searched)
 
 @train_bp.route('/add', methods=['GET', 'POST'])
 def add_train():
@@ -50,15 +62,18 @@ def add_train():
             destination_station_name=form.destination_station_name.data,
             departure_time=form.departure_time.data,
             arrival_time=form.arrival_time.data,
-            distance=form.distance.data
+            distance=form.distance.data,
+            capacity=form.capacity.data
         )
         db.session.add(train)
         db.session.commit()
+        timetable_changed()
         flash('Train ajouté avec succès!', 'success')
         return redirect(url_for('train.list_trains'))
     return render_template('train/add.html', form=form)
 
 @train_bp.route('/<int:train_id>')
+@timetable_cached()
 def view_train(train_id):
     db_queries = DatabaseQueries()
     train = db_queries.get_train_by_id(train_id)
@@ -80,7 +95,15 @@ def edit_train(train_id):
         train.departure_time = form.departure_time.data
         train.arrival_time = form.arrival_time.data
         train.distance = form.distance.data
-        db.session.commit()
+        train.capacity = form.capacity.data
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # ck_train_seats : la capacité ne peut descendre sous le nombre de places réservées
+            db.session.rollback()
+            flash('Capacité inférieure au nombre de places déjà réservées.', 'error')
+            return render_template('train/edit.html', form=form, train=train)
+        timetable_changed()
         flash('Train modifié avec succès!', 'success')
         return redirect(url_for('train.view_train', train_id=train_id))
     return render_template('train/edit.html', form=form, train=train)
@@ -90,47 +113,246 @@ def delete_train(train_id):
     train = Train.query.get_or_404(train_id)
     db.session.delete(train)
     db.session.commit()
+    timetable_changed()
     flash('Train supprimé avec succès!', 'success')
     return redirect(url_for('train.list_trains'))
 
+def _bulk_database_error(e):
+    """Message d'une opération groupée annulée par la base (contrainte, ligne COPY en cause)"""
+    print(f"Erreur lors de l'opération groupée sur les trains: {e}")
+    message = e.diag.message_primary or 'Base de données indisponible'
+    if e.diag.context:
+        message = f"{message} ({e.diag.context.splitlines()[0]})"
+    flash(f"Opération annulée, aucun train modifié : {message}", 'error')
+
+def _is_bulk_operator():
+    """Vrai pour un opérateur : jeton Bearer BULK_ADMIN_TOKEN, ou session déverrouillée avec ce jeton"""
+    token = current_app.config['BULK_ADMIN_TOKEN']
+    if not token:
+        abort(404)
+    return bearer_matches(token) or session_unlocked('_bulk_operator', token)
+
+def require_bulk_operator():
+    """Administration groupée : 404 sans BULK_ADMIN_TOKEN configuré, 401 sans le bon jeton"""
+    if not _is_bulk_operator():
+        abort(401)
+
+@train_bp.route('/bulk')
+def bulk_trains():
+    if not _is_bulk_operator():
+        return render_template('train/bulk_unlock.html', form=BulkUnlockForm()), 401
+    return render_template('train/bulk.html', upload_form=TrainUploadForm(), batch_form=TrainBatchForm())
+
+@train_bp.route('/bulk/unlock', methods=['POST'])
+def bulk_unlock():
+    """Ouvre l'administration groupée pour la session sur présentation du jeton d'opérateur"""
+    token = current_app.config['BULK_ADMIN_TOKEN']
+    if not token:
+        abort(404)
+    form = BulkUnlockForm()
+    if form.validate_on_submit():
+        if token_matches(form.token.data, token):
+            unlock_session('_bulk_operator', token)
+            return redirect(url_for('train.bulk_trains'))
+        flash('Jeton d\'opérateur invalide.', 'error')
+    return render_template('train/bulk_unlock.html', form=form), 401
+
+@train_bp.route('/bulk/import', methods=['POST'])
+def bulk_import_trains():
+    """Import d'un fichier CSV / JSON : toutes les lignes validées puis insérées en un seul COPY"""
+    require_bulk_operator()
+    upload_form = TrainUploadForm()
+    report = None
+    if upload_form.validate_on_submit():
+        upload = upload_form.file.data
+        try:
+            report = import_trains(upload.read(), upload.filename, upload_form.dry_run.data)
+        except BulkError as e:
+            flash(str(e), 'error')
+        except psycopg2.Error as e:
+            _bulk_database_error(e)
+        else:
+            if report['rows_rejected']:
+                flash(f"{report['rows_rejected']} ligne(s) refusée(s) sur {report['rows_read']} : aucun train importé.", 'error')
+            elif report['dry_run']:
+                flash(f"{report['rows_read']} train(s) valides, rien n'a été enregistré.", 'info')
+            else:
+                flash(f"{report['trains_created']} train(s) importé(s).", 'success')
+    return render_template('train/bulk.html', upload_form=upload_form, batch_form=TrainBatchForm(formdata=None),
+                           import_report=report)
+
+@train_bp.route('/bulk/edit', methods=['POST'])
+def bulk_edit_trains():
+    """Modification ou suppression de tous les trains d'une sélection, en une transaction"""
+    require_bulk_operator()
+    batch_form = TrainBatchForm()
+    report = None
+    if batch_form.validate_on_submit():
+        dry_run = batch_form.dry_run.data
+        try:
+            if batch_form.delete.data:
+                report = delete_trains(batch_form.filters(), dry_run)
+                flash(f"{report['deleted']} train(s) {'à supprimer' if dry_run else 'supprimé(s)'} "
+                      f"et {report['reservations_deleted']} réservation(s) avec eux.",
+                      'info' if dry_run else 'success')
+            else:
+                values, errors = validate_values(batch_form.values())
+                for name, messages in errors.items():
+                    batch_form[f"set_{name}"].errors = messages
+                if not values:
+                    flash('Aucune nouvelle valeur saisie.', 'error')
+                elif not errors:
+                    report = update_trains(batch_form.filters(), values, dry_run)
+                    if report['errors']:
+                        flash(f"{len(report['errors'])} train(s) refusent la modification : aucun train modifié.", 'error')
+                    else:
+                        flash(f"{report['updated']} train(s) {'à modifier' if dry_run else 'modifié(s)'} "
+                              f"sur {report['matched']} sélectionné(s).", 'info' if dry_run else 'success')
+        except BulkError as e:
+            flash(str(e), 'error')
+        except psycopg2.Error as e:
+            _bulk_database_error(e)
+    return render_template('train/bulk.html', upload_form=TrainUploadForm(formdata=None), batch_form=batch_form,
+                           batch_report=report)
+
 @train_bp.route('/api/available-destinations')
+@timetable_cached(public=True)
 def get_available_destinations():
     """API endpoint pour récupérer les gares d'arrivée disponibles pour une gare de départ donnée"""
     source_station = request.args.get('source_station')
     db_queries = DatabaseQueries()
     
-    if not source_station:
-        # Si aucune gare de départ n'est spécifiée, retourner toutes les gares d'arrivée
-        destinations = db_queries.get_unique_stations()
-        # Filtrer pour ne garder que les gares d'arrivée
-        arrival_stations = []
-        for station in destinations:
-            arrival_stations.append({
-                'destination_station_name': station['station_name'],
-                'destination_station_code': station['station_code']
-            })
-        return jsonify(arrival_stations)
-    
+    # Sans gare de départ, toutes les gares sont proposées en arrivée
     destinations = db_queries.get_available_destinations(source_station)
     return jsonify(destinations)
 
 @train_bp.route('/api/available-sources')
+@timetable_cached(public=True)
 def get_available_sources():
     """API endpoint pour récupérer les gares de départ disponibles pour une gare d'arrivée donnée"""
     destination_station = request.args.get('destination_station')
     db_queries = DatabaseQueries()
     
-    if not destination_station:
-        # Si aucune gare d'arrivée n'est spécifiée, retourner toutes les gares de départ
-        sources = db_queries.get_unique_stations()
-        # Filtrer pour ne garder que les gares de départ
-        departure_stations = []
-        for station in sources:
-            departure_stations.append({
-                'source_station_name': station['station_name'],
-                'source_station_code': station['station_code']
-            })
-        return jsonify(departure_stations)
-    
+    # Sans gare d'arrivée, toutes les gares sont proposées en départ
     sources = db_queries.get_available_sources(destination_station)
     return jsonify(sources)
+
+@train_bp.route('/api/<int:train_id>/seats')
+def api_train_seats(train_id):
+    """API endpoint des places restantes d'un train, jamais mis en cache (la page du train l'est)"""
+    db_queries = DatabaseQueries()
+    train = db_queries.get_train_by_id(train_id)
+    if not train:
+        return jsonify({'error': 'Train non trouvé'}), 404
+    response = jsonify({'id_train': train['id_train'], 'capacity': train['capacity'], 'seats_left': train['seats_left']})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@train_bp.route('/api/stations/suggest')
+def suggest_stations():
+    """API endpoint d'autocomplétion : les gares les plus pertinentes pour la saisie `q`"""
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', current_app.config['STATION_SUGGEST_LIMIT'], type=int)
+    limit = max(1, min(limit, current_app.config['STATION_SUGGEST_MAX_LIMIT']))
+    
+    db_queries = DatabaseQueries()
+    return jsonify(db_queries.suggest_stations(query, limit))
+
+def _page_size_arg():
+    """Taille de page demandée via `?limit=`, bornée par MAX_PAGE_SIZE"""
+    limit = request.args.get('limit', current_app.config['PAGE_SIZE'], type=int)
+    return max(1, min(limit, current_app.config['MAX_PAGE_SIZE']))
+
+def _time_arg(name):
+    """Heure HH:MM passée en paramètre de requête, None si absente ; ValueError si invalide"""
+    value = request.args.get(name)
+    return time.fromisoformat(value) if value else None
+
+@train_bp.route('/api/trains')
+def api_list_trains():
+    """API endpoint : liste paginée des trains (`cursor` = jeton `next_cursor` de la page précédente)"""
+    db_queries = DatabaseQueries()
+    trains = db_queries.get_all_trains(_page_size_arg(), request.args.get('cursor'))
+    return jsonify(page_to_json(trains))
+
+@train_bp.route('/api/trains/search')
+def api_search_trains():
+    """API endpoint : recherche paginée par gares et plage horaire (departure_from / departure_to en HH:MM)"""
+    try:
+        departure_from = _time_arg('departure_from')
+        departure_to = _time_arg('departure_to')
+    except ValueError:
+        return jsonify({'error': 'Heure invalide, format attendu HH:MM'}), 400
+    
+    db_queries = DatabaseQueries()
+    trains = db_queries.search_trains_by_criteria(
+        request.args.get('source_station', ''),
+        request.args.get('destination_station', ''),
+        departure_from,
+        departure_to,
+        _page_size_arg(),
+        request.args.get('cursor')
+    )
+    return jsonify(page_to_json(trains))
+
+@train_bp.route('/api/<int:train_id>/reservations/export')
+def api_export_train_reservations(train_id):
+    """API endpoint (EXPORT_TOKEN) : réservations d'un train avec leurs utilisateurs, en flux"""
+    require_export_token()
+    output_format = export_format()
+    if output_format is None:
+        return jsonify({'error': 'Format invalide, attendu ndjson ou json'}), 400
+    return stream_export([reservations_section(train_id=train_id)], output_format, f"train-{train_id}-reservations")
+
+@train_bp.route('/api/trains/stream')
+def api_stream_trains():
+    """API endpoint : tous les résultats d'une recherche en flux (NDJSON par défaut, ou ?format=json)
+
+    Les lignes sont lues par lots sur un curseur côté serveur et envoyées au fil de l'eau :
+    la mémoire du worker reste constante quelle que soit la taille du résultat.
+    """
+    output_format = request.args.get('format', 'ndjson')
+    if output_format not in ('ndjson', 'json'):
+        return jsonify({'error': 'Format invalide, attendu ndjson ou json'}), 400
+    try:
+        departure_from = _time_arg('departure_from')
+        departure_to = _time_arg('departure_to')
+    except ValueError:
+        return jsonify({'error': 'Heure invalide, format attendu HH:MM'}), 400
+    
+    db_queries = DatabaseQueries()
+    rows = db_queries.iter_search_trains(
+        request.args.get('source_station', ''),
+        request.args.get('destination_station', ''),
+        departure_from,
+        departure_to,
+        current_app.config['STREAM_BATCH_SIZE']
+    )
+    
+    # Lecture du premier lot avant d'envoyer les en-têtes : une erreur de base donne encore un 503
+    try:
+        first = next(rows, None)
+    except psycopg2.Error as e:
+        print(f"Erreur lors de la recherche de trains en flux: {e}")
+        return jsonify({'error': 'Base de données indisponible'}), 503
+    
+    def generate():
+        try:
+            if output_format == 'json':
+                yield '['
+            if first is not None:
+                yield json.dumps(row_to_json(first), ensure_ascii=False)
+                for row in rows:
+                    yield (',' if output_format == 'json' else '\n') + json.dumps(row_to_json(row), ensure_ascii=False)
+                if output_format == 'ndjson':
+                    yield '\n'
+            if output_format == 'json':
+                yield ']'
+        except psycopg2.Error as e:
+            # Les en-têtes sont partis : le flux est interrompu (document JSON tronqué)
+            print(f"Erreur lors de la recherche de trains en flux: {e}")
+        finally:
+            rows.close()
+    
+    mimetype = 'application/json' if output_format == 'json' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
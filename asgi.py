@@ -0,0 +1,9 @@
+"""
+Point d'entrée de l'API asynchrone en lecture seule : uvicorn asgi:app --port 5002 --workers 2
+Sert les mêmes routes JSON que Flask (listes de gares, suggestions, recherche de trains) ; le proxy
+(nginx) y envoie ces chemins et le reste à gunicorn
+"""
+
+from app.async_api import AsyncReadAPI
+
+app = AsyncReadAPI()
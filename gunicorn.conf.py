@@ -0,0 +1,35 @@
+"""
+Configuration Gunicorn de production (gunicorn --config gunicorn.conf.py)
+Pré-fork avec preload_app : wsgi.py construit l'application et chauffe les caches dans le maître,
+chaque worker créé ensuite (y compris par l'autoscaler ou max_requests) démarre sans accès à la base
+"""
+
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+wsgi_app = 'wsgi:app'
+preload_app = True
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:5001')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', '2'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+keepalive = 2
+
+# Recyclage des workers (fuites mémoire) ; le coût d'un nouveau worker est celui d'un fork
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', '-')
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """Les pools de connexions du maître ne sont pas partagés : chaque worker repart de pools vides"""
+    from app.startup import reset_after_fork
+    reset_after_fork()
@@ -0,0 +1,53 @@
+"""
+Configuration des tests
+Les tests unitaires n'ont besoin d'aucune base. Les tests marqués `requires_postgres` s'exécutent sur la
+base désignée par TEST_DATABASE_URL, dont le schéma public est VIDÉ puis recréé par les migrations :
+ne jamais y mettre l'URL d'une base contenant des données
+"""
+
+import os
+
+import pytest
+
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+if TEST_DATABASE_URL:
+    # Lu par app.config à l'import : à définir avant toute importation de l'application
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+
+requires_postgres = pytest.mark.skipif(
+    not TEST_DATABASE_URL, reason="TEST_DATABASE_URL non défini (base PostgreSQL de test)"
+)
+
+
+def reset_schema(app, migrate=True):
+    """Vide le schéma public de la base de test, puis applique toutes les migrations si `migrate`"""
+    from app.database.migrations import upgrade
+    from app.database.pool import get_pool
+
+    with app.app_context():
+        pool = get_pool()
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("DROP SCHEMA public CASCADE")
+                cur.execute("CREATE SCHEMA public")
+            conn.commit()
+        finally:
+            pool.putconn(conn)
+        # Requêtes préparées des connexions du pool : elles visaient les tables supprimées
+        pool.closeall()
+        if migrate:
+            upgrade()
+
+
+@pytest.fixture(scope='session')
+def pg_app():
+    """Application reliée à la base de test, schéma recréé par flask db upgrade"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL non défini (base PostgreSQL de test)")
+    from app import create_app
+
+    app = create_app()
+    app.config['TESTING'] = True
+    reset_schema(app)
+    return app
@@ -0,0 +1,46 @@
+"""Réservations concurrentes sur un même train : ni survente ni réservation en double (PostgreSQL)"""
+
+from app.database.stress import run_booking_stress
+
+from conftest import requires_postgres
+
+pytestmark = requires_postgres
+
+
+def _booking_invariants(app):
+    from app.database.pool import get_pool
+
+    with app.app_context():
+        pool = get_pool()
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT COUNT(*) FROM train WHERE seats_booked > capacity OR seats_booked < 0")
+                oversold = cur.fetchone()[0]
+                cur.execute("SELECT COUNT(*) FROM (SELECT 1 FROM reservation GROUP BY id_user, id_train "
+                            "HAVING COUNT(*) > 1) d")
+                duplicates = cur.fetchone()[0]
+            conn.rollback()
+        finally:
+            pool.putconn(conn)
+    return oversold, duplicates
+
+
+def test_concurrent_bookings_never_oversell(pg_app):
+    with pg_app.app_context():
+        result = run_booking_stress(users=60, capacity=25, workers=8, clicks=3)
+
+    assert result['anomalies'] == []
+    assert result['reservations'] == 25
+    assert result['seats_booked'] == result['reservations'] <= result['capacity']
+    assert _booking_invariants(pg_app) == (0, 0)
+
+
+def test_more_seats_than_users_books_each_user_once(pg_app):
+    with pg_app.app_context():
+        result = run_booking_stress(users=20, capacity=50, workers=8, clicks=4)
+
+    assert result['anomalies'] == []
+    # Un utilisateur = une réservation, malgré 4 tentatives simultanées chacun
+    assert result['reservations'] == 20
+    assert result['seats_booked'] == 20
@@ -0,0 +1,71 @@
+"""Instrumentation des lectures en flux : durée et lignes enregistrées à la fin de l'itération"""
+
+from flask import Flask, g
+
+from app import metrics as metrics_module
+from app.metrics import RequestStats, instrumented, streamed_query
+
+app = Flask(__name__)
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.executed = None
+
+    def execute(self, query, params=None):
+        self.executed = (query, params)
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+def _recorded(monkeypatch):
+    calls = []
+    monkeypatch.setattr(metrics_module, 'record_query',
+                        lambda name, seconds, rows, params=None: calls.append((name, rows, params)))
+    return calls
+
+
+def _stream(cur, batch_size=2):
+    with streamed_query('search_trains', ('A', 'B')) as stream:
+        stream.execute(cur, 'SELECT 1', ('A', 'B'))
+        while True:
+            rows = stream.fetch(cur, batch_size)
+            if not rows:
+                break
+            yield from rows
+
+
+def test_streamed_query_recorded_once_when_exhausted(monkeypatch):
+    calls = _recorded(monkeypatch)
+    rows = _stream(FakeCursor(range(5)))
+
+    assert calls == []
+    assert list(rows) == [0, 1, 2, 3, 4]
+    assert calls == [('search_trains', 5, ('A', 'B'))]
+
+
+def test_streamed_query_recorded_when_closed_early(monkeypatch):
+    calls = _recorded(monkeypatch)
+    rows = _stream(FakeCursor(range(5)))
+
+    assert next(rows) == 0
+    rows.close()
+    assert calls == [('search_trains', 2, ('A', 'B'))]
+
+
+def test_instrumented_generator_timed_until_exhausted():
+    class Queries:
+        @instrumented
+        def iter_numbers(self):
+            yield 1
+            yield 2
+
+    with app.test_request_context():
+        g._request_stats = RequestStats()
+        rows = Queries().iter_numbers()
+        assert 'iter_numbers' not in g._request_stats.by_method
+        assert list(rows) == [1, 2]
+        assert g._request_stats.by_method['iter_numbers'][0] == 1
@@ -0,0 +1,50 @@
+"""Curseurs opaques de la pagination par clé"""
+
+from datetime import time
+
+import pytest
+
+from app.database.pagination import Page, decode_cursor, encode_cursor, make_page
+
+
+@pytest.mark.parametrize('kind, values', [
+    ('search', (time(8, 30), 42)),
+    ('search', (None, 7)),
+    ('trains', (12,)),
+    ('reservations', (99,)),
+])
+def test_cursor_round_trip(kind, values):
+    assert decode_cursor(kind, encode_cursor(kind, values)) == values
+
+
+def test_cursor_is_url_safe():
+    token = encode_cursor('search', (time(23, 59), 123456))
+    assert all(char.isalnum() or char in '-_' for char in token)
+
+
+@pytest.mark.parametrize('kind, values', [
+    ('search', (5,)),
+    ('search', ('x', 1)),
+    ('search', (time(8, 0), '1')),
+    ('trains', (True,)),
+    ('trains', (1, 2)),
+    ('reservations', (None,)),
+    ('unknown', (1,)),
+])
+def test_cursor_with_wrong_key_is_rejected(kind, values):
+    assert decode_cursor(kind, encode_cursor(kind, values)) is None
+
+
+@pytest.mark.parametrize('token', [None, '', '!!!', 'e30', encode_cursor('trains', (1,))])
+def test_invalid_or_foreign_cursor_is_rejected(token):
+    assert decode_cursor('search', token) is None
+
+
+def test_make_page_sets_next_cursor_only_when_more_rows():
+    rows = [{'id': value} for value in range(4)]
+    page = make_page(rows, 3, 'trains', lambda row: (row['id'],))
+    assert list(page) == rows[:3]
+    assert decode_cursor('trains', page.next_cursor) == (2,)
+
+    last = make_page(rows[:3], 3, 'trains', lambda row: (row['id'],))
+    assert isinstance(last, Page) and last.next_cursor is None
@@ -0,0 +1,40 @@
+"""Conservation des profils : en mémoire par processus, ou partagée par PROFILE_DIR"""
+
+from collections import Counter
+
+from app.profiling import Profile, ProfileStore
+
+
+def _profile(store, duration, endpoint='train.list_trains'):
+    return Profile(store.next_id(), endpoint, 'GET', '/train/', duration, 0.005,
+                   Counter({'app;view;query': 3, 'app;view;render template': 1}), 4)
+
+
+def test_memory_store_keeps_slowest():
+    store = ProfileStore(keep=2)
+    for duration in (0.1, 0.3, 0.2):
+        store.add(_profile(store, duration))
+
+    assert [profile.duration for profile in store.slowest()] == [0.3, 0.2]
+    assert store.get('2').duration == 0.3
+    assert store.get('1') is None
+    assert store.get('abc') is None
+
+
+def test_directory_store_is_read_back_by_another_process(tmp_path):
+    writer = ProfileStore(keep=10, directory=str(tmp_path))
+    writer.add(_profile(writer, 0.1))
+    writer.add(_profile(writer, 0.4, endpoint='reservation.add_reservation'))
+
+    # Autre worker : rien en mémoire, tout est lu dans le dossier
+    reader = ProfileStore(keep=10, directory=str(tmp_path))
+    listed = reader.slowest()
+    assert [(profile.endpoint, profile.duration) for profile in listed] == [
+        ('reservation.add_reservation', 0.4), ('train.list_trains', 0.1)
+    ]
+
+    detail = reader.get(listed[0].key)
+    assert detail.stacks == Counter({'app;view;query': 3, 'app;view;render template': 1})
+    assert detail.collapsed() == 'app;view;query 3\napp;view;render template 1\n'
+    assert reader.get('../' + listed[0].key) is None
+    assert reader.get('absent') is None
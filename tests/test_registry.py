@@ -0,0 +1,84 @@
+"""Préparation côté serveur des requêtes nommées : repli sur l'exécution simple en cas d'échec"""
+
+import psycopg2
+from psycopg2 import errorcodes
+
+from app.database import registry as registry_module
+from app.database.registry import QueryRegistry
+
+
+class PrepareError(psycopg2.Error):
+    pgcode = errorcodes.QUERY_CANCELED
+
+
+class SyntaxPrepareError(psycopg2.Error):
+    pgcode = errorcodes.SYNTAX_ERROR
+
+
+class FakeConnection:
+    def __init__(self, prepare_error=None):
+        self.autocommit = False
+        self.prepared_statements = {}
+        self.statement_counts = {}
+        self.prepare_failed = {}
+        self.prepare_error = prepare_error
+        self.executed = []
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        if sql.startswith('PREPARE') and self.connection.prepare_error:
+            raise self.connection.prepare_error()
+        self.connection.executed.append(sql)
+
+
+def _registry(tmp_path):
+    path = tmp_path / 'queries.sql'
+    path.write_text("-- name: get_train\nSELECT * FROM train WHERE id_train = %s;\n", encoding='utf-8')
+    return QueryRegistry(path=str(path), prepare_threshold=1)
+
+
+def _run(registry, conn, times=1):
+    for _ in range(times):
+        registry.execute(FakeCursor(conn), 'get_train', (1,))
+
+
+def test_prepared_after_threshold(tmp_path):
+    registry = _registry(tmp_path)
+    conn = FakeConnection()
+    _run(registry, conn, 2)
+    assert conn.executed[-1] == 'EXECUTE q_get_train (%s)'
+
+
+def test_transient_failure_only_affects_its_connection(tmp_path):
+    registry = _registry(tmp_path)
+    failing = FakeConnection(PrepareError)
+    _run(registry, failing, 3)
+    assert failing.executed[-1] == registry.sql('get_train')
+    # Un seul PREPARE tenté sur cette connexion, puis exécution simple
+    assert failing.executed.count('SAVEPOINT registry_prepare') == 1
+
+    healthy = FakeConnection()
+    _run(registry, healthy)
+    assert registry.get('get_train').preparable
+    assert healthy.executed[-1] == 'EXECUTE q_get_train (%s)'
+
+
+def test_repeated_failures_disable_preparation(tmp_path):
+    registry = _registry(tmp_path)
+    for _ in range(registry_module.PREPARE_FAILURE_LIMIT):
+        _run(registry, FakeConnection(PrepareError))
+    assert not registry.get('get_train').preparable
+
+
+def test_deterministic_failure_disables_preparation(tmp_path):
+    registry = _registry(tmp_path)
+    _run(registry, FakeConnection(SyntaxPrepareError))
+    assert not registry.get('get_train').preparable
+
+    conn = FakeConnection()
+    _run(registry, conn)
+    assert conn.executed == [registry.sql('get_train')]
@@ -0,0 +1,89 @@
+"""Découpage des scripts de migration et des requêtes nommées de SQL/queries.sql"""
+
+from app.database.migrations import changed_migrations, load_migrations, split_statements
+from app.database.registry import Statement, parse_queries, registry
+
+
+def test_split_statements_on_semicolons():
+    assert split_statements("SELECT 1; SELECT 2;\n") == ["SELECT 1", "SELECT 2"]
+
+
+def test_split_statements_keeps_last_statement_without_semicolon():
+    assert split_statements("SELECT 1;\nSELECT 2") == ["SELECT 1", "SELECT 2"]
+
+
+def test_split_statements_ignores_semicolons_in_strings_and_comments():
+    sql = "-- commentaire ; ignoré\nINSERT INTO t VALUES ('a;b', 'l''apostrophe;');\nSELECT 2;"
+    assert split_statements(sql) == ["INSERT INTO t VALUES ('a;b', 'l''apostrophe;')", "SELECT 2"]
+
+
+def test_split_statements_keeps_dollar_quoted_blocks():
+    sql = "DO $$ BEGIN PERFORM 1; PERFORM 2; END $$;\nCREATE FUNCTION f() RETURNS int AS $body$ SELECT 1; $body$ LANGUAGE sql;"
+    assert split_statements(sql) == [
+        "DO $$ BEGIN PERFORM 1; PERFORM 2; END $$",
+        "CREATE FUNCTION f() RETURNS int AS $body$ SELECT 1; $body$ LANGUAGE sql",
+    ]
+
+
+def test_split_statements_skips_empty_statements():
+    assert split_statements(";;\n-- seul\n;") == []
+
+
+def test_migrations_are_numbered_and_split():
+    migrations = load_migrations()
+    assert [migration.version for migration in migrations] == list(range(1, len(migrations) + 1))
+    for migration in migrations:
+        assert split_statements(migration.sql)
+
+
+def test_concurrent_index_builds_run_outside_a_transaction():
+    for migration in load_migrations():
+        if any('CONCURRENTLY' in statement for statement in split_statements(migration.sql)):
+            assert not migration.transactional, migration.label
+
+
+def test_changed_applied_migration_is_refused_unless_declared(tmp_path):
+    (tmp_path / '0001_initial.sql').write_text("-- Initiale\nSELECT 1;\n", encoding='utf-8')
+    (tmp_path / '0002_revised.sql').write_text(
+        "-- Révisée\n-- migration: previous-checksum 0123456789abcdef0123456789abcdef\nSELECT 2;\n",
+        encoding='utf-8'
+    )
+    initial, revised = load_migrations(str(tmp_path))
+    assert revised.previous_checksums == {'0123456789abcdef0123456789abcdef'}
+
+    applied = {1: {'checksum': initial.checksum}, 2: {'checksum': revised.checksum}}
+    assert changed_migrations([initial, revised], applied) == ([], [])
+
+    applied = {1: {'checksum': 'f' * 32}, 2: {'checksum': '0123456789abcdef0123456789abcdef'}}
+    assert changed_migrations([initial, revised], applied) == ([initial], [revised])
+
+
+def test_parse_queries_stops_at_first_semicolon():
+    content = (
+        "-- name: first\n"
+        "-- Description\n"
+        "SELECT *\n"
+        "FROM t\n"
+        "WHERE id = %s;\n"
+        "\n"
+        "SELECT 'hors requête';\n"
+        "-- name: second\n"
+        "DELETE FROM t\n"
+    )
+    assert parse_queries(content) == {
+        'first': "SELECT *\nFROM t\nWHERE id = %s",
+        'second': "DELETE FROM t",
+    }
+
+
+def test_statement_positional_form():
+    statement = Statement('q', "SELECT * FROM t WHERE a = %s AND b LIKE 'x%%' AND c = %s")
+    assert statement.param_count == 2
+    assert statement.positional_sql == "SELECT * FROM t WHERE a = $1 AND b LIKE 'x%' AND c = $2"
+    assert statement.prepare_sql == f"PREPARE q_q AS {statement.positional_sql}"
+    assert statement.execute_sql == "EXECUTE q_q (%s, %s)"
+
+
+def test_registry_loads_every_named_query():
+    for name in registry.names():
+        assert registry.sql(name), name
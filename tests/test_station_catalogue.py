@@ -0,0 +1,81 @@
+"""Catalogue des gares en mémoire : reconstruction selon la version des horaires"""
+
+from app.database import cache
+from app.database.cache import StationCatalogue
+
+ROUTES = [('Paris Nord', 'PN', 'Lille Flandres', 'LF')]
+
+
+class Loader:
+    def __init__(self, routes=ROUTES):
+        self.routes = routes
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.routes
+
+
+def _set_version(monkeypatch, state):
+    monkeypatch.setattr(cache.timetable_version, 'get', lambda: state)
+
+
+def test_snapshot_reused_while_version_unchanged(monkeypatch):
+    _set_version(monkeypatch, (7, None))
+    catalogue = StationCatalogue(ttl=0)
+    loader = Loader()
+
+    first = catalogue.get(loader)
+    assert catalogue.get(loader) is first
+    assert loader.calls == 1
+    assert first.timetable_version == 7
+
+
+def test_version_change_from_another_process_rebuilds(monkeypatch):
+    _set_version(monkeypatch, (7, None))
+    catalogue = StationCatalogue(ttl=0)
+    loader = Loader()
+    first = catalogue.get(loader)
+
+    # Aucune invalidation dans ce processus : seule la version partagée a changé
+    _set_version(monkeypatch, (8, None))
+    second = catalogue.get(loader)
+    assert second is not first
+    assert second.timetable_version == 8
+    assert loader.calls == 2
+
+
+def test_unknown_version_falls_back_to_ttl(monkeypatch):
+    _set_version(monkeypatch, (7, None))
+    catalogue = StationCatalogue(ttl=0)
+    loader = Loader()
+    first = catalogue.get(loader)
+
+    _set_version(monkeypatch, None)
+    assert catalogue.get(loader) is first
+    assert loader.calls == 1
+
+
+def test_failed_load_keeps_previous_snapshot(monkeypatch):
+    _set_version(monkeypatch, (7, None))
+    catalogue = StationCatalogue(ttl=0)
+    first = catalogue.get(Loader())
+
+    _set_version(monkeypatch, (8, None))
+    assert catalogue.get(Loader(routes=None)) is first
+
+
+def test_invalidation_during_load_is_not_blocked_and_discards_result(monkeypatch):
+    _set_version(monkeypatch, (7, None))
+    catalogue = StationCatalogue(ttl=0)
+
+    def loader():
+        # invalidate() ne doit pas attendre la fin du chargement (appel dans le même thread)
+        catalogue.invalidate()
+        return ROUTES
+
+    loaded = catalogue.get(loader)
+    assert loaded is not None
+    # Chargement commencé avant l'invalidation : servi à l'appelant mais pas publié
+    assert catalogue._snapshot is None
+    assert catalogue.get(Loader()) is not loaded
@@ -0,0 +1,60 @@
+"""Chargement des horaires sur une base déjà remplie avant timetable_managed (PostgreSQL)"""
+
+from app.database.timetable import load_timetable
+
+from conftest import requires_postgres
+
+pytestmark = requires_postgres
+
+HEADER = ('Train No,Station Code,Station Name,Arrival time,Departure Time,Distance,'
+          'Source Station,Source Station Name,Destination Station,Destination Station Name\n')
+NUMBERS = ['TT101', 'TT102', 'TT103']
+
+
+def _write_csv(path):
+    lines = [HEADER]
+    for number in NUMBERS:
+        lines.append(f"{number},AAA,Alpha,00:00:00,08:00:00,0,AAA,Alpha,BBB,Beta\n")
+        lines.append(f"{number},BBB,Beta,10:30:00,00:00:00,120,AAA,Alpha,BBB,Beta\n")
+    path.write_text(''.join(lines), encoding='utf-8')
+
+
+def _run(conn, query, params=None):
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall() if cur.description else None
+    conn.commit()
+    return rows
+
+
+def test_load_adopts_trains_created_before_timetable_managed(pg_app, tmp_path):
+    from app.database.pool import get_pool
+
+    csv_path = tmp_path / 'Train_details.csv'
+    _write_csv(csv_path)
+
+    with pg_app.app_context():
+        pool = get_pool()
+        conn = pool.getconn()
+        try:
+            # Trains insérés par l'ancien script de chargement : aucun n'est marqué timetable_managed
+            _run(conn, "INSERT INTO train (train_number, source_station_name, destination_station_name) "
+                       "VALUES ('TT101', 'Alpha', 'Beta'), ('TT102', 'Alpha', 'Beta')")
+
+            first = load_timetable(str(csv_path))
+            second = load_timetable(str(csv_path), delta=True)
+
+            counts = _run(conn, "SELECT train_number, COUNT(*), BOOL_AND(timetable_managed), "
+                                "MIN(departure_time)::text, MIN(distance) "
+                                "FROM train WHERE train_number = ANY(%s) "
+                                "GROUP BY train_number ORDER BY train_number", (NUMBERS,))
+        finally:
+            _run(conn, "DELETE FROM train_stop WHERE train_number = ANY(%s)", (NUMBERS,))
+            _run(conn, "DELETE FROM train_stop_digest WHERE train_number = ANY(%s)", (NUMBERS,))
+            _run(conn, "DELETE FROM train WHERE train_number = ANY(%s)", (NUMBERS,))
+            pool.putconn(conn)
+
+    assert first['trains_created'] == 1
+    assert first['trains_updated'] == 2
+    assert second['trains_unchanged'] == 3
+    assert counts == [(number, 1, True, '08:00:00', 120) for number in NUMBERS]
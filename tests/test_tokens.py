@@ -0,0 +1,35 @@
+"""Vérification des jetons d'administration (en-tête Bearer, session déverrouillée)"""
+
+from flask import Flask
+
+from app.tokens import bearer_matches, session_unlocked, token_matches, unlock_session
+
+app = Flask(__name__)
+app.secret_key = 'test'
+
+
+def test_token_matches():
+    assert token_matches('secret', 'secret')
+    assert not token_matches('secreT', 'secret')
+    assert not token_matches(None, 'secret')
+    # Sans jeton configuré, rien ne correspond, pas même une chaîne vide
+    assert not token_matches('', '')
+
+
+def test_bearer_matches():
+    with app.test_request_context(headers={'Authorization': 'Bearer secret'}):
+        assert bearer_matches('secret')
+        assert not bearer_matches('other')
+        assert not bearer_matches('')
+    with app.test_request_context(headers={'Authorization': 'Bearer '}):
+        assert not bearer_matches('')
+
+
+def test_session_unlock_follows_token():
+    with app.test_request_context():
+        assert not session_unlocked('_operator', 'secret')
+        unlock_session('_operator', 'secret')
+        assert session_unlocked('_operator', 'secret')
+        # Jeton changé : la session déverrouillée avec l'ancien n'est plus reconnue
+        assert not session_unlocked('_operator', 'rotated')
+        assert not session_unlocked('_operator', '')
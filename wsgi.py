@@ -0,0 +1,10 @@
+"""
+Point d'entrée de production : gunicorn --config gunicorn.conf.py wsgi:app
+L'application est construite et ses caches chauffés une seule fois, dans le processus maître (preload_app)
+"""
+
+from app import create_app
+from app.startup import warm_up
+
+app = create_app()
+warm_up(app)